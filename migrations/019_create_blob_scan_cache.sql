@@ -0,0 +1,10 @@
+-- findings per scanned git blob, reused by later scans with the same rule set
+CREATE TABLE IF NOT EXISTS blob_scan_cache (
+  blob_sha TEXT NOT NULL,
+  ruleset TEXT NOT NULL,
+  findings JSONB NOT NULL DEFAULT '[]',
+  last_used_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  PRIMARY KEY (blob_sha, ruleset)
+);
+
+CREATE INDEX IF NOT EXISTS idx_blob_scan_cache_last_used_at ON blob_scan_cache(last_used_at);
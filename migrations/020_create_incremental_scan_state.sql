@@ -0,0 +1,11 @@
+-- last commit scanned per repository branch, used by incremental scans.
+-- scope separates independent subscribers of the same repository (a recurring
+-- schedule, a user), since each of them only sees the findings of its own jobs.
+CREATE TABLE IF NOT EXISTS incremental_scan_state (
+  scope TEXT NOT NULL,
+  repo_url TEXT NOT NULL,
+  branch TEXT NOT NULL,
+  head_sha TEXT NOT NULL,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  PRIMARY KEY (scope, repo_url, branch)
+);
@@ -0,0 +1,3 @@
+-- set when a job ran out of its scan budget (file count, total size or deadline)
+-- and stopped before scanning the whole repository. NULL for complete scans.
+ALTER TABLE scan_jobs ADD COLUMN IF NOT EXISTS partial_reason TEXT;
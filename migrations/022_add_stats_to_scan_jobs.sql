@@ -0,0 +1,3 @@
+-- per-phase timings and counters of a scan job, written by the scanner when the job ends.
+-- see scraper/stats.py for the layout. NULL for jobs that ran before this column existed.
+ALTER TABLE scan_jobs ADD COLUMN IF NOT EXISTS stats JSONB;
@@ -0,0 +1,9 @@
+-- scan jobs enqueued in bulk (POST /scan/batch) record what they would scan as coalesce_key.
+-- a job enqueued while another job with the same key is still PENDING is not queued itself,
+-- it points at that job with shares_job_id and receives a copy of its findings when it finishes.
+ALTER TABLE scan_jobs ADD COLUMN IF NOT EXISTS coalesce_key TEXT;
+ALTER TABLE scan_jobs ADD COLUMN IF NOT EXISTS shares_job_id UUID REFERENCES scan_jobs(id) ON DELETE SET NULL;
+
+CREATE INDEX IF NOT EXISTS idx_scan_jobs_pending_coalesce_key
+  ON scan_jobs (coalesce_key) WHERE status = 'PENDING' AND shares_job_id IS NULL;
+CREATE INDEX IF NOT EXISTS idx_scan_jobs_shares_job_id ON scan_jobs (shares_job_id);
@@ -0,0 +1,6 @@
+-- the recurring scan dispatcher (scraper/dispatcher.py) leases the schedules it enqueues
+-- until their run finishes, so no other dispatcher enqueues them again in the meantime.
+ALTER TABLE recursive_scans ADD COLUMN IF NOT EXISTS lease_until TIMESTAMPTZ;
+
+CREATE INDEX IF NOT EXISTS idx_recursive_scans_due
+  ON recursive_scans (next_run_at) WHERE is_active = true;
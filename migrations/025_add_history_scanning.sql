@@ -0,0 +1,11 @@
+-- history scans attribute each finding to the earliest commit that added the secret.
+ALTER TABLE scan_findings ADD COLUMN IF NOT EXISTS commit_sha TEXT;
+
+-- the commits a history scan has already walked, so the next run only walks newer ones.
+CREATE TABLE IF NOT EXISTS history_scan_state (
+  scope TEXT NOT NULL,
+  repo_url TEXT NOT NULL,
+  commits TEXT[] NOT NULL,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  PRIMARY KEY (scope, repo_url)
+);
@@ -0,0 +1,3 @@
+-- the refs (and scan options) the last complete run of a recurring scan covered. runs
+-- compare them with `git ls-remote` first and skip the clone when nothing was pushed since.
+ALTER TABLE recursive_scans ADD COLUMN IF NOT EXISTS last_refs JSONB;
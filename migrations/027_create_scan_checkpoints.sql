@@ -0,0 +1,12 @@
+-- files and blobs a scan job has finished, with their findings stored. a retried or
+-- redelivered job skips them if its clone is at the same head. one row per checkpoint,
+-- rows are deleted when the job completes.
+CREATE TABLE IF NOT EXISTS scan_checkpoints (
+  id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+  job_id UUID NOT NULL REFERENCES scan_jobs(id) ON DELETE CASCADE,
+  head TEXT NOT NULL,
+  done TEXT[] NOT NULL,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_scan_checkpoints_job_id ON scan_checkpoints(job_id);
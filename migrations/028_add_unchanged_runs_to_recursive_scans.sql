@@ -0,0 +1,4 @@
+-- runs of a recurring scan that were skipped because nothing was pushed since the last complete run
+-- (see scraper/tasks.py). unchanged_runs counts them since that run, whose findings stay the current ones.
+ALTER TABLE recursive_scans ADD COLUMN IF NOT EXISTS last_unchanged_at TIMESTAMPTZ;
+ALTER TABLE recursive_scans ADD COLUMN IF NOT EXISTS unchanged_runs INTEGER NOT NULL DEFAULT 0;
@@ -0,0 +1,3 @@
+-- recurring scans that only scan what changed since their previous run (see scraper/dispatcher.py).
+-- off by default, a recurring scan scans the whole repository like its first run.
+ALTER TABLE recursive_scans ADD COLUMN IF NOT EXISTS incremental BOOLEAN NOT NULL DEFAULT false;
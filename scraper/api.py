@@ -1,11 +1,13 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import os
 from datetime import datetime
 import re
-import requests
 from repository import *
-from tasks import run_scan_job_pro, run_scan_job_free, run_recursive_scan_job_pro, run_recursive_scan_job_free
+from tasks import run_scan_job_pro, run_scan_job_free, run_recursive_scan_job_pro, run_recursive_scan_job_free, BROKER_URL
+import metrics
+from repocheck import check_repo_exists
+from enqueue import enqueue_scans, enqueue_recursive_scans, forget_tier, MAX_BATCH_SIZE
 
 VALID_INTERVALS = {"EVERY_MINUTE", "HOURLY", "DAILY", "WEEKLY", "MONTHLY", "YEARLY"}
 
@@ -14,9 +16,12 @@ CORS(app)
 
 #------------------------------- list of endpoints -----------------------------------------------
 # GET    /health                - Health check
+# GET    /metrics               - Prometheus metrics
 # POST   /validate              - Validate GitHub URL
 # POST   /scan                  - Start async scan
+# POST   /scan/batch            - Start many async scans
 # POST   /recursive-scan        - Trigger a recursive scan run
+# POST   /recursive-scan/batch  - Trigger many recursive scan runs
 #--------------------------------------------------------------------------------------------------
 
 # Validate if it's a GitHub URL format
@@ -32,28 +37,18 @@ def validate_github_url(url):
 
     return True, "Valid GitHub URL", {'owner': owner, 'repo': repo}
 
-# Check if the repository actually exists on GitHub
-def check_repo_exists(owner, repo, repoKey=None):
-    url = f"https://api.github.com/repos/{owner}/{repo}"
-    
-    headers = {"Accept": "application/vnd.github+json"}
-    if repoKey:
-        headers["Authorization"] = f"Bearer {repoKey}"
-    
-    try:
-        response = requests.get(url, headers=headers)
-        
-        if response.status_code == 200:
-            return True, "Repository exists", {"url": f"https://github.com/{owner}/{repo}"}
-        elif response.status_code == 404:
-            return False, "Repository not found or no access", None
-        elif response.status_code == 401:
-            return False, "Invalid or expired access token", None
-        else:
-            return False, f"Unexpected status code: {response.status_code}", None
-            
-    except requests.exceptions.RequestException as e:
-        return False, f"Error connecting to GitHub: {str(e)}", None
+# Validate the optional branch and commit of a scan, they end up on git's command line
+def validate_scan_target(ref, sha):
+    if ref is not None:
+        branch = ref.removeprefix("refs/heads/") if isinstance(ref, str) else ""
+        # the rules of git check-ref-format, plus no leading dash
+        if (not re.match(r'^[^\x00-\x20\x7f~^:?*\[\\]+$', branch) or branch.startswith(("-", "/", "."))
+                or branch.endswith(("/", ".", ".lock")) or ".." in branch or "//" in branch
+                or "/." in branch or "@{" in branch or branch == "@"):
+            return False, "ref must be a branch name"
+    if sha is not None and not (isinstance(sha, str) and re.match(r'^[0-9a-f]{40}$', sha)):
+        return False, "sha must be a full commit sha"
+    return True, None
 
 # Health check
 @app.route('/health', methods=['GET'])
@@ -65,6 +60,17 @@ def health():
         'version': '1.0.0'
     })
 
+# Prometheus scrape target. Worker metrics are collected in Redis (see metrics.py),
+# queue depth and this process' DB connections are read now.
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    db = pool_stats()
+    gauges = {
+        "queue_depth": [({"queue": queue}, depth) for queue, depth in metrics.queue_depths(BROKER_URL, ["fast", "slow"]).items()],
+        "db_pool_connections": [({"process": "api", "state": state}, db[state]) for state in ("in_use", "idle")],
+    }
+    return Response(metrics.render(gauges), mimetype="text/plain; version=0.0.4")
+
 # Validate GitHub URL without scanning
 @app.route('/validate', methods=['POST'])
 def validate():
@@ -125,13 +131,25 @@ def start_scan():
         is_deep_scan = data.get("isDeepScan", False)
         extensions = data.get("extensions", [])
         user_id = data.get("userId")
+        # Incremental scans only look at files changed since the last scan for this user
+        incremental = data.get("incremental", False)
+        incremental_scope = f"user:{user_id}" if incremental and user_id else None
+        # History scans also look at files that were committed and deleted since
+        history = data.get("history", False)
+        # Push webhooks scan the pushed branch (ref) or commit (sha) instead of the default branch
+        ref = data.get("ref")
+        sha = data.get("sha")
+        valid, message = validate_scan_target(ref, sha)
+        if not valid:
+            return jsonify({'error': message}), 400
 
         # Route to correct Celery queue based on tier
         tier = getUserTier(user_id) if user_id else "free"
         task = run_scan_job_pro if tier == "pro" else run_scan_job_free
 
         # Fire and forget to Celery
-        task.delay(job_id, url, is_deep_scan, extensions, repoKey)
+        task.delay(job_id, url, is_deep_scan, extensions, repoKey, incremental_scope=incremental_scope, history=history,
+                   ref=ref, sha=sha)
 
         return jsonify({
             'success': True,
@@ -144,6 +162,38 @@ def start_scan():
         return jsonify({'error': str(e)}), 500
 
 
+# Start many scans at once, e.g. for a burst of pushes. Takes {"jobs": [<body of /scan>, ...]}.
+# Jobs duplicating a job that is still pending are not queued, they share its findings (see enqueue.py).
+@app.route('/scan/batch', methods=['POST'])
+def start_scan_batch():
+    try:
+        data = request.get_json()
+        jobs = data.get('jobs') if isinstance(data, dict) else None
+        if not isinstance(jobs, list) or not jobs:
+            return jsonify({'error': 'jobs must be a non-empty list'}), 400
+        if len(jobs) > MAX_BATCH_SIZE:
+            return jsonify({'error': f'at most {MAX_BATCH_SIZE} jobs per batch'}), 400
+        if not all(isinstance(job, dict) and 'url' in job and 'id' in job for job in jobs):
+            return jsonify({'error': 'url and id are required for every job'}), 400
+        for job in jobs:
+            valid, message = validate_scan_target(job.get("ref"), job.get("sha"))
+            if not valid:
+                return jsonify({'error': message}), 400
+
+        queued, coalesced = enqueue_scans(jobs)
+
+        return jsonify({
+            'success': True,
+            'message': f'{len(queued)} scans queued, {len(coalesced)} coalesced',
+            'queued': queued,
+            'coalesced': coalesced
+        }), 202
+
+    except Exception as e:
+        print("error: " + str(e))
+        return jsonify({'error': str(e)}), 500
+
+
 # ---- Recursive scan endpoints ----
 
 # Trigger a recurring scan. 
@@ -161,6 +211,7 @@ def create_recursive_scan():
         is_deep_scan = data.get('isDeepScan', False)
         extensions = data.get('extensions', [])
         owner_id = data.get('owner_id')
+        incremental = data.get('incremental', False)
 
         # Validate URL format before queueing
         is_valid, message, _ = validate_github_url(url)
@@ -177,6 +228,7 @@ def create_recursive_scan():
             repoKey,
             is_deep_scan,
             extensions,
+            incremental_scope=f"recursive:{scan_id}" if incremental else None,
         )
 
         return jsonify({'success': True, 'message': 'Recursive scan queued', 'id': str(scan_id)}), 202
@@ -185,6 +237,32 @@ def create_recursive_scan():
         return jsonify({'error': str(e)}), 500
 
 
+# Trigger many recurring scans at once. Takes {"scans": [<body of /recursive-scan>, ...]}.
+@app.route('/recursive-scan/batch', methods=['POST'])
+def create_recursive_scan_batch():
+    try:
+        data = request.get_json()
+        scans = data.get('scans') if isinstance(data, dict) else None
+        if not isinstance(scans, list) or not scans:
+            return jsonify({'error': 'scans must be a non-empty list'}), 400
+        if len(scans) > MAX_BATCH_SIZE:
+            return jsonify({'error': f'at most {MAX_BATCH_SIZE} scans per batch'}), 400
+        if not all(isinstance(scan, dict) and 'url' in scan and 'id' in scan for scan in scans):
+            return jsonify({'error': 'url and id are required for every scan'}), 400
+
+        for scan in scans:
+            is_valid, message, _ = validate_github_url(scan['url'])
+            if not is_valid:
+                return jsonify({'error': f"{scan['id']}: {message}"}), 400
+
+        queued = enqueue_recursive_scans(scans)
+
+        return jsonify({'success': True, 'message': f'{len(queued)} recursive scans queued', 'ids': [str(i) for i in queued]}), 202
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 # ---- Mock tier endpoints ----
 
 @app.route('/admin/upgrade', methods=['POST'])
@@ -194,6 +272,7 @@ def upgrade_user():
         if not data or 'userId' not in data:
             return jsonify({'error': 'userId is required'}), 400
         updated = setUserTier(data['userId'], 'pro')
+        forget_tier(data['userId'])
         if not updated:
             return jsonify({'error': 'User not found'}), 404
         return jsonify({'success': True, 'userId': data['userId'], 'tier': 'pro'}), 200
@@ -208,6 +287,7 @@ def downgrade_user():
         if not data or 'userId' not in data:
             return jsonify({'error': 'userId is required'}), 400
         updated = setUserTier(data['userId'], 'free')
+        forget_tier(data['userId'])
         if not updated:
             return jsonify({'error': 'User not found'}), 404
         return jsonify({'success': True, 'userId': data['userId'], 'tier': 'free'}), 200
@@ -223,9 +303,12 @@ if __name__ == '__main__':
     print(f"Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print("\nAvailable endpoints:")
     print("  GET    /health                          - Health check")
+    print("  GET    /metrics                         - Prometheus metrics")
     print("  POST   /validate                        - Validate GitHub URL")
     print("  POST   /scan                            - Start standard scan")
+    print("  POST   /scan/batch                      - Start many standard scans")
     print("  POST   /recursive-scan                  - Trigger a recursive scan")
+    print("  POST   /recursive-scan/batch            - Trigger many recursive scans")
     print("="*70)
     print(f"\nServer running on: http://0.0.0.0:5001")
     print("="*70 + "\n")
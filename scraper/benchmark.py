@@ -0,0 +1,343 @@
+import os
+import sys
+import json
+import time
+import random
+import string
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from logic import GitHubSecretScanner, SCANNER_REVISION
+
+#------------------------------- scanner benchmark -----------------------------------------------
+#  Measures scanner throughput on synthetic repositories, without a database or network.
+#
+#    python benchmark.py --out results.json
+#    python benchmark.py --compare results.json     # exit 1 on a files/s regression
+#
+#  Every corpus is generated from a fixed seed and committed with fixed dates, so the same
+#  --seed and --scale give byte-identical repositories and commit shas on every machine.
+#  Each case runs in a fresh process, which makes peak_rss_kb the peak of that case alone.
+#  Findings are counted but never written; the blob and mirror caches are turned off.
+#
+#  Phases, counters and rule hits are the job stats the scanner collects itself (see stats.py).
+#  With the database stubbed out the db phase only covers the scanner's own buffering.
+#--------------------------------------------------------------------------------------------------
+
+BENCHMARK_EXTENSIONS = [".py", ".js", ".ts", ".go", ".json", ".yml", ".env", ".txt"]
+
+# fixed author and dates so commit shas only depend on the content
+GIT_ENV = {
+    "GIT_AUTHOR_NAME": "benchmark", "GIT_AUTHOR_EMAIL": "benchmark@example.com",
+    "GIT_COMMITTER_NAME": "benchmark", "GIT_COMMITTER_EMAIL": "benchmark@example.com",
+    "GIT_AUTHOR_DATE": "2024-01-01T00:00:00Z", "GIT_COMMITTER_DATE": "2024-01-01T00:00:00Z",
+}
+
+
+# ---------------- Corpus ---------------- #
+
+def _token(rng, length, alphabet=string.ascii_letters + string.digits):
+    return "".join(rng.choice(alphabet) for _ in range(length))
+
+
+def _secret_line(rng):
+    kind = rng.randrange(4)
+    if kind == 0:
+        return f"aws_key = 'AKIA{_token(rng, 16, string.ascii_uppercase + string.digits)}'"
+    if kind == 1:
+        return f"GITHUB_TOKEN=ghp_{_token(rng, 36)}"
+    if kind == 2:
+        return f'const apiKey = "{_token(rng, 32)}";'
+    return f"session_secret: {_token(rng, 40, string.ascii_letters + string.digits + '+/')}"
+
+
+def _source_file(rng, lines, secret_ratio):
+    out = []
+    for i in range(lines):
+        if rng.random() < secret_ratio:
+            out.append(_secret_line(rng))
+        else:
+            name = _token(rng, 8, string.ascii_lowercase)
+            out.append(rng.choice((
+                f"def {name}_{i}(value):",
+                f"    return value * {rng.randrange(1000)}",
+                f"# {name} handles the {_token(rng, 6, string.ascii_lowercase)} case",
+                f"const {name} = require('./{name}');",
+                f"if (count > {rng.randrange(100)}) {{ {name}(count); }}",
+                "",
+            )))
+    return "\n".join(out) + "\n"
+
+
+def _json_file(rng, target_size):
+    records, size = [], 0
+    while size < target_size:
+        record = json.dumps({
+            "id": rng.randrange(10 ** 9),
+            "name": _token(rng, 12, string.ascii_lowercase),
+            "checksum": _token(rng, 40, "0123456789abcdef"),
+            "tags": [_token(rng, 5, string.ascii_lowercase) for _ in range(3)],
+        })
+        records.append(record)
+        size += len(record) + 2
+    return "[\n" + ",\n".join(records) + "\n]\n"
+
+
+def _minified_bundle(rng, size):
+    parts, total = [], 0
+    while total < size:
+        part = f"var {_token(rng, 2, string.ascii_lowercase)}=function(e){{return e*{rng.randrange(99)}}};"
+        parts.append(part)
+        total += len(part)
+    return "".join(parts)
+
+
+def corpus_source(rng, scale):
+    """Many small source files, one in about fifty lines holds a secret."""
+    exts = (".py", ".js", ".ts", ".go")
+    return {"main": {
+        f"src/pkg{i % 20}/module_{i}{exts[i % len(exts)]}": _source_file(rng, rng.randrange(40, 200), 0.02)
+        for i in range(400 * scale)
+    }}
+
+
+def corpus_large_json(rng, scale):
+    """A few JSON dumps, the largest above the streaming threshold."""
+    files = {f"data/dump_{i}.json": _json_file(rng, 512 * 1024) for i in range(4 * scale)}
+    files["data/export.json"] = _json_file(rng, 12 * 1024 * 1024)
+    return {"main": files}
+
+
+def corpus_minified(rng, scale):
+    """Minified bundles and lockfiles, which the classifier should skip cheaply."""
+    files = {}
+    for i in range(20 * scale):
+        # half are recognised by name, the other half by sniffing their content
+        name = f"dist/app_{i}.min.js" if i % 2 else f"dist/chunk_{i}.js"
+        files[name] = _minified_bundle(rng, 200 * 1024)
+    files["package-lock.json"] = _json_file(rng, 256 * 1024)
+    files["src/index.js"] = _source_file(rng, 100, 0.02)
+    return {"main": files}
+
+
+def corpus_dense_secrets(rng, scale):
+    """Files where most lines hold a secret or a high entropy token."""
+    return {"main": {f"config/env_{i}.env": _source_file(rng, 300, 0.8) for i in range(50 * scale)}}
+
+
+def corpus_branches(rng, scale):
+    """A shared base tree and many branches that each change a few files, scanned deep."""
+    base = {f"src/file_{i}.py": _source_file(rng, 80, 0.02) for i in range(100 * scale)}
+    branches = {"main": base}
+    for b in range(20 * scale):
+        branches[f"feature/{b}"] = {
+            f"src/file_{rng.randrange(len(base))}.py": _source_file(rng, 80, 0.05) for _ in range(3)
+        }
+    return branches
+
+
+# name -> (generator, deep scan)
+CORPORA = {
+    "source": (corpus_source, False),
+    "large_json": (corpus_large_json, False),
+    "minified": (corpus_minified, False),
+    "dense_secrets": (corpus_dense_secrets, False),
+    "branches": (corpus_branches, True),
+}
+
+
+def _git(repo, *args):
+    subprocess.run(["git", *args], cwd=repo, check=True, capture_output=True, env={**os.environ, **GIT_ENV})
+
+
+def build_corpus(name, root, seed=0, scale=1):
+    """Generate corpus name as a git repository under root and return its path."""
+    generate, _deep = CORPORA[name]
+    rng = random.Random(f"{seed}:{name}")
+    repo = os.path.join(root, name)
+    os.makedirs(repo)
+    _git(repo, "init", "-q", "-b", "main")
+
+    for branch, files in generate(rng, scale).items():
+        if branch != "main":
+            _git(repo, "checkout", "-q", "-b", branch, "main")
+        for path, content in files.items():
+            full = os.path.join(repo, path)
+            os.makedirs(os.path.dirname(full), exist_ok=True)
+            with open(full, "w") as f:
+                f.write(content)
+        _git(repo, "add", "-A")
+        _git(repo, "commit", "-q", "-m", branch)
+        if branch != "main":
+            _git(repo, "checkout", "-q", "main")
+    return repo
+
+
+# ---------------- Measurement ---------------- #
+
+def _peak_rss_kb():
+    # ru_maxrss survives exec, so a spawned child would report its parent's peak.
+    # VmHWM belongs to the address space and starts over with the new process image.
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_case(name, repo_url, workers=1):
+    """Scan repo_url like a job would, with the database stubbed out, and return the measurements."""
+    _generate, deep = CORPORA[name]
+    scanner = GitHubSecretScanner(repo_url, "00000000-0000-0000-0000-000000000000", isDeepScan=deep,
+                                  extensions=BENCHMARK_EXTENSIONS, workers=workers)
+    scanner.use_blob_cache = False
+    scanner.mirror_cache = None
+    scanner.write_log = lambda message: None
+
+    stored = {}
+    with patch("findings.insertScanFindingsBatch"), \
+         patch("logic.markScanJobPartial"), \
+         patch("logic.setLastScannedCommit"), \
+         patch("logic.getScanCheckpoint", return_value=set()), \
+         patch("logic.appendScanCheckpoint"), \
+         patch("logic.deleteScanCheckpoint"), \
+         patch("logic.insertScanJobStats", lambda job_id, stats: stored.update(stats)):
+        start = time.perf_counter()
+        scanner.run()
+        elapsed = time.perf_counter() - start
+
+    counters = stored["counters"]
+    scan_seconds = max(elapsed - stored["phases"]["clone"], 1e-9)
+    return {
+        "seconds": round(elapsed, 4),
+        "files_scanned": counters["files_scanned"],
+        "bytes_scanned": counters["bytes_scanned"],
+        "findings": counters["findings_written"],
+        "skipped": stored["skipped"],
+        # throughput excludes the clone, which depends on the disk more than on the scanner
+        "files_per_second": round(counters["files_scanned"] / scan_seconds, 2),
+        "mb_per_second": round(counters["bytes_scanned"] / 1024 ** 2 / scan_seconds, 3),
+        "phases": stored["phases"],
+        "counters": counters,
+        "rule_hits": stored["rule_hits"],
+        "peak_rss_kb": _peak_rss_kb(),
+    }
+
+
+def _run_isolated(name, repo_url, workers):
+    # spawn, not fork, so the parent's memory does not count towards the case's peak RSS
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(run_case, name, repo_url, workers).result()
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              check=True, capture_output=True, text=True).stdout.strip()
+    except (subprocess.CalledProcessError, OSError):
+        return None
+
+
+def run_benchmark(cases=None, seed=0, scale=1, workers=1, repeat=3, isolated=True):
+    """Build the corpora once and scan each one repeat times. The median run by wall time is reported."""
+    cases = list(cases or CORPORA)
+    results = {}
+    root = tempfile.mkdtemp(prefix="scanner-benchmark-")
+    try:
+        for name in cases:
+            repo_url = f"file://{build_corpus(name, root, seed, scale)}"
+            runs = [
+                _run_isolated(name, repo_url, workers) if isolated else run_case(name, repo_url, workers)
+                for _ in range(repeat)
+            ]
+            runs.sort(key=lambda run: run["seconds"])
+            results[name] = runs[len(runs) // 2]
+            results[name]["runs"] = repeat
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_revision": _git_revision(),
+            "scanner_revision": SCANNER_REVISION,
+            "ruleset_version": GitHubSecretScanner("", "").ruleset_version(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "seed": seed,
+            "scale": scale,
+            "workers": workers,
+        },
+        "cases": results,
+    }
+
+
+def compare(baseline, current, max_regression=0.10):
+    """Return a line per case common to both results and whether any case regressed.
+
+    A case regresses when its files/s dropped by more than max_regression. Different
+    finding counts are flagged too, they mean the rules or the corpus changed.
+    """
+    lines, regressed = [], False
+    for name, now in current["cases"].items():
+        before = baseline["cases"].get(name)
+        if before is None:
+            continue
+        change = now["files_per_second"] / before["files_per_second"] - 1 if before["files_per_second"] else 0.0
+        flags = []
+        if change < -max_regression:
+            flags.append("REGRESSION")
+            regressed = True
+        if now["findings"] != before["findings"]:
+            flags.append(f"findings {before['findings']} -> {now['findings']}")
+        lines.append(
+            f"{name:15} {before['files_per_second']:>10.1f} -> {now['files_per_second']:>10.1f} files/s "
+            f"({change:+.1%}) {' '.join(flags)}".rstrip()
+        )
+    return lines, regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the secret scanner on synthetic repositories.")
+    parser.add_argument("--case", action="append", choices=sorted(CORPORA), help="corpus to run, repeatable (default: all)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scale", type=int, default=1, help="multiplies the size of every corpus")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes per scan")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", help="write the results as JSON to this file")
+    parser.add_argument("--compare", metavar="BASELINE", help="compare against an earlier --out file")
+    parser.add_argument("--max-regression", type=float, default=0.10, help="allowed files/s drop for --compare")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.case, args.seed, args.scale, args.workers, args.repeat)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+    for name, case in results["cases"].items():
+        phases = " ".join(f"{phase}={seconds:.3f}s" for phase, seconds in case["phases"].items())
+        print(f"{name:15} {case['files_per_second']:>10.1f} files/s {case['mb_per_second']:>8.2f} MB/s "
+              f"rss={case['peak_rss_kb'] // 1024}MB {phases}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        lines, regressed = compare(baseline, results, args.max_regression)
+        print("\n".join(lines))
+        return 1 if regressed else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+import os
+import time
+from repository import getCachedBlobFindings, insertCachedBlobFindings, pruneBlobScanCache
+
+#------------------------------- blob scan cache -----------------------------------------------
+#  Findings are a pure function of a file's content and the scanner's rule set, so they are
+#  cached per (git blob sha, ruleset version) in the blob_scan_cache table, including blobs
+#  without findings. Recurring and webhook scans of a mostly unchanged repo then only run the
+#  regex and entropy passes on blobs that changed since an earlier job.
+#
+#  The ruleset version is a hash of the patterns and entropy settings (see
+#  GitHubSecretScanner.ruleset_version), so any rule change switches to a fresh set of entries.
+#  The extension list is not part of the key: it only decides which blobs get looked up.
+#  At most BLOB_CACHE_MAX_ENTRIES entries are kept, the least recently used are evicted.
+#  The cache is an optimisation only: when it is unavailable the scan runs uncached.
+#--------------------------------------------------------------------------------------------------
+
+BLOB_CACHE_ENABLED = os.environ.get("BLOB_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+BLOB_CACHE_MAX_ENTRIES = int(os.environ.get("BLOB_CACHE_MAX_ENTRIES", 500000))
+BLOB_CACHE_BATCH_SIZE = int(os.environ.get("BLOB_CACHE_BATCH_SIZE", 500))
+
+
+class BlobScanCache:
+    def __init__(self, ruleset, max_entries=BLOB_CACHE_MAX_ENTRIES, batch_size=BLOB_CACHE_BATCH_SIZE):
+        self.ruleset = ruleset
+        self.max_entries = max_entries
+        self.batch_size = batch_size
+        self.pending = {}
+        self.stored = 0
+        # time spent in the database, reported in the job's stats
+        self.seconds = 0.0
+
+    def lookup(self, blob_shas):
+        """Return {blob_sha: [(line_number, snippet, severity, rule), ...]} for the cached shas."""
+        started = time.perf_counter()
+        try:
+            rows = getCachedBlobFindings(self.ruleset, set(blob_shas))
+        except Exception as e:
+            print(f"[blob cache] lookup failed, scanning uncached: {e}")
+            return {}
+        finally:
+            self.seconds += time.perf_counter() - started
+        return {sha: [tuple(finding) for finding in findings] for sha, findings in rows.items()}
+
+    def store(self, blob_sha, findings):
+        self.pending[blob_sha] = [list(finding) for finding in findings]
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        entries = list(self.pending.items())
+        self.pending = {}
+        started = time.perf_counter()
+        try:
+            insertCachedBlobFindings(self.ruleset, entries)
+            self.stored += len(entries)
+        except Exception as e:
+            print(f"[blob cache] failed to store {len(entries)} entries: {e}")
+        finally:
+            self.seconds += time.perf_counter() - started
+
+    def close(self):
+        """Write the remaining entries and evict down to max_entries."""
+        self.flush()
+        if not self.stored:
+            return
+        started = time.perf_counter()
+        try:
+            pruneBlobScanCache(self.max_entries)
+        except Exception as e:
+            print(f"[blob cache] eviction failed: {e}")
+        finally:
+            self.seconds += time.perf_counter() - started
@@ -0,0 +1,81 @@
+import os
+import time
+
+#------------------------------- scan budgets -----------------------------------------------
+#  Upper limits for a single scan job, so one huge repository cannot hold a worker
+#  for as long as it likes. The limits are read per queue from the environment:
+#
+#    <QUEUE>_SCAN_MAX_FILES         files actually scanned (cache hits are free)
+#    <QUEUE>_SCAN_MAX_BYTES         total size of those files
+#    <QUEUE>_SCAN_MAX_FILE_SIZE     larger files are skipped, the scan goes on
+#    <QUEUE>_SCAN_DEADLINE_SECONDS  wall-clock time since the job started, clone included
+#
+#  where <QUEUE> is FAST_QUEUE or SLOW_QUEUE. Unset or 0 means unlimited.
+#  The scanner checks the budget between files and between windows of streamed files.
+#  When it runs out the scan stops, keeps the findings it has and marks the job partial.
+#--------------------------------------------------------------------------------------------------
+
+
+class BudgetExceeded(Exception):
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def _limit(name):
+    value = int(os.environ.get(name, 0) or 0)
+    return value if value > 0 else None
+
+
+class ScanBudget:
+    def __init__(self, max_files=None, max_bytes=None, max_file_size=None, deadline_seconds=None):
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.max_file_size = max_file_size
+        self.deadline_seconds = deadline_seconds
+        self.start()
+
+    @classmethod
+    def from_env(cls, prefix):
+        return cls(
+            max_files=_limit(f"{prefix}_SCAN_MAX_FILES"),
+            max_bytes=_limit(f"{prefix}_SCAN_MAX_BYTES"),
+            max_file_size=_limit(f"{prefix}_SCAN_MAX_FILE_SIZE"),
+            deadline_seconds=_limit(f"{prefix}_SCAN_DEADLINE_SECONDS"),
+        )
+
+    def copy(self):
+        """A fresh budget with the same limits, for the next job."""
+        return ScanBudget(self.max_files, self.max_bytes, self.max_file_size, self.deadline_seconds)
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self.files = 0
+        self.bytes = 0
+
+    def allows_file_size(self, size):
+        return self.max_file_size is None or size <= self.max_file_size
+
+    def check(self):
+        """Raise BudgetExceeded if no further file may be scanned."""
+        if self.deadline_seconds is not None and time.monotonic() - self.started_at > self.deadline_seconds:
+            raise BudgetExceeded(f"deadline of {self.deadline_seconds}s reached")
+        if self.max_files is not None and self.files >= self.max_files:
+            raise BudgetExceeded(f"file limit of {self.max_files} files reached")
+        if self.max_bytes is not None and self.bytes >= self.max_bytes:
+            raise BudgetExceeded(f"size limit of {self.max_bytes} bytes reached")
+
+    def exhausted(self):
+        try:
+            self.check()
+        except BudgetExceeded:
+            return True
+        return False
+
+    def charge(self, size):
+        """Account for one more file of size bytes, or raise BudgetExceeded if it does not fit."""
+        self.check()
+        if self.max_bytes is not None and self.bytes + size > self.max_bytes:
+            raise BudgetExceeded(f"size limit of {self.max_bytes} bytes reached")
+        self.files += 1
+        self.bytes += size
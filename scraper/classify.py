@@ -0,0 +1,74 @@
+import re
+
+#------------------------------- file classifier -----------------------------------------------
+#  Decides, before any rule runs, whether a file is worth scanning at all.
+#  Vendored dependency trees, lockfiles, minified bundles, generated code and binaries
+#  that happen to have a whitelisted extension produce almost nothing but entropy noise.
+#
+#  skip_reason_for_path only looks at the path, so it is used while walking the tree and
+#  listing blobs. skip_reason_for_sample looks at the first SNIFF_SIZE characters of the
+#  content. Both return None for files that should be scanned, otherwise the reason the
+#  file was skipped, which ends up in the scan's skip counts.
+#--------------------------------------------------------------------------------------------------
+
+# directories that hold third-party or tool-generated files, pruned while walking
+SKIP_DIRECTORIES = {
+    ".git", ".hg", ".svn",
+    "node_modules", "bower_components", "jspm_packages", ".yarn", ".pnpm-store",
+    "vendor",
+    "__pycache__", ".venv", "venv", ".tox", ".mypy_cache", ".pytest_cache",
+    ".next", ".nuxt",
+}
+
+LOCKFILES = {
+    "package-lock.json", "npm-shrinkwrap.json", "yarn.lock", "pnpm-lock.yaml",
+    "composer.lock", "Gemfile.lock", "Cargo.lock", "poetry.lock", "Pipfile.lock",
+    "go.sum", "packages.lock.json",
+}
+
+MINIFIED_SUFFIXES = (".min.js", ".min.mjs", ".min.css", ".bundle.js", ".chunk.js")
+
+SNIFF_SIZE = 8192
+# share of control characters above which a sample is treated as binary
+MAX_CONTROL_RATIO = 0.30
+# samples at least this long whose lines average more than MINIFIED_LINE_LENGTH are minified.
+# small files are never treated as minified, a one-line config can still hold a secret
+MINIFIED_MIN_SIZE = 4096
+MINIFIED_LINE_LENGTH = 500
+# generated-code markers, only looked for in the first GENERATED_HEADER_LINES lines
+GENERATED_HEADER_LINES = 5
+GENERATED_MARKERS = re.compile(
+    r"@generated|Code generated .* DO NOT EDIT|"
+    r"(?i:auto-?generated file|this file (?:is|was|has been) (?:automatically |auto-?)generated)"
+)
+
+_CONTROL_CHARACTERS = re.compile(r"[\x00-\x08\x0e-\x1f\x7f]")
+
+
+def skip_reason_for_path(path):
+    """Reason to skip a file based on its path alone, or None."""
+    parts = path.replace("\\", "/").split("/")
+    if any(part in SKIP_DIRECTORIES for part in parts[:-1]):
+        return "vendored_directory"
+    name = parts[-1]
+    if name in LOCKFILES:
+        return "lockfile"
+    if name.lower().endswith(MINIFIED_SUFFIXES):
+        return "minified"
+    return None
+
+
+def skip_reason_for_sample(sample):
+    """Reason to skip a file based on the first SNIFF_SIZE characters of its content, or None."""
+    if not sample:
+        return None
+    if "\x00" in sample:
+        return "binary"
+    if len(_CONTROL_CHARACTERS.findall(sample)) / len(sample) > MAX_CONTROL_RATIO:
+        return "binary"
+    if len(sample) >= MINIFIED_MIN_SIZE and len(sample) / (sample.count("\n") + 1) > MINIFIED_LINE_LENGTH:
+        return "minified"
+    header = sample.split("\n", GENERATED_HEADER_LINES)[:GENERATED_HEADER_LINES]
+    if any(GENERATED_MARKERS.search(line) for line in header):
+        return "generated"
+    return None
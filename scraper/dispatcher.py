@@ -0,0 +1,88 @@
+import os
+import sys
+import time
+import random
+from repository import claimDueRecursiveScans, releaseRecursiveScanLeases
+from enqueue import enqueue_recursive_scans
+from encryption import decrypt
+import metrics
+
+#------------------------------- recurring scan dispatcher -----------------------------------------------
+#  Enqueues recurring scans when they are due. Runs as its own service (python dispatcher.py)
+#  and is safe to run as several replicas:
+#
+#    - every DISPATCH_INTERVAL seconds, due schedules are claimed DISPATCH_BATCH_SIZE at a time
+#      with SELECT ... FOR UPDATE SKIP LOCKED (claimDueRecursiveScans), so two dispatchers
+#      never claim the same row
+#    - a claimed schedule is leased for RECURSIVE_SCAN_LEASE_SECONDS and is not claimed again
+#      until its run finishes, even if the scan takes longer than its interval. A run that
+#      never finishes is retried once the lease runs out
+#    - each batch is enqueued to the owners' tier queues with one tier lookup and one publish
+#      (see enqueue.py). The runs add jitter to next_run_at (updateRecursiveScanAfterRun), so
+#      schedules that were created together spread out over time
+#
+#  Repository tokens are stored encrypted by the web app and decrypted here (see encryption.py).
+#--------------------------------------------------------------------------------------------------
+
+DISPATCH_INTERVAL = float(os.environ.get("DISPATCH_INTERVAL", "15"))
+DISPATCH_BATCH_SIZE = int(os.environ.get("DISPATCH_BATCH_SIZE", "100"))
+RECURSIVE_SCAN_LEASE_SECONDS = int(os.environ.get("RECURSIVE_SCAN_LEASE_SECONDS", "3600"))
+
+
+def _to_scan(row):
+    """The body /recursive-scan would receive for a claimed row."""
+    return {
+        "id": str(row["id"]),
+        "url": row["repo_url"],
+        "repoKey": decrypt(row["repoKey"]) if row["repoKey"] else None,
+        "isDeepScan": row["is_deep_scan"],
+        "extensions": row["extensions"] or [],
+        "owner_id": str(row["owner_id"]) if row["owner_id"] else None,
+        "incremental": row["incremental"],
+    }
+
+
+def dispatch_once(batch_size=DISPATCH_BATCH_SIZE, lease_seconds=RECURSIVE_SCAN_LEASE_SECONDS):
+    """Claim and enqueue every schedule that is due now. Returns how many were enqueued."""
+    dispatched = 0
+    while True:
+        rows = claimDueRecursiveScans(batch_size, lease_seconds)
+        if not rows:
+            break
+
+        scans = []
+        for row in rows:
+            try:
+                scans.append(_to_scan(row))
+            except Exception as e:
+                # keeps its lease, so it is retried when the lease runs out rather than every round
+                print(f"[dispatcher] skipping recurring scan {row['id']}, cannot decrypt its token: {e}")
+
+        try:
+            enqueue_recursive_scans(scans)
+        except Exception:
+            releaseRecursiveScanLeases([scan["id"] for scan in scans])
+            raise
+
+        dispatched += len(scans)
+        metrics.inc("recursive_scans_dispatched_total", len(scans))
+        if len(rows) < batch_size:
+            break
+    return dispatched
+
+
+def main():
+    print(f"[dispatcher] dispatching recurring scans every {DISPATCH_INTERVAL:g}s")
+    while True:
+        try:
+            dispatched = dispatch_once()
+            if dispatched:
+                print(f"[dispatcher] enqueued {dispatched} recurring scans")
+        except Exception as e:
+            print(f"[dispatcher] error: {e}")
+        # replicas started together drift apart instead of polling in lockstep
+        time.sleep(DISPATCH_INTERVAL * random.uniform(0.9, 1.1))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
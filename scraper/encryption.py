@@ -0,0 +1,43 @@
+import os
+import base64
+import hashlib
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+#------------------------------- encryption -----------------------------------------------
+#  Decrypts secrets the web app stored with encrypt() from web/src/lib/encryption.ts,
+#  such as the repository tokens of recurring scans. Both sides derive the key from
+#  ENCRYPTION_SECRET, so it must be the same for the web app and the scraper.
+#
+#    base64( salt (16) | iv (12) | tag (16) | ciphertext )
+#    key = PBKDF2-SHA256(ENCRYPTION_SECRET, salt, 100000 iterations, 32 bytes), AES-256-GCM
+#--------------------------------------------------------------------------------------------------
+
+SALT_LENGTH = 16
+IV_LENGTH = 12
+TAG_LENGTH = 16
+KEY_LENGTH = 32
+ITERATIONS = 100_000
+
+
+def _key(salt):
+    password = os.environ.get("ENCRYPTION_SECRET")
+    if not password:
+        raise RuntimeError("Missing required environment variable: ENCRYPTION_SECRET")
+    return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, ITERATIONS, KEY_LENGTH)
+
+
+def encrypt(plaintext):
+    salt = os.urandom(SALT_LENGTH)
+    iv = os.urandom(IV_LENGTH)
+    # AESGCM appends the tag to the ciphertext, the web app stores it in front
+    sealed = AESGCM(_key(salt)).encrypt(iv, plaintext.encode(), None)
+    return base64.b64encode(salt + iv + sealed[-TAG_LENGTH:] + sealed[:-TAG_LENGTH]).decode()
+
+
+def decrypt(ciphertext):
+    data = base64.b64decode(ciphertext)
+    salt = data[:SALT_LENGTH]
+    iv = data[SALT_LENGTH:SALT_LENGTH + IV_LENGTH]
+    tag = data[SALT_LENGTH + IV_LENGTH:SALT_LENGTH + IV_LENGTH + TAG_LENGTH]
+    encrypted = data[SALT_LENGTH + IV_LENGTH + TAG_LENGTH:]
+    return AESGCM(_key(salt)).decrypt(iv, encrypted + tag, None).decode()
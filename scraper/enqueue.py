@@ -0,0 +1,118 @@
+import os
+import time
+import json
+import hashlib
+import threading
+from repository import getUserTiers, coalescePendingScanJobs
+from tasks import (
+    celery_app,
+    run_scan_job_pro,
+    run_scan_job_free,
+    run_recursive_scan_job_pro,
+    run_recursive_scan_job_free,
+)
+
+#------------------------------- bulk enqueueing -----------------------------------------------
+#  Puts many scan jobs on the Celery queues at once, for POST /scan/batch and
+#  POST /recursive-scan/batch:
+#
+#    - the tiers of all owners are resolved with one query, and remembered in this process
+#      for TIER_CACHE_TTL seconds
+#    - standard scans that would scan the same thing (repository, options, token and
+#      incremental scope) while one of them is still PENDING are coalesced: only the oldest
+#      is queued, the others are attached to it and get a copy of its findings when it
+#      finishes (see coalescePendingScanJobs)
+#    - all tasks are published over one broker connection
+#--------------------------------------------------------------------------------------------------
+
+TIER_CACHE_TTL = float(os.environ.get("TIER_CACHE_TTL", "30"))
+MAX_BATCH_SIZE = int(os.environ.get("ENQUEUE_MAX_BATCH_SIZE", "500"))
+
+# user_id -> (tier, expires)
+_tiers = {}
+_tiers_lock = threading.Lock()
+
+
+def resolve_tiers(user_ids):
+    """{user_id: tier} for the given users, "free" for unknown users."""
+    now = time.monotonic()
+    tiers, missing = {}, set()
+    with _tiers_lock:
+        for user_id in set(user_ids):
+            cached = _tiers.get(user_id)
+            if cached and cached[1] > now:
+                tiers[user_id] = cached[0]
+            else:
+                missing.add(user_id)
+    if missing:
+        found = getUserTiers(missing)
+        with _tiers_lock:
+            for user_id in missing:
+                tiers[user_id] = found.get(str(user_id)) or "free"
+                _tiers[user_id] = (tiers[user_id], now + TIER_CACHE_TTL)
+    return tiers
+
+
+def forget_tier(user_id):
+    """Drop a cached tier, after the user was upgraded or downgraded."""
+    with _tiers_lock:
+        _tiers.pop(user_id, None)
+
+
+def normalize_repo_url(url):
+    return url.strip().rstrip("/").removesuffix(".git").lower()
+
+
+def coalesce_key(url, is_deep_scan, extensions, repoKey, incremental_scope, history=False, ref=None, sha=None):
+    """Jobs with the same key would produce the same findings when scanned at the same time."""
+    key = json.dumps([normalize_repo_url(url), bool(is_deep_scan), sorted(extensions or []), repoKey, incremental_scope,
+                      bool(history), ref, sha])
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def publish(messages):
+    """Send [(task, args, kwargs), ...] over one broker connection."""
+    with celery_app.producer_or_acquire() as producer:
+        for task, args, kwargs in messages:
+            task.apply_async(args, kwargs, producer=producer)
+
+
+def enqueue_scans(jobs):
+    """Queue standard scans, each a dict with the fields of POST /scan.
+
+    Returns (queued job ids, {attached job id: job id it shares}).
+    """
+    tiers = resolve_tiers(job["userId"] for job in jobs if job.get("userId"))
+
+    prepared = []
+    for job in jobs:
+        user_id = job.get("userId")
+        incremental_scope = f"user:{user_id}" if job.get("incremental", False) and user_id else None
+        args = (job["id"], job["url"], job.get("isDeepScan", False), job.get("extensions", []), job.get("repoKey"))
+        history, ref, sha = job.get("history", False), job.get("ref"), job.get("sha")
+        key = coalesce_key(job["url"], args[2], args[3], args[4], incremental_scope, history, ref, sha)
+        task = run_scan_job_pro if tiers.get(user_id) == "pro" else run_scan_job_free
+        kwargs = {"incremental_scope": incremental_scope, "coalesced": True, "history": history, "ref": ref, "sha": sha}
+        prepared.append((job["id"], key, task, args, kwargs))
+
+    attached = coalescePendingScanJobs([(job_id, key) for job_id, key, *_ in prepared])
+    messages = [(task, args, kwargs) for job_id, _, task, args, kwargs in prepared if str(job_id) not in attached]
+    publish(messages)
+    return [args[0] for _, args, _ in messages], attached
+
+
+def enqueue_recursive_scans(scans):
+    """Queue recurring scans, each a dict with the fields of POST /recursive-scan. Returns their ids.
+
+    Their scan jobs are only created when the task runs, so they are not coalesced.
+    """
+    tiers = resolve_tiers(scan["owner_id"] for scan in scans if scan.get("owner_id"))
+
+    messages = []
+    for scan in scans:
+        task = run_recursive_scan_job_pro if tiers.get(scan.get("owner_id")) == "pro" else run_recursive_scan_job_free
+        args = (scan["id"], scan["url"], scan.get("repoKey"), scan.get("isDeepScan", False), scan.get("extensions", []))
+        kwargs = {"incremental_scope": f"recursive:{scan['id']}" if scan.get("incremental", False) else None}
+        messages.append((task, args, kwargs))
+    publish(messages)
+    return [args[0] for _, args, _ in messages]
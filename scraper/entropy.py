@@ -0,0 +1,147 @@
+import math
+import string
+import numpy as np
+
+#------------------------------- entropy -----------------------------------------------
+#  Decides whether a candidate token is random enough to be reported as a
+#  "High Entropy String". A token is checked against the hex, base64 and url-safe
+#  alphabets in turn: at least 80% of it has to come from the alphabet and the
+#  Shannon entropy of those characters, relative to the alphabet's maximum, has to
+#  reach the alphabet's threshold.
+#
+#  entropy_severity does this for one token in plain Python. entropy_severities
+#  does the same for a whole file's tokens at once: the characters of every token
+#  are mapped through a lookup table per alphabet and the per-token character
+#  histograms and entropies come out of a few numpy operations. Results within
+#  TIE_EPSILON of a threshold are recomputed with entropy_severity, so both give
+#  exactly the same verdicts.
+#--------------------------------------------------------------------------------------------
+
+BASE64_CHARSET  = set(string.ascii_letters + string.digits + "+/=")
+URLSAFE_CHARSET = set(string.ascii_letters + string.digits + "-_=")
+HEX_CHARSET     = set(string.hexdigits)
+
+# relative entropy a token has to reach within a charset to be reported
+ENTROPY_THRESHOLDS = {"hex": 0.87, "base64": 0.75, "urlsafe": 0.75}
+
+# (charset, threshold name, minimum token length) in the order they are checked
+ENTROPY_CHECKS = [
+    (HEX_CHARSET,     "hex",     32),
+    (BASE64_CHARSET,  "base64",  24),
+    (URLSAFE_CHARSET, "urlsafe", 24),
+]
+MIN_CHARSET_RATIO = 0.80
+# tokens with fewer characters from the charset have no meaningful entropy
+MIN_CHARSET_CHARS = 8
+
+# below this many tokens the numpy setup costs more than it saves
+VECTORIZE_MIN_TOKENS = 16
+# tokens per numpy pass, bounds the (tokens x charset) histogram to a few MB
+VECTORIZE_BATCH_SIZE = 2048
+TIE_EPSILON = 1e-9
+
+
+def relative_entropy(token, charset):
+    """Returns 0.0 to 1.0 — how close to maximum randomness for this charset."""
+    filtered = [c for c in token if c in charset]
+    if len(filtered) < MIN_CHARSET_CHARS:
+        return 0.0
+    freq = {}
+    for c in filtered:
+        freq[c] = freq.get(c, 0) + 1
+    length = len(filtered)
+    raw = -sum((n / length) * math.log2(n / length) for n in freq.values())
+    max_e = math.log2(len(charset))
+    return raw / max_e if max_e > 0 else 0.0
+
+
+def entropy_severity(token):
+    for charset, name, min_length in ENTROPY_CHECKS:
+        if len(token) < min_length:
+            continue
+        charset_ratio = sum(1 for c in token if c in charset) / len(token)
+        if charset_ratio < MIN_CHARSET_RATIO:
+            continue
+        if relative_entropy(token, charset) >= ENTROPY_THRESHOLDS[name]:
+            return "HIGH"
+    return None
+
+
+def _lookup_table(charset):
+    """Map a character code to its position in the charset, or -1."""
+    table = np.full(256, -1, dtype=np.intp)
+    table[sorted(ord(c) for c in charset)] = np.arange(len(charset))
+    return table
+
+
+_LOOKUP_TABLES = [_lookup_table(charset) for charset, _, _ in ENTROPY_CHECKS]
+
+
+def entropy_severities(tokens):
+    """Return [entropy_severity(token) for token in tokens], computed in vectorized batches."""
+    tokens = list(tokens)
+    if len(tokens) < VECTORIZE_MIN_TOKENS:
+        return [entropy_severity(token) for token in tokens]
+
+    severities = []
+    for start in range(0, len(tokens), VECTORIZE_BATCH_SIZE):
+        severities.extend(_severity_batch(tokens[start:start + VECTORIZE_BATCH_SIZE]))
+    return severities
+
+
+def _severity_batch(tokens):
+    count = len(tokens)
+    lengths = np.fromiter(map(len, tokens), dtype=np.int64, count=count)
+    # one code point per character; anything outside latin-1 is in none of the charsets
+    codes = np.frombuffer("".join(tokens).encode("utf-32-le"), dtype=np.uint32)
+    codes = np.minimum(codes, 255).astype(np.intp)
+    owner = np.repeat(np.arange(count), lengths)
+
+    high = np.zeros(count, dtype=bool)
+    near_threshold = np.zeros(count, dtype=bool)
+
+    # n * log2(n) for every count a character can have in a token
+    counts = np.arange(lengths.max() + 1, dtype=np.float64)
+    n_log_n = counts * np.log2(np.maximum(counts, 1))
+
+    for (charset, name, min_length), table in zip(ENTROPY_CHECKS, _LOOKUP_TABLES):
+        position = table[codes]
+        in_charset = position >= 0
+        filtered = np.bincount(owner[in_charset], minlength=count)
+        eligible = (
+            (lengths >= min_length)
+            & (filtered / np.maximum(lengths, 1) >= MIN_CHARSET_RATIO)
+            & (filtered >= MIN_CHARSET_CHARS)
+        )
+        if not eligible.any():
+            continue
+
+        # histogram of the charset's characters for every eligible token
+        rows = np.flatnonzero(eligible)
+        row_of = np.full(count, -1)
+        row_of[rows] = np.arange(len(rows))
+        selected = in_charset & eligible[owner]
+        size = len(charset)
+        histogram = np.bincount(
+            row_of[owner[selected]] * size + position[selected], minlength=len(rows) * size
+        ).reshape(len(rows), size)
+
+        # H = -sum(n/L * log2(n/L)) = log2(L) - sum(n * log2(n)) / L
+        total = filtered[rows].astype(np.float64)
+        entropy = np.log2(total) - n_log_n[histogram].sum(axis=1) / total
+        relative = entropy / math.log2(size)
+
+        threshold = ENTROPY_THRESHOLDS[name]
+        high[rows] |= relative >= threshold + TIE_EPSILON
+        near_threshold[rows] |= np.abs(relative - threshold) < TIE_EPSILON
+
+    severities = []
+    for token, is_high, is_near in zip(tokens, high.tolist(), near_threshold.tolist()):
+        if is_high:
+            severities.append("HIGH")
+        elif is_near:
+            # floating point summation order could tip it either way, ask the exact version
+            severities.append(entropy_severity(token))
+        else:
+            severities.append(None)
+    return severities
@@ -0,0 +1,41 @@
+import os
+import time
+from repository import insertScanFindingsBatch
+
+#------------------------------- finding sink -----------------------------------------------
+#  Every scan job owns one FindingSink. The scanner adds findings to it instead of
+#  writing them one by one, and the sink writes them to scan_findings in bulk
+#  once FINDINGS_BATCH_SIZE findings are buffered, and one last time when the job ends.
+#  Writes use ON CONFLICT DO NOTHING, so flushing the same finding twice is harmless.
+#--------------------------------------------------------------------------------------------
+
+FINDINGS_BATCH_SIZE = int(os.environ.get("SCAN_FINDINGS_BATCH_SIZE", 500))
+
+
+class FindingSink:
+    def __init__(self, job_id, batch_size=FINDINGS_BATCH_SIZE):
+        self.job_id = job_id
+        self.batch_size = batch_size
+        self.pending = []
+        self.written = 0
+        # time spent writing, reported in the job's stats
+        self.seconds = 0.0
+
+    def add(self, file_path, line_number, code_snippet, severity, rule, branch="main", commit_sha=None):
+        self.pending.append((self.job_id, file_path, line_number, code_snippet, severity, rule, branch, commit_sha))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write all buffered findings and return how many were sent."""
+        if not self.pending:
+            return 0
+        batch = self.pending
+        self.pending = []
+        started = time.perf_counter()
+        try:
+            insertScanFindingsBatch(batch)
+        finally:
+            self.seconds += time.perf_counter() - started
+        self.written += len(batch)
+        return len(batch)
@@ -0,0 +1,386 @@
+import os
+import codecs
+import subprocess
+
+#------------------------------- git object access -----------------------------------------------
+#  Helpers for reading a clone's objects without checking anything out.
+#  Branch trees are listed with `git ls-tree -r` and blob contents are streamed
+#  through one long-lived `git cat-file --batch` process per scan.
+#--------------------------------------------------------------------------------------------------
+
+BLOB_MODES = {"100644", "100755"}
+# seconds to wait for a remote to list its refs
+LS_REMOTE_TIMEOUT = 30
+
+
+def authenticated_url(repo_url, token=None):
+    """The url git should use for repo_url, with the access token if there is one."""
+    if not token:
+        return repo_url
+    # https://github.com/owner/repo → https://<token>@github.com/owner/repo
+    return repo_url.replace("https://", f"https://{token}@")
+
+
+def ls_remote(url, *patterns, timeout=LS_REMOTE_TIMEOUT):
+    """Return {ref: commit_sha} of the refs of a remote repository matching patterns, without cloning it."""
+    proc = subprocess.run(
+        ["git", "ls-remote", url, *patterns],
+        check=True, capture_output=True, text=True, timeout=timeout,
+        # fail instead of asking for credentials
+        env={**os.environ, "GIT_TERMINAL_PROMPT": "0"},
+    )
+    refs = {}
+    for line in proc.stdout.splitlines():
+        sha, ref = line.split("\t", 1)
+        refs[ref] = sha
+    return refs
+
+
+def list_remote_branches(repo_path, remote="origin"):
+    """Return the branch names tracked under refs/remotes/<remote>, without the HEAD pointer."""
+    proc = subprocess.run(
+        ["git", "for-each-ref", "--format=%(refname:lstrip=3)", f"refs/remotes/{remote}"],
+        cwd=repo_path,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return [name for name in proc.stdout.splitlines() if name and name != "HEAD"]
+
+
+def list_tree(repo_path, ref):
+    """Return (blob_sha, path) for every regular file in the tree of ref.
+
+    Symlinks and submodules are skipped, they do not hold scannable content.
+    """
+    proc = subprocess.run(
+        ["git", "ls-tree", "-r", "-z", "--full-tree", ref],
+        cwd=repo_path,
+        check=True,
+        capture_output=True,
+    )
+    entries = []
+    for record in proc.stdout.split(b"\0"):
+        if not record:
+            continue
+        # "<mode> SP <type> SP <sha> TAB <path>"
+        info, path = record.split(b"\t", 1)
+        mode, obj_type, sha = info.decode().split(" ")
+        if obj_type != "blob" or mode not in BLOB_MODES:
+            continue
+        entries.append((sha, path.decode("utf-8", errors="surrogateescape")))
+    return entries
+
+
+class GitObjectReader:
+    """Reads objects from a repository through a single `git cat-file --batch` process."""
+
+    def __init__(self, repo_path):
+        self.proc = subprocess.Popen(
+            ["git", "cat-file", "--batch"],
+            cwd=repo_path,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def read(self, sha):
+        """Return the raw bytes of an object, or None if it does not exist."""
+        size = self.read_header(sha)
+        if size is None:
+            return None
+        return self.read_content(size)
+
+    def read_header(self, sha):
+        """Request an object and return its size, or None if it does not exist.
+
+        The object's content must then be consumed with read_content or iter_text
+        before the next request.
+        """
+        self.proc.stdin.write(sha.encode() + b"\n")
+        self.proc.stdin.flush()
+
+        header = self.proc.stdout.readline()
+        if not header:
+            raise RuntimeError("git cat-file exited unexpectedly")
+        if header.endswith(b" missing\n"):
+            return None
+        return int(header.split()[2])
+
+    def read_content(self, size):
+        data = self.proc.stdout.read(size)
+        # every object is followed by a single newline
+        self.proc.stdout.read(1)
+        return data
+
+    def skip_content(self, size):
+        """Discard the content of the requested object without keeping it in memory."""
+        remaining = size
+        while remaining:
+            block = self.proc.stdout.read(min(1 << 16, remaining))
+            if not block:
+                raise RuntimeError("git cat-file exited unexpectedly")
+            remaining -= len(block)
+        self.proc.stdout.read(1)
+
+    def iter_text(self, size, block_size=1 << 16):
+        """Yield the content of the requested object as utf-8 text, block_size bytes at a time.
+
+        Whatever the caller does not consume is skipped when the generator is
+        closed, so the reader stays usable.
+        """
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        remaining = size
+        try:
+            while remaining:
+                block = self.proc.stdout.read(min(block_size, remaining))
+                if not block:
+                    raise RuntimeError("git cat-file exited unexpectedly")
+                remaining -= len(block)
+                yield decoder.decode(block)
+            yield decoder.decode(b"", final=True)
+        finally:
+            while remaining:
+                block = self.proc.stdout.read(min(block_size, remaining))
+                if not block:
+                    break
+                remaining -= len(block)
+            self.proc.stdout.read(1)
+
+    def close(self):
+        if self.proc.poll() is None:
+            self.proc.stdin.close()
+            self.proc.wait()
+        self.proc.stdout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def list_index(repo_path):
+    """Return {path: blob_sha} for the regular files in a checkout's index.
+
+    Returns an empty dict when repo_path is not a git checkout.
+    """
+    try:
+        proc = subprocess.run(
+            ["git", "ls-files", "-s", "-z"],
+            cwd=repo_path,
+            check=True,
+            capture_output=True,
+        )
+    except (subprocess.CalledProcessError, OSError):
+        return {}
+
+    index = {}
+    for record in proc.stdout.split(b"\0"):
+        if not record:
+            continue
+        # "<mode> SP <sha> SP <stage> TAB <path>"
+        info, path = record.split(b"\t", 1)
+        mode, sha, _stage = info.decode().split(" ")
+        if mode in BLOB_MODES:
+            index[path.decode("utf-8", errors="surrogateescape")] = sha
+    return index
+
+
+def resolve_head(repo_path):
+    """Return (commit_sha, branch_name) of a clone's HEAD."""
+    sha = subprocess.run(
+        ["git", "rev-parse", "HEAD"],
+        cwd=repo_path, check=True, capture_output=True, text=True,
+    ).stdout.strip()
+    branch = subprocess.run(
+        ["git", "rev-parse", "--abbrev-ref", "HEAD"],
+        cwd=repo_path, check=True, capture_output=True, text=True,
+    ).stdout.strip()
+    return sha, branch
+
+
+def object_store_size(repo_path):
+    """Bytes of objects in a clone, loose and packed. 0 if it cannot be determined."""
+    proc = subprocess.run(
+        ["git", "count-objects", "-v"],
+        cwd=repo_path, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        return 0
+    # sizes are reported in KiB
+    fields = dict(line.split(": ", 1) for line in proc.stdout.splitlines() if ": " in line)
+    return (int(fields.get("size", 0)) + int(fields.get("size-pack", 0))) * 1024
+
+
+def disk_usage(path):
+    """Bytes taken by the files below path, .git included."""
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def missing_blobs(repo_path, ref="HEAD"):
+    """Return the shas of the blobs of ref a partial clone left on the server, without fetching them."""
+    proc = subprocess.run(
+        ["git", "rev-list", "--objects", "--missing=print", ref],
+        cwd=repo_path, check=True, capture_output=True, text=True,
+    )
+    return {line[1:] for line in proc.stdout.splitlines() if line.startswith("?")}
+
+
+def sparse_checkout(repo_path, patterns):
+    """Check out only the files matching patterns (gitignore syntax) in a clone made with --no-checkout.
+
+    In a partial clone the blobs of those files are fetched in one request.
+    """
+    subprocess.run(
+        ["git", "sparse-checkout", "set", "--no-cone", "--stdin"],
+        cwd=repo_path, check=True, input="".join(f"{pattern}\n" for pattern in patterns).encode(),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    subprocess.run(
+        ["git", "checkout", "--quiet"],
+        cwd=repo_path, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def is_partial_clone(repo_path, remote="origin"):
+    """True if objects missing from the clone are fetched lazily from remote."""
+    proc = subprocess.run(
+        ["git", "config", "--get", f"remote.{remote}.promisor"],
+        cwd=repo_path, capture_output=True, text=True,
+    )
+    return proc.stdout.strip() == "true"
+
+
+def has_commit(repo_path, sha):
+    proc = subprocess.run(
+        ["git", "cat-file", "-e", f"{sha}^{{commit}}"],
+        cwd=repo_path, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    return proc.returncode == 0
+
+
+def fetch_commit(repo_path, sha, remote="origin"):
+    """Fetch a single commit and its trees, without any blobs. Returns False if the remote refuses.
+
+    Complete clones are checked first; in a partial clone that check would itself
+    trigger a lazy fetch, so the commit is always fetched explicitly there.
+    """
+    if not is_partial_clone(repo_path, remote) and has_commit(repo_path, sha):
+        return True
+    proc = subprocess.run(
+        ["git", "fetch", "--quiet", "--no-tags", "--depth", "1", "--filter=blob:none", remote, sha],
+        cwd=repo_path,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    return proc.returncode == 0
+
+
+def changed_blobs(repo_path, base, head):
+    """Return (blob_sha, path) for every regular file added or modified between two commits."""
+    proc = subprocess.run(
+        ["git", "diff-tree", "-r", "-z", "--no-renames", "--diff-filter=AM", base, head],
+        cwd=repo_path,
+        check=True,
+        capture_output=True,
+    )
+    records = proc.stdout.split(b"\0")
+    entries = []
+    # ":<old mode> <new mode> <old sha> <new sha> <status>" NUL "<path>" NUL
+    for info, path in zip(records[0::2], records[1::2]):
+        if not info.startswith(b":"):
+            continue
+        _old_mode, new_mode, _old_sha, new_sha, _status = info[1:].decode().split(" ")
+        if new_mode in BLOB_MODES:
+            entries.append((new_sha, path.decode("utf-8", errors="surrogateescape")))
+    return entries
+
+
+def prefetch_blobs(repo_path, shas, remote="origin"):
+    """Download missing blobs of a partial clone in one request instead of one lazy fetch per blob.
+
+    Returns False if the fetch failed; reading the blobs then falls back to git's lazy fetching.
+    """
+    shas = list(shas)
+    if not shas or not is_partial_clone(repo_path, remote):
+        return True
+    proc = subprocess.run(
+        ["git", "-c", "fetch.negotiationAlgorithm=noop", "fetch", "--quiet", "--no-tags",
+         "--no-write-fetch-head", "--recurse-submodules=no", "--filter=blob:none", "--stdin", remote],
+        cwd=repo_path,
+        input="\n".join(shas).encode(),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    return proc.returncode == 0
+
+
+def remote_heads(repo_path, remote="origin"):
+    """Return {branch: commit_sha} for the branches tracked under refs/remotes/<remote>."""
+    proc = subprocess.run(
+        ["git", "for-each-ref", "--format=%(objectname) %(refname:lstrip=3)", f"refs/remotes/{remote}"],
+        cwd=repo_path, check=True, capture_output=True, text=True,
+    )
+    heads = {}
+    for line in proc.stdout.splitlines():
+        sha, name = line.split(" ", 1)
+        if name != "HEAD":
+            heads[name] = sha
+    return heads
+
+
+def iter_history(repo_path, remote="origin", exclude=(), block_size=1 << 16):
+    """Yield (commit_sha, branch, [(blob_sha, path), ...]) for every commit of the remote's branches.
+
+    Commits come oldest first (parents before children) and list the regular files they
+    added or modified; merges are compared with their first parent. branch is the branch
+    git reached the commit through. Commits reachable from exclude are left out.
+    The log is streamed, it is never held in memory as a whole.
+    """
+    args = [
+        "git", "log", f"--exclude={remote}/HEAD", f"--remotes={remote}",
+        "--reverse", "--topo-order", "--source", "--no-renames", "--raw", "--no-abbrev",
+        "--diff-merges=first-parent", "--diff-filter=AM", "-z", "--format=%x01%H %S",
+    ]
+    if exclude:
+        args += ["--not", *exclude]
+    proc = subprocess.Popen(args, cwd=repo_path, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        commit = branch = info = None
+        entries = []
+        pending = b""
+        # "\x01<commit> <source>" NUL, then per file "\n:<old mode> <new mode> <old sha> <new sha> <status>" NUL "<path>" NUL
+        for block in iter(lambda: proc.stdout.read(block_size), b""):
+            records = (pending + block).split(b"\0")
+            pending = records.pop()
+            for record in records:
+                if info is not None:
+                    _old_mode, new_mode, _old_sha, new_sha, _status = info.split(" ")
+                    if new_mode in BLOB_MODES:
+                        entries.append((new_sha, record.decode("utf-8", errors="surrogateescape")))
+                    info = None
+                elif record.startswith(b"\x01"):
+                    if commit is not None:
+                        yield commit, branch, entries
+                    commit, source = record[1:].decode().split(" ", 1)
+                    branch = source.removeprefix(f"{remote}/")
+                    entries = []
+                elif record.lstrip(b"\n").startswith(b":"):
+                    info = record.lstrip(b"\n")[1:].decode()
+        if commit is not None:
+            yield commit, branch, entries
+        if proc.wait() != 0:
+            raise subprocess.CalledProcessError(proc.returncode, args[:2])
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
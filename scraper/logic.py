@@ -1,14 +1,33 @@
 import re
 import os
+import time
 import subprocess
 import tempfile
 import shutil
 import requests
-import math
-import string
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from bisect import bisect_right
 from datetime import datetime
-from collections import defaultdict
+from collections import defaultdict, Counter, deque
+from itertools import chain
 from repository import *
+from rules import compile_rules
+from findings import FindingSink
+from gitobjects import (
+    GitObjectReader, list_remote_branches, list_tree, list_index,
+    resolve_head, fetch_commit, changed_blobs, prefetch_blobs, object_store_size,
+    has_commit, remote_heads, iter_history, missing_blobs, sparse_checkout, disk_usage, authenticated_url,
+)
+from blobcache import BlobScanCache, BLOB_CACHE_ENABLED
+from mirrorcache import MirrorCache, MIRROR_CACHE_DIR
+from budget import ScanBudget, BudgetExceeded
+from stats import ScanStats
+from ruleprofile import RuleProfile, SCAN_PROFILE_RULES
+import metrics
+from classify import SKIP_DIRECTORIES, SNIFF_SIZE, skip_reason_for_path, skip_reason_for_sample
+from entropy import ENTROPY_THRESHOLDS, relative_entropy, entropy_severity, entropy_severities
+import hashlib
 import json
 from pathlib import Path
 #------------------------------- basic flow -----------------------------------------------
@@ -21,6 +40,23 @@ from pathlib import Path
 
 config_path = Path('/app/ignoreSettingsConfig.json')
 
+# parallel scanning: files are handed to the worker processes in chunks of this size,
+# and repos with fewer matching files than PARALLEL_MIN_FILES are always scanned serially
+PARALLEL_CHUNK_SIZE = int(os.environ.get("SCAN_PARALLEL_CHUNK_SIZE", 64))
+PARALLEL_MIN_FILES = int(os.environ.get("SCAN_PARALLEL_MIN_FILES", 128))
+
+# files larger than SCAN_STREAM_THRESHOLD_BYTES are not read into memory at once but
+# scanned in windows of about SCAN_STREAM_CHUNK_SIZE characters. consecutive windows
+# overlap by SCAN_STREAM_OVERLAP characters so matches across a boundary are still found.
+STREAM_THRESHOLD_BYTES = int(os.environ.get("SCAN_STREAM_THRESHOLD_BYTES", 8 * 1024 * 1024))
+STREAM_CHUNK_SIZE = int(os.environ.get("SCAN_STREAM_CHUNK_SIZE", 1024 * 1024))
+STREAM_OVERLAP = int(os.environ.get("SCAN_STREAM_OVERLAP", 64 * 1024))
+# a window grows up to this size to end on a line break, longer lines are split
+STREAM_MAX_LINE = int(os.environ.get("SCAN_STREAM_MAX_LINE", 16 * 1024 * 1024))
+STREAM_BLOCK_SIZE = 64 * 1024
+# characters kept in front of a window so lookbehinds and ^ see the real preceding text
+STREAM_CONTEXT = 256
+
 
 # getting file extensions from json file incase none are given
 try:
@@ -34,24 +70,40 @@ except Exception as e:
     ".cfg", ".conf", ".config", ".env", ".sh", ".bash", ".zsh", ".fish",
     ".ps1", ".bat", ".cmd", ".txt", ".rst", ".tex", ".csv", ".sql"]
     print(f"JSON Erroasdr: {e}")
-    #Entropy prefix
-
-    BASE64_CHARSET  = set(string.ascii_letters + string.digits + "+/=")
-    URLSAFE_CHARSET = set(string.ascii_letters + string.digits + "-_=")
-    HEX_CHARSET     = set(string.hexdigits)
-    
-    FALSE_POSITIVE_PATTERNS = [
-            re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$', re.I),  # UUID
-            re.compile(r'^[0-9a-f]{40}$'),          # git SHA1
-            re.compile(r'^[0-9a-f]{64}$'),          # git SHA256
-            re.compile(r'^(.)\1{6,}'),              # repeating chars "aaaaaaaaaa"
-            re.compile(r'^[a-z]{20,}$'),            # all lowercase = probably a word/slug
-            re.compile(r'^[A-Z][a-z]+([A-Z][a-z]+){3,}$'),  # CamelCase = probably a class name
-        ]
+
+#Entropy prefix
+
+FALSE_POSITIVE_PATTERNS = [
+        re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$', re.I),  # UUID
+        re.compile(r'^[0-9a-f]{40}$'),          # git SHA1
+        re.compile(r'^[0-9a-f]{64}$'),          # git SHA256
+        re.compile(r'^(.)\1{6,}'),              # repeating chars "aaaaaaaaaa"
+        re.compile(r'^[a-z]{20,}$'),            # all lowercase = probably a word/slug
+        re.compile(r'^[A-Z][a-z]+([A-Z][a-z]+){3,}$'),  # CamelCase = probably a class name
+    ]
+
+# Bump when the way findings are derived from a file changes in a way the rule
+# table does not capture (snippet format, line numbering, ...), so cached
+# blob results from older scanners are no longer used.
+SCANNER_REVISION = 3
+
+# history scans read blobs in batches of this many and record their progress after each batch
+HISTORY_BATCH_BLOBS = int(os.environ.get("SCAN_HISTORY_BATCH_BLOBS", 5000))
+
+# the files and blobs a job has finished are recorded every this many, so a retried or
+# redelivered job skips them instead of scanning the whole repository again
+CHECKPOINT_EVERY = int(os.environ.get("SCAN_CHECKPOINT_EVERY", 1000))
+
+
+def _escape_pattern(text):
+    """Escape text for use in a sparse checkout (gitignore) pattern."""
+    return re.sub(r'([\\*?\[\]!# ])', r'\\\1', text)
 
 
 class GitHubSecretScanner:
-    def __init__(self, repo_url, job_id, isDeepScan=False, extensions=defaultExtensions, repoKey=None):
+    def __init__(self, repo_url, job_id, isDeepScan=False, extensions=defaultExtensions, repoKey=None, workers=1,
+                 incremental_scope=None, budget=None, profile_rules=SCAN_PROFILE_RULES, history=False,
+                 ref=None, sha=None):
         self.repo_url = repo_url
         self.job_id = job_id
         self.scanned_files = 0
@@ -59,6 +111,42 @@ class GitHubSecretScanner:
         self.isDeepScan = isDeepScan
         self.extensions = extensions
         self.repoKey = repoKey
+        # number of processes used to scan files, 1 scans in this process
+        self.workers = workers
+        # when set, only blobs changed since the last commit scanned for this scope are scanned
+        self.incremental_scope = incremental_scope
+        # (branch, commit sha) of the head an incremental scan covered
+        self.scanned_head = None
+        # scan every blob ever committed instead of the current trees, see scan_history
+        self.history = history
+        # branch (name or refs/heads/<name>) and/or commit that default and incremental scans
+        # fetch and scan instead of the head of the default branch, see fetch_target
+        self.ref = ref
+        self.sha = sha
+        # findings are buffered per job and written to the DB in batches
+        self.finding_sink = FindingSink(job_id)
+        # blob shas (paths when scanning a checkout) finished by earlier attempts of this job,
+        # and the ones finished since the last checkpoint, see save_checkpoint
+        self.resumed = set()
+        self.checkpoint_pending = []
+        # the commits the clone is at, checkpoints are only resumed by a clone at the same ones
+        self.checkpoint_head = None
+        self.checkpoint_saved = False
+        # findings of previously scanned blobs, created on first use
+        self.use_blob_cache = BLOB_CACHE_ENABLED
+        self.blob_cache = None
+        self.cache_hits = 0
+        # reason -> number of files the classifier skipped (see classify.py)
+        self.skipped = Counter()
+        # resource limits of this job, and why it stopped early if it ran out
+        self.budget = budget.copy() if budget is not None else ScanBudget()
+        self.partial_reason = None
+        # per-phase timings and counters, stored with the job (see stats.py)
+        self.stats = ScanStats()
+        # time and matches per rule, only when profiling is turned on (see ruleprofile.py)
+        self.rule_profile = RuleProfile() if profile_rules else None
+        # local mirrors to clone from instead of the network, None clones directly
+        self.mirror_cache = MirrorCache() if MIRROR_CACHE_DIR else None
         self.entropy_candidate_pattern = re.compile(
             r'(?<![A-Za-z0-9])([A-Za-z0-9+/=_-]{20,}|[A-Fa-f0-9]{32,})(?![A-Za-z0-9])')
 
@@ -120,15 +208,39 @@ class GitHubSecretScanner:
 
     def clone_repo(self):
         self.write_log("Cloning repository...")
-        temp_dir = tempfile.mkdtemp()
 
-        clone_url = self.repo_url
-        if self.repoKey:
-            # https://github.com/owner/repo → https://<token>@github.com/owner/repo
-            clone_url = self.repo_url.replace("https://", f"https://{self.repoKey}@")
+        clone_url = authenticated_url(self.repo_url, self.repoKey)
+        targeted = (self.ref or self.sha) and not (self.isDeepScan or self.history)
+
+        # deep, history and incremental scans read git objects, only the default scan walks a checkout
+        checkout = not (self.isDeepScan or self.history or self.incremental_scope)
+        # mirrors are full clones, a default scan with a file size limit clones directly instead
+        # so that the server leaves out blobs over the limit (see below)
+        filtered = checkout and self.budget.max_file_size
+
+        # the mirror cache serves clones of the default branch only
+        if self.mirror_cache is not None and not targeted and not filtered:
+            try:
+                sparse = self.checkout_patterns() if checkout else None
+                repo_path = self.mirror_cache.clone(self.repo_url, clone_url, checkout=checkout, sparse=sparse)
+                self.write_log("Repository cloned from mirror cache.")
+                return repo_path
+            except Exception as e:
+                # not the message itself, the failed git command line carries the token
+                self.write_log(f"Mirror cache unavailable ({type(e).__name__}), cloning directly.")
+
+        temp_dir = tempfile.mkdtemp()
 
         try:
-            if self.isDeepScan == True:
+            if self.history:
+                # full clone without checkout, every commit's blobs are read from the object store
+                subprocess.run(
+                    ["git", "clone", "--no-checkout", clone_url, temp_dir],
+                    check=True,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL
+                )
+            elif self.isDeepScan == True:
                 # full clone with all branches and history
                 subprocess.run(
                     ["git", "clone", clone_url, temp_dir],
@@ -136,14 +248,31 @@ class GitHubSecretScanner:
                     stdout=subprocess.DEVNULL,
                     stderr=subprocess.DEVNULL
                 )
+            elif targeted:
+                self.fetch_target(clone_url, temp_dir)
+            elif self.incremental_scope:
+                # blobless shallow clone without checkout - blobs are fetched
+                # only for the files the incremental scan actually needs
+                subprocess.run(
+                    ["git", "clone", "--depth", "1", "--filter=blob:none", "--no-checkout", clone_url, temp_dir],
+                    check=True,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL
+                )
             else:
-                # shallow clone - only default branch
+                # shallow partial clone of the default branch, only files with an enabled extension
+                # are checked out. without a file size limit no blob is downloaded before the checkout,
+                # which fetches just those files. with one, the server leaves out larger blobs instead
+                # (git cannot combine both filters) and they are never downloaded
+                limit = self.budget.max_file_size
                 subprocess.run(
-                    ["git", "clone", "--depth", "1", clone_url, temp_dir],
+                    ["git", "clone", "--depth", "1", f"--filter=blob:limit={limit}" if limit else "--filter=blob:none",
+                     "--no-checkout", "--sparse", clone_url, temp_dir],
                     check=True,
                     stdout=subprocess.DEVNULL,
                     stderr=subprocess.DEVNULL
                 )
+                self.checkout_scannable(temp_dir)
             self.write_log("Repository cloned successfully.")
             return temp_dir
 
@@ -152,36 +281,99 @@ class GitHubSecretScanner:
             self.write_log("Failed to clone repo")
             raise Exception("Failed to clone repository.")
 
+    def target_branch(self):
+        """The branch findings are attributed to: the pushed branch, the commit if only that is known, else main."""
+        if self.ref:
+            return self.ref.removeprefix("refs/heads/")
+        return self.sha[:12] if self.sha else "main"
+
+    def fetch_target(self, clone_url, temp_dir):
+        """
+        fetch just the commit of self.sha, or the head of self.ref: single branch,
+        depth 1 and blobless. the local branch is named after the target, so
+        incremental scans record their head for it. default scans then check out
+        their files like a default branch clone.
+        """
+        limit = self.budget.max_file_size
+        blob_filter = f"blob:limit={limit}" if limit and not self.incremental_scope else "blob:none"
+        target = self.sha or f"refs/heads/{self.target_branch()}"
+        for args in (
+            ["init", "--quiet", f"--initial-branch={self.target_branch()}", temp_dir],
+            ["remote", "add", "origin", clone_url],
+            ["fetch", "--quiet", "--depth", "1", "--no-tags", f"--filter={blob_filter}", "origin", target],
+            ["update-ref", "HEAD", "FETCH_HEAD"],
+        ):
+            subprocess.run(
+                ["git", *args],
+                cwd=temp_dir,
+                check=True,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
+            )
+        if not self.incremental_scope:
+            self.checkout_scannable(temp_dir)
+
+    def checkout_patterns(self):
+        """Sparse checkout patterns for the files is_text_file accepts, ignoring case like it does."""
+        patterns = []
+        for ext in self.extensions:
+            escaped = "".join(f"[{c.lower()}{c.upper()}]" if c.isalpha() else _escape_pattern(c) for c in ext)
+            patterns.append("*" + escaped)
+        return patterns
+
+    def checkout_scannable(self, repo_path):
+        """Check out the files the scan reads, except those whose blobs the clone's size filter left out."""
+        patterns = self.checkout_patterns()
+        if self.budget.max_file_size:
+            missing = missing_blobs(repo_path)
+            for sha, path in list_tree(repo_path, "HEAD"):
+                # a path with a newline cannot be written as a pattern, the checkout fetches it instead
+                if sha in missing and "\n" not in path and self.is_text_file(os.path.basename(path)):
+                    patterns.append("!/" + _escape_pattern(path))
+                    self.skipped["too_large"] += 1
+        sparse_checkout(repo_path, patterns)
+
     # ---------------- File Handling ---------------- #
 
     def is_text_file(self, filename):
         text_extensions = self.extensions
         return filename.lower().endswith(tuple(text_extensions))
 
-    def find_line_number(self, content, match):
-        """Return (line_number, line_text) for the first line containing match.
+    def should_scan_path(self, path):
+        """Extension filter plus the path-based skips of the classifier, which are counted."""
+        if not self.is_text_file(os.path.basename(path)):
+            return False
+        reason = skip_reason_for_path(path)
+        if reason:
+            self.skipped[reason] += 1
+            return False
+        return True
+
+    def build_line_index(self, content):
+        """Return the offset of the first character of every line in content."""
+        line_starts = [0]
+        pos = content.find('\n')
+        while pos != -1:
+            line_starts.append(pos + 1)
+            pos = content.find('\n', pos + 1)
+        return line_starts
 
-        If not found, returns (0, '').
+    def find_line_number(self, content, line_starts, offset):
+        """Return (line_number, line_text) for the line containing offset.
+
+        line_starts comes from build_line_index, so each lookup is a binary
+        search instead of a rescan of the whole file.
         """
-        for i, line in enumerate(content.split('\n'), 1):
-            if match in line:
-                return i, line
-        return 0, ""
+        index = bisect_right(line_starts, offset) - 1
+        start = line_starts[index]
+        end = line_starts[index + 1] - 1 if index + 1 < len(line_starts) else len(content)
+        return index + 1, content[start:end]
 
     # ---------------- Entropy ---------------- #
  
     def _relative_entropy(self, token: str, charset: set) -> float:
         """Returns 0.0 to 1.0 — how close to maximum randomness for this charset."""
-        filtered = [c for c in token if c in charset]
-        if len(filtered) < 8:
-            return 0.0
-        freq = {}
-        for c in filtered:
-            freq[c] = freq.get(c, 0) + 1
-        length = len(filtered)
-        raw = -sum((n / length) * math.log2(n / length) for n in freq.values())
-        max_e = math.log2(len(charset))
-        return raw / max_e if max_e > 0 else 0.0
+        return relative_entropy(token, charset)
 
     def _looks_like_secret_candidate(self, token: str) -> bool:
         if len(token) < 20:
@@ -201,25 +393,24 @@ class GitHubSecretScanner:
         return True
 
     def _entropy_severity(self, token: str) -> str | None:
-        checks = [
-            (HEX_CHARSET,     0.87, len(token) >= 32),
-            (BASE64_CHARSET,  0.75, len(token) >= 24),
-            (URLSAFE_CHARSET, 0.75, len(token) >= 24),
-        ]
-        for charset, threshold, length_ok in checks:
-            if not length_ok:
-                continue
-            charset_ratio = sum(1 for c in token if c in charset) / len(token)
-            if charset_ratio < 0.80:
-                continue
-            if self._relative_entropy(token, charset) >= threshold:
-                return "HIGH"
-        return None
+        return entropy_severity(token)
 
-    def _scan_entropy(self, lines, regex_matched_lines, file_path, branch):
-        seen_tokens = set()
+    def _scan_entropy(self, lines, regex_matched_lines, first_line=1, reported=None):
+        """Entropy findings for lines, numbered from first_line.
 
-        for line_number, line in enumerate(lines, start=1):
+        reported holds the tokens already reported for this file; each token is
+        only reported once. All candidate tokens are collected first so their
+        entropy can be evaluated in one batch.
+        """
+        started = time.perf_counter()
+        findings = []
+        reported = set() if reported is None else reported
+        # (line_number, line, token) in the order the tokens occur
+        occurrences = []
+        # token -> severity, for every distinct token not reported yet
+        verdicts = {}
+
+        for line_number, line in enumerate(lines, start=first_line):
             if line_number in regex_matched_lines:
                 continue
 
@@ -228,158 +419,761 @@ class GitHubSecretScanner:
 
             for m in self.entropy_candidate_pattern.finditer(line):
                 token = m.group(1)
-
-                if token in seen_tokens:
+                if token in reported:
                     continue
-                seen_tokens.add(token)
+                occurrences.append((line_number, line, token))
+                verdicts[token] = None
 
-                if not self._looks_like_secret_candidate(token):
-                    continue
+        candidates = [token for token in verdicts if self._looks_like_secret_candidate(token)]
+        self.stats.count("entropy_candidates", len(candidates))
+        for token, severity in zip(candidates, entropy_severities(candidates)):
+            verdicts[token] = severity
 
-                severity = self._entropy_severity(token)
-                if not severity:
-                    continue
+        for line_number, line, token in occurrences:
+            severity = verdicts[token]
+            if not severity or token in reported:
+                continue
+            reported.add(token)
+            findings.append((line_number, line.strip()[:1000], severity, "High Entropy String"))
 
-                self.write_log(
-                    f"[ENTROPY] Possible secret in {file_path}:{line_number} "
-                    f"(preview={token[:6]}...)"
-                )
-                insertScanFindings(
-                    self.job_id, file_path, line_number,
-                    line.strip()[:1000], severity,
-                    "High Entropy String", branch
-                )
+        self.stats.add_time("entropy", time.perf_counter() - started)
+        return findings
 
     # ---------------- Scanning ---------------- #
 
-    def scan_content(self, content, file_path, branch):
-        lines = content.splitlines()
+    def find_secrets(self, content):
+        """Return the findings in content as (line_number, snippet, severity, rule) tuples.
+
+        The result only depends on the content and the rule set, which is what
+        makes it safe to cache per blob.
+        """
+        findings = []
+        # split on \n only, like build_line_index, so regex and entropy findings agree on line numbers
+        lines = content.split("\n")
         regex_matched_lines = set()
 
-        for secret_type, (pattern, severity) in self.patterns.items():
-            for m in re.finditer(pattern, content, flags=re.MULTILINE):
-                match_text = m.group(0)
-                line_number, line_text = self.find_line_number(content, match_text)
-                
-                if line_number:
-                    regex_matched_lines.add(line_number)
-                
-                if line_text:
-                    snippet = line_text.strip()
-                else:
-                    snippet = match_text
+        # all rules are compiled once per process and prefiltered on their literal anchors
+        rule_engine = compile_rules(self.patterns)
+        line_starts = None
 
-                if len(snippet) > 1000:
-                    snippet = snippet[:1000]
+        started = time.perf_counter()
+        for secret_type, severity, m in rule_engine.finditer(content, profile=self.rule_profile):
+            self.stats.rule_hits[secret_type] += 1
+            # only build the line index for files that actually have hits
+            if line_starts is None:
+                line_starts = self.build_line_index(content)
+            line_number, line_text = self.find_line_number(content, line_starts, m.start())
 
-                self.write_log("Found secret!")
-                insertScanFindings(self.job_id, file_path, line_number, snippet, severity, secret_type, branch)
+            if line_number:
+                regex_matched_lines.add(line_number)
+
+            findings.append((line_number, self._snippet(line_text, m.group(0)), severity, secret_type))
+        self.stats.add_time("regex", time.perf_counter() - started)
 
-        
         # second pass: entropy scan on lines regex did not already flag
-        self._scan_entropy(
-            lines,
-            regex_matched_lines,
-            file_path,
-            branch
-        )
+        findings.extend(self._scan_entropy(lines, regex_matched_lines))
+        return findings
 
-    def scan_repository(self, repo_path, branch):
-        # TODO: add an upper limit of files to scan
-        self.write_log("Scanning files locally...")
+    def _snippet(self, line_text, match_text):
+        snippet = line_text.strip() if line_text else match_text
+        return snippet[:1000]
+
+    def find_secrets_stream(self, blocks):
+        """find_secrets for content that arrives as an iterable of text blocks.
+
+        The content is scanned in windows that end on a line break, so at most a
+        window plus its overlap is held in memory. A rule match is reported by the
+        window it starts in and each rule's search continues where its last match
+        ended, which gives the same findings, in the same order, as find_secrets
+        on the whole content. Lines longer than STREAM_MAX_LINE are the
+        exception: they are split, and findings on them get the part of the line
+        in their window as snippet.
+        """
+        rule_engine = compile_rules(self.patterns)
+        overlap = max(STREAM_OVERLAP, rule_engine.max_width)
+
+        regex_findings = {name: [] for name in self.patterns}
+        entropy_findings = []
+        regex_matched_lines = set()
+        reported_tokens = set()
+        # rule -> absolute offset its next search starts from
+        resume = {}
+
+        buffer = ""
+        buffer_start = 0   # absolute offset of buffer[0]
+        owned_start = 0    # absolute offset of the first character not scanned yet
+        line_base = 0      # line breaks before owned_start
+        blocks = iter(blocks)
+        exhausted = False
+        window_size = STREAM_CHUNK_SIZE
+
+        while True:
+            # a single huge file must not run past the job's deadline either
+            self.budget.check()
+            rel_start = owned_start - buffer_start
+            while not exhausted and len(buffer) - rel_start < window_size + overlap:
+                block = next(blocks, None)
+                if block is None:
+                    exhausted = True
+                else:
+                    buffer += block
+
+            if exhausted:
+                rel_end = len(buffer)
+            else:
+                limit = len(buffer) - overlap
+                newline = buffer.rfind("\n", rel_start, limit)
+                if newline == -1 and window_size < STREAM_MAX_LINE:
+                    # the line does not fit in the window yet, read more of it
+                    window_size *= 2
+                    continue
+                rel_end = newline + 1 if newline != -1 else limit
+            window_size = STREAM_CHUNK_SIZE
+
+            line_starts = None
+            relative_resume = {name: offset - buffer_start for name, offset in resume.items()}
+            started = time.perf_counter()
+            for secret_type, severity, m in rule_engine.finditer(buffer, rel_start, relative_resume, self.rule_profile):
+                if m.start() >= rel_end:
+                    continue
+                resume[secret_type] = buffer_start + max(m.end(), m.start() + 1)
+                self.stats.rule_hits[secret_type] += 1
+
+                if line_starts is None:
+                    line_starts = self.build_line_index(buffer)
+                    first_index = bisect_right(line_starts, rel_start) - 1
+                buffer_line, line_text = self.find_line_number(buffer, line_starts, m.start())
+                line_number = line_base + buffer_line - first_index
+
+                regex_matched_lines.add(line_number)
+                regex_findings[secret_type].append(
+                    (line_number, self._snippet(line_text, m.group(0)), severity, secret_type))
+            self.stats.add_time("regex", time.perf_counter() - started)
+
+            text = buffer[rel_start:rel_end]
+            lines = text.split("\n")
+            if text.endswith("\n"):
+                lines.pop()
+            entropy_findings.extend(
+                self._scan_entropy(lines, regex_matched_lines, line_base + 1, reported_tokens))
+
+            line_base += text.count("\n")
+            # only a line that continues in the next window can still be skipped there
+            regex_matched_lines = {n for n in regex_matched_lines if n > line_base}
+            owned_start = buffer_start + rel_end
+            if exhausted and rel_end == len(buffer):
+                break
+
+            keep_from = max(0, rel_end - STREAM_CONTEXT)
+            buffer = buffer[keep_from:]
+            buffer_start += keep_from
+
+        findings = [finding for rule_findings in regex_findings.values() for finding in rule_findings]
+        return findings + entropy_findings
+
+    def profile_file(self, path):
+        """Attribute the rule timings that follow to path, when profiling."""
+        if self.rule_profile is not None:
+            self.rule_profile.start_file(path)
+
+    def find_secrets_in_file(self, file_path):
+        """Return (findings, skip_reason) for a file on disk, streaming it if it is large.
+
+        Files the classifier skips based on their first bytes have no findings.
+        """
+        with open(file_path, "r", errors="ignore") as f:
+            sample = f.read(SNIFF_SIZE)
+            reason = skip_reason_for_sample(sample)
+            if reason:
+                return [], reason
+            if os.path.getsize(file_path) > STREAM_THRESHOLD_BYTES:
+                return self.find_secrets_stream(chain([sample], iter(lambda: f.read(STREAM_BLOCK_SIZE), ""))), None
+            return self.find_secrets(sample + f.read()), None
+
+    def report_findings(self, findings, locations):
+        """Add findings to the job's sink once for every (file_path, branch) in locations.
+
+        History scans pass (file_path, branch, commit_sha) instead.
+        """
+        for line_number, snippet, severity, rule in findings:
+            for file_path, branch, *commit in locations:
+                if rule == "High Entropy String":
+                    self.write_log(f"[ENTROPY] Possible secret in {file_path}:{line_number}")
+                else:
+                    self.write_log("Found secret!")
+                self.finding_sink.add(file_path, line_number, snippet, severity, rule, branch, *commit)
+
+    def scan_content(self, content, file_path, branch, duplicates=()):
+        """Scan one file's content, report its findings and return them.
+
+        duplicates lists other (file_path, branch) pairs holding the exact same
+        content; every finding is reported for each of them as well.
+        """
+        findings = self.find_secrets(content)
+        self.report_findings(findings, [(file_path, branch), *duplicates])
+        return findings
+
+    # ---------------- Blob cache ---------------- #
+
+    def ruleset_version(self):
+        """Fingerprint of everything that decides which findings a file produces."""
+        payload = json.dumps({
+            "revision": SCANNER_REVISION,
+            "patterns": self.patterns,
+            "entropy_thresholds": ENTROPY_THRESHOLDS,
+            "entropy_candidate_pattern": self.entropy_candidate_pattern.pattern,
+            "false_positive_patterns": [fp.pattern for fp in FALSE_POSITIVE_PATTERNS],
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+    def get_blob_cache(self):
+        if not self.use_blob_cache:
+            return None
+        if self.blob_cache is None:
+            self.blob_cache = BlobScanCache(self.ruleset_version())
+        return self.blob_cache
+
+    def report_cached(self, cached, sha, locations):
+        """Re-emit the cached findings of a blob. Returns False on a cache miss."""
+        if sha is None or sha not in cached:
+            return False
+        self.report_findings(cached[sha], locations)
+        self.scanned_files += len(locations)
+        self.cache_hits += 1
+        return True
+
+    def store_in_cache(self, sha, findings):
+        cache = self.get_blob_cache()
+        if cache is not None and sha is not None:
+            cache.store(sha, findings)
+
+    # ---------------- Working tree ---------------- #
 
+    def collect_files(self, repo_path):
+        """Return the absolute paths of every file in repo_path that should be scanned."""
+        paths = []
         for root, dirs, files in os.walk(repo_path):
+            # prune vendored and tool directories instead of walking them,
+            # these are counted once per directory rather than per file
+            pruned = [d for d in dirs if d in SKIP_DIRECTORIES]
+            if pruned:
+                self.skipped["vendored_directory"] += len(pruned)
+                dirs[:] = [d for d in dirs if d not in SKIP_DIRECTORIES]
+            self.stats.count("files_seen", len(files))
             for file in files:
-                if not self.is_text_file(file):
+                full_path = os.path.join(root, file)
+                if self.should_scan_path(os.path.relpath(full_path, repo_path)):
+                    paths.append(full_path)
+        return paths
+
+    def scan_file(self, file_path, repo_path, branch, sha=None):
+        try:
+            relative_path = os.path.relpath(file_path, repo_path)
+            self.budget.charge(os.path.getsize(file_path))
+
+            self.profile_file(relative_path)
+            findings, reason = self.find_secrets_in_file(file_path)
+            if reason:
+                self.skipped[reason] += 1
+            else:
+                self.report_findings(findings, [(relative_path, branch)])
+                self.scanned_files += 1
+                self.store_in_cache(sha, findings)
+            self.mark_scanned(relative_path)
+
+        except BudgetExceeded:
+            raise
+        except Exception as e:
+            self.write_log(f"Error reading {file_path}: {e}")
+
+    def skip_oversized(self, size, locations=1):
+        """True if a file is over the budget's single-file limit, counting it as skipped."""
+        if self.budget.allows_file_size(size):
+            return False
+        self.skipped["too_large"] += locations
+        return True
+
+    def scan_repository(self, repo_path, branch):
+        self.write_log("Scanning files locally...")
+
+        with self.stats.phase("walk"):
+            paths = self.collect_files(repo_path)
+
+        # blob shas of the checkout let unchanged files be served from the cache
+        blob_shas = {}
+        cached = {}
+        cache = self.get_blob_cache()
+        if cache is not None:
+            with self.stats.phase("walk"):
+                blob_shas = list_index(repo_path)
+            cached = cache.lookup(blob_shas.values())
+
+        remaining = []
+        for file_path in paths:
+            relative_path = os.path.relpath(file_path, repo_path)
+            if self.already_scanned(relative_path):
+                continue
+            sha = blob_shas.get(relative_path)
+            if self.report_cached(cached, sha, [(relative_path, branch)]):
+                self.mark_scanned(relative_path)
+                continue
+            try:
+                if self.skip_oversized(os.path.getsize(file_path)):
+                    self.mark_scanned(relative_path)
                     continue
+            except OSError:
+                pass
+            remaining.append((file_path, sha))
 
-                file_path = os.path.join(root, file)
+        if cached:
+            self.write_log(f"{self.cache_hits} files served from the scan cache")
 
-                try:
-                    with open(file_path, "r", errors="ignore") as f:
-                        content = f.read()
+        if self.workers > 1 and len(remaining) >= PARALLEL_MIN_FILES:
+            self._scan_files_parallel(remaining, repo_path, branch)
+            return
 
-                    relative_path = os.path.relpath(file_path, repo_path)
+        for file_path, sha in remaining:
+            self.scan_file(file_path, repo_path, branch, sha)
 
-                    self.scan_content(content, relative_path, branch)
-                    self.scanned_files += 1
+    def _scan_files_parallel(self, files, repo_path, branch):
+        """
+        shard the (file_path, blob_sha) list across a process pool. workers only
+        return each file's findings, this process reports them to the job's
+        finding sink and the blob cache.
+        """
+        chunks = [files[i:i + PARALLEL_CHUNK_SIZE] for i in range(0, len(files), PARALLEL_CHUNK_SIZE)]
+        self.write_log(f"Scanning {len(files)} files with {self.workers} worker processes...")
 
-                except Exception as e:
-                    self.write_log(f"Error reading {file_path}: {e}")
+        # chunks whose results were merged completely, the serial fallback continues after them
+        merged = 0
+        try:
+            pool = ProcessPoolExecutor(max_workers=self.workers)
+        except (OSError, NotImplementedError) as e:
+            self.write_log(f"Parallel scan unavailable ({e}), scanning files serially")
+            pool = None
+        if pool is not None:
+            with pool:
+                # only a few chunks are in flight at a time, so a job that runs out
+                # of budget does not leave the rest of the repo queued in the pool
+                in_flight = deque()
+                submitted = 0
+                while merged < len(chunks):
+                    try:
+                        while (submitted < len(chunks) and len(in_flight) < self.workers * 2
+                               and not self.budget.exhausted()):
+                            chunk = chunks[submitted]
+                            in_flight.append(pool.submit(_scan_file_chunk, self.repo_url, self.job_id, self.extensions,
+                                                         self.patterns, repo_path, [file_path for file_path, _ in chunk],
+                                                         self.rule_profile is not None))
+                            submitted += 1
+                        if not in_flight:
+                            self.budget.check()
+                        results, chunk_stats = in_flight.popleft().result()
+                    except (BrokenProcessPool, OSError, AssertionError) as e:
+                        # e.g. the pool could not start inside a daemonic worker process. only the pool
+                        # is guarded here, nothing of the current chunk has been merged yet
+                        self.write_log(f"Parallel scan unavailable ({e}), scanning remaining files serially")
+                        for future in in_flight:
+                            future.cancel()
+                        break
+
+                    # merge in submission order so findings are written in a stable order
+                    self._merge_chunk(chunks[merged], results, chunk_stats, repo_path, branch)
+                    merged += 1
+
+        for chunk in chunks[merged:]:
+            for file_path, sha in chunk:
+                self.scan_file(file_path, repo_path, branch, sha)
+
+    def _merge_chunk(self, chunk, results, chunk_stats, repo_path, branch):
+        """Report the results of one worker chunk like scan_file would have."""
+        shas = dict(chunk)
+        self.stats.merge(chunk_stats)
+        if self.rule_profile is not None:
+            self.rule_profile.merge(chunk_stats["rule_profile"])
+        for file_path, size, findings, reason in results:
+            relative_path = os.path.relpath(file_path, repo_path)
+            if reason:
+                self.skipped[reason] += 1
+            else:
+                self.budget.charge(size)
+                self.report_findings(findings, [(relative_path, branch)])
+                self.scanned_files += 1
+                self.store_in_cache(shas[file_path], findings)
+            self.mark_scanned(relative_path)
+
+    # ---------------- All branches ---------------- #
 
     def scan_all_branches(self, repo_path):
         """
-        checkout every remote branch and scan its contents.
-        the repo has already been cloned with full history;
-        afterwards the working copy is restored to the original branch.
+        scan every remote branch straight from the git object store.
+        the repo has already been cloned with full history. each branch's tree is
+        listed with ls-tree, every unique blob is read and scanned exactly once,
+        and its findings are reported for every branch/path that contains it.
         """
-        # remember where we started
-        proc = subprocess.run(
-            ["git", "rev-parse", "--abbrev-ref", "HEAD"],
-            cwd=repo_path,
-            check=True,
-            capture_output=True,
-            text=True,
-        )
-        original = proc.stdout.strip()
-
-        # collect remote branch names (skip the HEAD pointer)
-        proc = subprocess.run(
-            ["git", "branch", "-r"],
-            cwd=repo_path,
-            check=True,
-            capture_output=True,
-            text=True,
-        )
-        branches = []
-        for line in proc.stdout.splitlines():
-            line = line.strip()
-            if "->" in line:
-                continue
-            if line.startswith("origin/"):
-                branches.append(line.replace("origin/", ""))
-
-        for branch in branches:
+        # blob sha -> [(path, branch), ...] in the order they were listed
+        blobs = {}
+        for branch in list_remote_branches(repo_path):
             try:
-                subprocess.run(
-                    ["git", "checkout", branch],
-                    cwd=repo_path,
-                    check=True,
-                    stdout=subprocess.DEVNULL,
-                    stderr=subprocess.DEVNULL,
-                )
+                with self.stats.phase("walk"):
+                    entries = list_tree(repo_path, f"refs/remotes/origin/{branch}")
             except subprocess.CalledProcessError:
-                self.write_log(f"unable to checkout branch {branch}, skipping")
+                self.write_log(f"unable to list branch {branch}, skipping")
                 continue
 
-            self.write_log(f"scanning branch {branch}")
-            self.scan_repository(repo_path, branch)
+            self.write_log(f"listing branch {branch}")
+            self.stats.count("files_seen", len(entries))
+            for sha, path in entries:
+                if self.should_scan_path(path):
+                    blobs.setdefault(sha, []).append((path, branch))
+
+        self.write_log(f"scanning {len(blobs)} unique files across all branches")
+        self.scan_blobs(repo_path, blobs)
+
+    def scan_blobs(self, repo_path, blobs, prefetch=False):
+        """
+        scan {blob_sha: [(path, branch), ...]} straight from the object store.
+        each blob is read and scanned once and its findings are reported for
+        every location. with prefetch, blobs missing from a partial clone are
+        downloaded in a single request first.
+        """
+        if self.resumed:
+            blobs = {sha: locations for sha, locations in blobs.items()
+                     if not self.already_scanned(sha, len(locations))}
+
+        cache = self.get_blob_cache()
+        cached = cache.lookup(blobs.keys()) if cache is not None else {}
+
+        if prefetch:
+            prefetch_blobs(repo_path, [sha for sha in blobs if sha not in cached])
+
+        with GitObjectReader(repo_path) as reader:
+            for sha, locations in blobs.items():
+                if self.report_cached(cached, sha, locations):
+                    self.mark_scanned(sha)
+                    continue
+
+                path = locations[0][0]
+                self.profile_file(path)
+                try:
+                    size = reader.read_header(sha)
+                    if size is None:
+                        self.write_log(f"blob {sha} for {path} is missing, skipping")
+                        continue
+                    if self.skip_oversized(size, len(locations)):
+                        reader.skip_content(size)
+                        self.mark_scanned(sha)
+                        continue
+                    self.budget.charge(size)
+
+                    if size > STREAM_THRESHOLD_BYTES:
+                        blocks = reader.iter_text(size, STREAM_BLOCK_SIZE)
+                        first = next(blocks, "")
+                        reason = skip_reason_for_sample(first[:SNIFF_SIZE])
+                        if reason:
+                            # closing the stream skips the rest of the blob
+                            blocks.close()
+                            self.skipped[reason] += len(locations)
+                            self.mark_scanned(sha)
+                            continue
+                        findings = self.find_secrets_stream(chain([first], blocks))
+                        self.report_findings(findings, locations)
+                    else:
+                        content = reader.read_content(size).decode("utf-8", errors="ignore")
+                        reason = skip_reason_for_sample(content[:SNIFF_SIZE])
+                        if reason:
+                            self.skipped[reason] += len(locations)
+                            self.mark_scanned(sha)
+                            continue
+                        findings = self.find_secrets(content)
+                        self.report_findings(findings, locations)
+                    self.scanned_files += len(locations)
+                    self.store_in_cache(sha, findings)
+                    self.mark_scanned(sha)
+
+                except BudgetExceeded:
+                    raise
+                except Exception as e:
+                    self.write_log(f"Error reading {path}: {e}")
 
-        # restore original checkout
-        subprocess.run(
-            ["git", "checkout", original],
-            cwd=repo_path,
-            check=False,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-        )
+        if cached:
+            self.write_log(f"{self.cache_hits} files served from the scan cache")
+
+    # ---------------- Incremental ---------------- #
+
+    def scan_incremental(self, repo_path):
+        """
+        scan only the blobs added or modified since the last commit scanned for
+        this scope. the clone is blobless, so unchanged files are never downloaded.
+        without a usable base commit (first run, force push) the whole head tree
+        is scanned instead.
+        """
+        head, branch = resolve_head(repo_path)
+        with self.stats.phase("db"):
+            base = getLastScannedCommit(self.incremental_scope, self.repo_url, branch)
+
+        with self.stats.phase("walk"):
+            if base == head:
+                self.write_log(f"no new commits on {branch} since {head[:12]}, nothing to scan")
+                entries = []
+            elif base and fetch_commit(repo_path, base):
+                entries = changed_blobs(repo_path, base, head)
+                self.write_log(f"{len(entries)} files changed on {branch} since {base[:12]}")
+            else:
+                self.write_log(f"no usable base commit for {branch}, scanning the full tree")
+                entries = list_tree(repo_path, head)
+        self.stats.count("files_seen", len(entries))
+
+        blobs = {}
+        for sha, path in entries:
+            if self.should_scan_path(path):
+                blobs.setdefault(sha, []).append((path, branch))
+
+        self.scan_blobs(repo_path, blobs, prefetch=True)
+        self.scanned_head = (branch, head)
+
+    # ---------------- History ---------------- #
+
+    def scan_history(self, repo_path):
+        """
+        scan every blob that was ever committed to a remote branch, including
+        files that were deleted or overwritten since. commits are walked oldest
+        first and each blob is scanned the first time it shows up, so its findings
+        are attributed to the commit, path and branch that introduced it; later
+        copies of the same content are not reported again.
+
+        only the 20-byte ids of the blobs already scheduled are kept, the log is
+        streamed and blobs are read in batches of HISTORY_BATCH_BLOBS. with an
+        incremental scope, progress is recorded after every batch and the next
+        run only walks commits that are not reachable from it.
+        """
+        exclude = []
+        if self.incremental_scope:
+            with self.stats.phase("db"):
+                checkpoint = getHistoryCheckpoint(self.incremental_scope, self.repo_url)
+            # commits that were force-pushed away are no longer in the clone
+            exclude = [sha for sha in checkpoint if has_commit(repo_path, sha)]
+            if exclude:
+                self.write_log(f"resuming history scan after {len(exclude)} recorded commits")
+
+        seen = set()
+        batch = {}
+        # branch -> last commit walked through it, every commit before it in the walk is done
+        frontier = {}
+        commits = 0
+        history = iter_history(repo_path, exclude=exclude)
+        try:
+            while True:
+                with self.stats.phase("walk"):
+                    item = next(history, None)
+                if item is None:
+                    break
+                commit, branch, entries = item
+                commits += 1
+                self.stats.count("files_seen", len(entries))
+                for sha, path in entries:
+                    digest = bytes.fromhex(sha)
+                    if digest not in seen and self.should_scan_path(path):
+                        seen.add(digest)
+                        batch[sha] = [(path, branch, commit)]
+                frontier[branch] = commit
+
+                if len(batch) >= HISTORY_BATCH_BLOBS:
+                    self.scan_blobs(repo_path, batch)
+                    batch = {}
+                    self.record_history(exclude + list(frontier.values()))
+        finally:
+            history.close()
+
+        self.scan_blobs(repo_path, batch)
+        self.write_log(f"scanned {len(seen)} unique files across {commits} commits")
+        self.stats.count("commits_walked", commits)
+        self.record_history(list(remote_heads(repo_path).values()))
+
+    def record_history(self, commits):
+        """Remember that everything reachable from commits was scanned, for the next run."""
+        if not self.incremental_scope:
+            return
+        # findings must be stored before the progress, or a failed write would make the next run skip them
+        self.finding_sink.flush()
+        with self.stats.phase("db"):
+            setHistoryCheckpoint(self.incremental_scope, self.repo_url, commits)
+
+    # ---------------- Checkpoints ---------------- #
+
+    def clone_head(self, repo_path):
+        """The commit of a single branch clone, or a digest of every branch head for deep and history scans."""
+        if self.isDeepScan or self.history:
+            heads = json.dumps(remote_heads(repo_path), sort_keys=True)
+            return hashlib.sha256(heads.encode()).hexdigest()
+        return resolve_head(repo_path)[0]
+
+    def load_checkpoint(self, repo_path):
+        """Pick up what earlier attempts of this job finished, e.g. before a Celery retry.
+
+        A retry clones again and may get newer commits. Paths are only finished for the content
+        they had, so the checkpoint is only used when the clone is at the same head(s).
+        """
+        try:
+            self.checkpoint_head = self.clone_head(repo_path)
+            with self.stats.phase("db"):
+                self.resumed = getScanCheckpoint(self.job_id, self.checkpoint_head)
+        except Exception as e:
+            # without a checkpoint the job is scanned from the start
+            self.write_log(f"Failed to load scan checkpoint: {e}")
+            self.resumed = set()
+        if self.resumed:
+            self.write_log(f"resuming scan, {len(self.resumed)} files were finished by an earlier attempt")
+
+    def already_scanned(self, key, locations=1):
+        """True if an earlier attempt finished key (a blob sha or a path), its findings are already stored."""
+        if key not in self.resumed:
+            return False
+        self.stats.count("files_resumed", locations)
+        return True
+
+    def mark_scanned(self, key):
+        self.checkpoint_pending.append(key)
+        if len(self.checkpoint_pending) >= CHECKPOINT_EVERY:
+            self.save_checkpoint()
+
+    def save_checkpoint(self):
+        """Record the keys finished since the last checkpoint."""
+        if not self.checkpoint_pending or self.checkpoint_head is None:
+            self.checkpoint_pending = []
+            return
+        # findings must be stored before the checkpoint, or a retry would skip files whose findings were lost
+        self.finding_sink.flush()
+        try:
+            with self.stats.phase("db"):
+                appendScanCheckpoint(self.job_id, self.checkpoint_head, self.checkpoint_pending)
+            self.checkpoint_saved = True
+        except Exception as e:
+            # a retry scans these files again, nothing is lost
+            self.write_log(f"Failed to store scan checkpoint: {e}")
+        self.checkpoint_pending = []
+
+    def clear_checkpoint(self):
+        """The job finished, a later run of it starts from the beginning again."""
+        self.checkpoint_pending = []
+        if not (self.resumed or self.checkpoint_saved):
+            return
+        try:
+            with self.stats.phase("db"):
+                deleteScanCheckpoint(self.job_id)
+        except Exception as e:
+            self.write_log(f"Failed to delete scan checkpoint: {e}")
+
+    # ---------------- Stats ---------------- #
+
+    def finish_stats(self):
+        """Fill in the counters kept elsewhere during the scan and return the stats as a dict."""
+        counters = self.stats.counters
+        counters["files_scanned"] = self.scanned_files
+        counters["files_skipped"] = sum(self.skipped.values())
+        counters["cache_hits"] = self.cache_hits
+        counters["bytes_scanned"] = self.budget.bytes
+        counters["findings_written"] = self.finding_sink.written
+        stats = self.stats.to_dict()
+        # finding and blob cache writes are timed by their own buffers
+        db_seconds = self.finding_sink.seconds + (self.blob_cache.seconds if self.blob_cache is not None else 0.0)
+        stats["phases"]["db"] = round(stats["phases"]["db"] + db_seconds, 4)
+        stats["skipped"] = dict(sorted(self.skipped.items()))
+        if self.rule_profile is not None:
+            stats["rule_profile"] = self.rule_profile.to_dict()
+        return stats
+
+    def save_stats(self):
+        # stats are diagnostics only, failing to store them must not fail the job
+        stats = self.finish_stats()
+        try:
+            insertScanJobStats(self.job_id, stats)
+        except Exception as e:
+            self.write_log(f"Failed to store scan stats: {e}")
+
+        if self.history:
+            mode = "history"
+        else:
+            mode = "deep" if self.isDeepScan else "incremental" if self.incremental_scope else "default"
+        metrics.observe("clone_duration_seconds", stats["phases"]["clone"], mode=mode)
+        metrics.inc_many("rule_hits_total", stats["rule_hits"], "rule")
 
     # ---------------- Main ---------------- #
 
     def run(self):
         repo_path = None
+        # the deadline includes the clone
+        self.budget.start()
         try:
-            repo_path = self.clone_repo()
-            if self.isDeepScan == True:
-                # scan every branch, not just the default one
-                self.scan_all_branches(repo_path)
-            else:
-                # set scanned branch to main, as it is the only one scanned
-                self.scan_repository(repo_path, branch = "main")
+            with self.stats.phase("clone"):
+                repo_path = self.clone_repo()
+                self.stats.count("clone_bytes", object_store_size(repo_path))
+                if repo_path:
+                    self.stats.count("disk_bytes", disk_usage(repo_path))
+            if repo_path:
+                self.load_checkpoint(repo_path)
+            try:
+                if self.history:
+                    # every blob of every commit, not just the current trees
+                    self.scan_history(repo_path)
+                elif self.isDeepScan == True:
+                    # scan every branch, not just the default one
+                    self.scan_all_branches(repo_path)
+                elif self.incremental_scope:
+                    self.scan_incremental(repo_path)
+                else:
+                    # only one branch is scanned, the pushed one or main
+                    self.scan_repository(repo_path, branch = self.target_branch())
+            except BudgetExceeded as e:
+                # keep what was found so far, the job is marked partial below
+                self.partial_reason = e.reason
+                self.write_log(f"Scan budget exhausted, stopping early: {e.reason}")
+
+            if self.skipped:
+                summary = ", ".join(f"{reason}={count}" for reason, count in sorted(self.skipped.items()))
+                self.write_log(f"Skipped files: {summary}")
+
+            # findings must be stored before the head is recorded, or a failed
+            # write would make the next incremental run skip them
+            self.finding_sink.flush()
+            with self.stats.phase("db"):
+                if self.partial_reason:
+                    # the head is not recorded, the next incremental run covers the rest
+                    markScanJobPartial(self.job_id, self.partial_reason)
+                elif self.scanned_head:
+                    branch, head = self.scanned_head
+                    setLastScannedCommit(self.incremental_scope, self.repo_url, branch, head)
+            self.clear_checkpoint()
 
         finally:
-            if repo_path and os.path.exists(repo_path):
-                shutil.rmtree(repo_path)
-                self.write_log("Temporary repository deleted.")
+            try:
+                # persist whatever is still buffered, also when the scan failed halfway,
+                # and what it finished so a retry of the job resumes there
+                self.save_checkpoint()
+                self.finding_sink.flush()
+                if self.blob_cache is not None:
+                    self.blob_cache.close()
+                self.save_stats()
+            finally:
+                if repo_path and os.path.exists(repo_path):
+                    shutil.rmtree(repo_path)
+                    self.write_log("Temporary repository deleted.")
 
 
+# Runs inside a ProcessPoolExecutor worker. Returns (file_path, size, findings, skip_reason) for every
+# file that could be read, plus the worker's stats; reporting and DB writes are left to the parent process.
+def _scan_file_chunk(repo_url, job_id, extensions, patterns, repo_path, paths, profile_rules=False):
+    scanner = GitHubSecretScanner(repo_url, job_id, extensions=extensions, profile_rules=profile_rules)
+    scanner.patterns = patterns
+    results = []
+    for file_path in paths:
+        try:
+            scanner.profile_file(os.path.relpath(file_path, repo_path))
+            size = os.path.getsize(file_path)
+            results.append((file_path, size, *scanner.find_secrets_in_file(file_path)))
+        except Exception as e:
+            scanner.write_log(f"Error reading {file_path}: {e}")
+    stats = scanner.stats.to_dict()
+    if scanner.rule_profile is not None:
+        stats["rule_profile"] = scanner.rule_profile.to_dict()
+    return results, stats
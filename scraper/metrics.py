@@ -0,0 +1,219 @@
+import os
+import time
+import redis
+
+#------------------------------- metrics -----------------------------------------------
+#  Prometheus-style metrics for the API and the Celery workers. The workers run in other
+#  containers than the API, so every process adds its counters and histogram buckets to
+#  hashes in Redis and the API's /metrics endpoint renders the sums in the Prometheus text
+#  format. Gauges (queue depth, DB connections) are read when /metrics is scraped, or
+#  stored per process with an expiry so processes that went away drop out.
+#
+#    metrics:counter:<name>     field <labels>            -> value
+#    metrics:histogram:<name>   field <labels>|<bucket>   -> observations in that bucket
+#                               field <labels>|sum        -> sum of observations
+#    metrics:gauge:<name>:<id>  hash of <labels> -> value, expires after GAUGE_TTL seconds
+#    metrics:enqueued:<task id> enqueue time of a task that has not started yet
+#
+#  Metrics are disabled when METRICS_REDIS_URL is not set. Redis errors are ignored,
+#  metrics must never fail a request or a scan.
+#--------------------------------------------------------------------------------------------------
+
+METRICS_REDIS_URL = os.environ.get("METRICS_REDIS_URL", "")
+NAMESPACE = "reporacoon"
+KEY_PREFIX = "metrics"
+GAUGE_TTL = 300
+ENQUEUED_TTL = 24 * 3600
+
+LATENCY_BUCKETS = (0.1, 0.5, 1, 5, 15, 30, 60, 300, 900, 1800, 3600)
+DURATION_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+
+# name -> (type, help, buckets)
+METRICS = {
+    "task_queue_wait_seconds": ("histogram", "Time from enqueueing a task to a worker starting it.", LATENCY_BUCKETS),
+    "task_duration_seconds": ("histogram", "Run time of a task.", DURATION_BUCKETS),
+    "task_retries_total": ("counter", "Task runs that failed and were retried.", None),
+    "task_failures_total": ("counter", "Tasks that failed after their last retry.", None),
+    "clone_duration_seconds": ("histogram", "Time spent cloning a repository for a scan.", DURATION_BUCKETS),
+    "rule_hits_total": ("counter", "Regex matches per rule.", None),
+    "recursive_scans_dispatched_total": ("counter", "Recurring scans enqueued by the dispatcher.", None),
+    "recursive_scans_unchanged_total": ("counter", "Recurring scan runs skipped because nothing was pushed since the last run.", None),
+    "repo_checks_total": ("counter", "Repository checks of /validate by where the answer came from.", None),
+    "queue_depth": ("gauge", "Tasks waiting in a Celery queue.", None),
+    "db_pool_connections": ("gauge", "Database connections per process and state.", None),
+}
+
+_client = None
+
+
+def _redis():
+    global _client
+    if not METRICS_REDIS_URL:
+        return None
+    if _client is None:
+        _client = redis.Redis.from_url(METRICS_REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+    return _client
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels):
+    return ",".join(f'{key}="{_escape(value)}"' for key, value in sorted(labels.items()))
+
+
+def _series(name, labels):
+    return f"{name}{{{labels}}}" if labels else name
+
+
+def inc(name, amount=1, **labels):
+    client = _redis()
+    if client is None:
+        return
+    try:
+        client.hincrbyfloat(f"{KEY_PREFIX}:counter:{name}", _labels(labels), amount)
+    except redis.RedisError:
+        pass
+
+
+def inc_many(name, amounts, label):
+    """Add {label_value: amount} to a counter in one round trip, e.g. hits per rule."""
+    client = _redis()
+    if client is None or not amounts:
+        return
+    try:
+        pipe = client.pipeline(transaction=False)
+        for value, amount in amounts.items():
+            pipe.hincrbyfloat(f"{KEY_PREFIX}:counter:{name}", _labels({label: value}), amount)
+        pipe.execute()
+    except redis.RedisError:
+        pass
+
+
+def observe(name, value, **labels):
+    client = _redis()
+    if client is None:
+        return
+    buckets = METRICS[name][2]
+    # the smallest bucket the value fits in, rendering makes them cumulative
+    bucket = next((str(b) for b in buckets if value <= b), "+Inf")
+    key, prefix = f"{KEY_PREFIX}:histogram:{name}", _labels(labels)
+    try:
+        pipe = client.pipeline(transaction=False)
+        pipe.hincrby(key, f"{prefix}|{bucket}", 1)
+        pipe.hincrbyfloat(key, f"{prefix}|sum", value)
+        pipe.execute()
+    except redis.RedisError:
+        pass
+
+
+def set_gauge(name, process, samples):
+    """Store [(labels, value), ...] of a gauge for one process, replacing its previous samples."""
+    client = _redis()
+    if client is None or not samples:
+        return
+    key = f"{KEY_PREFIX}:gauge:{name}:{process}"
+    try:
+        pipe = client.pipeline(transaction=True)
+        pipe.delete(key)
+        pipe.hset(key, mapping={_labels({**labels, "process": process}): value for labels, value in samples})
+        pipe.expire(key, GAUGE_TTL)
+        pipe.execute()
+    except redis.RedisError:
+        pass
+
+
+def mark_enqueued(task_id):
+    client = _redis()
+    if client is None:
+        return
+    try:
+        client.set(f"{KEY_PREFIX}:enqueued:{task_id}", time.time(), ex=ENQUEUED_TTL)
+    except redis.RedisError:
+        pass
+
+
+def pop_enqueued(task_id):
+    """Return the time a task was enqueued, or None if it is unknown."""
+    client = _redis()
+    if client is None:
+        return None
+    key = f"{KEY_PREFIX}:enqueued:{task_id}"
+    try:
+        pipe = client.pipeline(transaction=True)
+        pipe.get(key)
+        pipe.delete(key)
+        value, _ = pipe.execute()
+    except redis.RedisError:
+        return None
+    return float(value) if value is not None else None
+
+
+def queue_depths(broker_url, queues):
+    """{queue: waiting tasks} for Celery queues on a Redis broker, which keeps each queue in a list."""
+    try:
+        client = redis.Redis.from_url(broker_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        return {queue: client.llen(queue) for queue in queues}
+    except redis.RedisError:
+        return {}
+
+
+def _format_value(value):
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _render_histogram(name, fields, buckets):
+    # labels -> {bucket or "sum": value}
+    series = {}
+    for field, value in fields.items():
+        labels, _, part = field.rpartition("|")
+        series.setdefault(labels, {})[part] = float(value)
+
+    lines = []
+    for labels, parts in sorted(series.items()):
+        sep = "," if labels else ""
+        cumulative = 0
+        for bucket in [str(b) for b in buckets] + ["+Inf"]:
+            cumulative += parts.get(bucket, 0)
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{bucket}"}} {_format_value(cumulative)}')
+        lines.append(f"{_series(name + '_sum', labels)} {_format_value(parts.get('sum', 0))}")
+        lines.append(f"{_series(name + '_count', labels)} {_format_value(cumulative)}")
+    return lines
+
+
+def render(gauges=None):
+    """The metrics in the Prometheus text format.
+
+    gauges maps a gauge's name to [(labels, value), ...] for gauges the caller measures
+    at scrape time. They are reported next to the samples stored in Redis.
+    """
+    gauges = gauges or {}
+    client = _redis()
+    stored = {}
+    if client is not None:
+        try:
+            for name, (kind, _help, _buckets) in METRICS.items():
+                if kind == "gauge":
+                    for key in client.scan_iter(match=f"{KEY_PREFIX}:gauge:{name}:*"):
+                        stored.setdefault(name, {}).update(client.hgetall(key))
+                else:
+                    stored[name] = client.hgetall(f"{KEY_PREFIX}:{kind}:{name}")
+        except redis.RedisError:
+            pass
+
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        full_name = f"{NAMESPACE}_{name}"
+        fields = {field.decode(): value for field, value in stored.get(name, {}).items()}
+        for labels, value in gauges.get(name, []):
+            fields[_labels(labels)] = value
+        lines.append(f"# HELP {full_name} {help_text}")
+        lines.append(f"# TYPE {full_name} {kind}")
+        if kind == "histogram":
+            lines.extend(_render_histogram(full_name, fields, buckets))
+        else:
+            for labels, value in sorted(fields.items()):
+                lines.append(f"{_series(full_name, labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,140 @@
+import os
+import fcntl
+import shutil
+import hashlib
+import tempfile
+import subprocess
+from contextlib import contextmanager
+from gitobjects import disk_usage, sparse_checkout
+
+#------------------------------- mirror cache -----------------------------------------------
+#  Workers keep a bare clone ("mirror") of every repository they scan under MIRROR_CACHE_DIR.
+#  A job updates the mirror with `git fetch`, which only downloads the objects pushed since
+#  the last job, and then makes a local clone of it for the scan. Local clones hardlink the
+#  mirror's objects, so they take no network and almost no disk.
+#
+#    <MIRROR_CACHE_DIR>/mirrors/<key>.git   bare clone per repo url
+#    <MIRROR_CACHE_DIR>/locks/<key>.lock    flock held while a job fetches or clones from it
+#    <MIRROR_CACHE_DIR>/work/<tmp>          per-job clones, deleted by the scanner
+#
+#  A mirror is only served after a successful fetch, so a job without access to a private
+#  repository can never read another job's copy of it. Tokens are passed on the command
+#  line and never written to the mirror's config.
+#  Mirrors are evicted least recently used first once they take up more than
+#  MIRROR_CACHE_MAX_BYTES. The cache is disabled when MIRROR_CACHE_DIR is not set.
+#  Mirrors hold every blob, so default scans with a file size limit do not use them and
+#  clone directly with a blob size filter instead (see GitHubSecretScanner.clone_repo).
+#--------------------------------------------------------------------------------------------------
+
+MIRROR_CACHE_DIR = os.environ.get("MIRROR_CACHE_DIR", "")
+MIRROR_CACHE_MAX_BYTES = int(os.environ.get("MIRROR_CACHE_MAX_BYTES", 20 * 1024 ** 3))
+
+# branches and tags only, GitHub's refs/pull/* would double the size of most mirrors
+MIRROR_REFSPECS = ["+refs/heads/*:refs/heads/*", "+refs/tags/*:refs/tags/*"]
+
+
+def _git(*args, cwd=None):
+    subprocess.run(
+        ["git", *args],
+        cwd=cwd,
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+class MirrorCache:
+    def __init__(self, root=MIRROR_CACHE_DIR, max_bytes=MIRROR_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.mirror_dir = os.path.join(root, "mirrors")
+        self.lock_dir = os.path.join(root, "locks")
+        self.work_dir = os.path.join(root, "work")
+        for path in (self.mirror_dir, self.lock_dir, self.work_dir):
+            os.makedirs(path, exist_ok=True)
+
+    def key(self, repo_url):
+        return hashlib.sha256(repo_url.encode()).hexdigest()[:32]
+
+    def mirror_path(self, repo_url):
+        return os.path.join(self.mirror_dir, self.key(repo_url) + ".git")
+
+    @contextmanager
+    def lock(self, key, blocking=True):
+        """Hold a mirror's lock for the duration of the block. Yields False if not blocking and it is taken."""
+        with open(os.path.join(self.lock_dir, key + ".lock"), "a") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def update(self, repo_url, fetch_url):
+        """Create or fetch the mirror of repo_url. Must be called with the repo's lock held."""
+        path = self.mirror_path(repo_url)
+        if os.path.isdir(path):
+            _git("fetch", "--quiet", "--prune", "--no-write-fetch-head", fetch_url, *MIRROR_REFSPECS, cwd=path)
+        else:
+            tmp = tempfile.mkdtemp(dir=self.mirror_dir)
+            try:
+                _git("clone", "--quiet", "--bare", fetch_url, tmp)
+                # the clone url may carry an access token
+                _git("remote", "set-url", "origin", repo_url, cwd=tmp)
+                os.rename(tmp, path)
+            except BaseException:
+                shutil.rmtree(tmp, ignore_errors=True)
+                raise
+        # the mirror's mtime is its last use for LRU eviction
+        os.utime(path)
+        return path
+
+    def clone(self, repo_url, fetch_url, checkout=True, sparse=None):
+        """Bring the mirror up to date and return a fresh local clone of it for one job.
+
+        With sparse, only the files matching those patterns are checked out (see sparse_checkout).
+
+        Raises subprocess.CalledProcessError if the remote could not be fetched.
+        The caller owns the returned directory and deletes it when done.
+        """
+        with self.lock(self.key(repo_url)):
+            mirror = self.update(repo_url, fetch_url)
+            dest = tempfile.mkdtemp(dir=self.work_dir)
+            try:
+                args = ["clone", "--quiet", "--local"]
+                if not checkout or sparse is not None:
+                    args.append("--no-checkout")
+                _git(*args, mirror, dest)
+                if checkout and sparse is not None:
+                    sparse_checkout(dest, sparse)
+            except BaseException:
+                shutil.rmtree(dest, ignore_errors=True)
+                raise
+        self.evict(keep=mirror)
+        return dest
+
+    def evict(self, keep=None):
+        """Delete least recently used mirrors until the cache fits in max_bytes.
+
+        Mirrors that are in use by another job, and keep, are never deleted.
+        """
+        mirrors = []
+        for entry in os.scandir(self.mirror_dir):
+            if entry.name.endswith(".git") and entry.is_dir():
+                mirrors.append((entry.stat().st_mtime, entry.path, disk_usage(entry.path)))
+
+        total = sum(size for _mtime, _path, size in mirrors)
+        for _mtime, path, size in sorted(mirrors):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            with self.lock(os.path.basename(path)[:-len(".git")], blocking=False) as locked:
+                if not locked:
+                    continue
+                shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            print(f"[mirror cache] evicted {os.path.basename(path)} ({size} bytes)")
@@ -0,0 +1,164 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import requests
+from requests.adapters import HTTPAdapter
+import metrics
+
+#------------------------------- repository checks -----------------------------------------------
+#  Answers "does owner/repo exist on GitHub" for /validate without sending every call
+#  to the GitHub API:
+#
+#    - results are cached per repository and access token, repositories that exist for
+#      REPO_CHECK_TTL seconds and ones that do not for REPO_CHECK_NEGATIVE_TTL seconds
+#    - an expired result is revalidated with its ETag; GitHub answers 304 Not Modified
+#      without counting the request against the rate limit
+#    - concurrent checks of the same repository wait for a single upstream request
+#    - requests share one pooled session and give up after strict timeouts; when
+#      GitHub cannot be reached or rate limits us, an expired result is served instead
+#
+#  The cache lives in the API process. Tokens are only kept as a hash in its keys.
+#--------------------------------------------------------------------------------------------------
+
+GITHUB_API_URL = os.environ.get("GITHUB_API_URL", "https://api.github.com")
+REPO_CHECK_TTL = int(os.environ.get("REPO_CHECK_TTL", "300"))
+REPO_CHECK_NEGATIVE_TTL = int(os.environ.get("REPO_CHECK_NEGATIVE_TTL", "60"))
+REPO_CHECK_CONNECT_TIMEOUT = float(os.environ.get("REPO_CHECK_CONNECT_TIMEOUT", "2"))
+REPO_CHECK_READ_TIMEOUT = float(os.environ.get("REPO_CHECK_READ_TIMEOUT", "5"))
+# repositories remembered, least recently used are evicted
+REPO_CHECK_CACHE_SIZE = 10000
+# connections kept open to the GitHub API, one per concurrent request
+POOL_SIZE = 16
+
+NOT_FOUND = (False, "Repository not found or no access", None)
+
+
+def make_session(pool_size=POOL_SIZE):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class _Entry:
+    __slots__ = ("result", "etag", "expires")
+
+    def __init__(self, result, etag, expires):
+        self.result = result
+        self.etag = etag
+        self.expires = expires
+
+
+class _Call:
+    """An upstream request other threads can wait for."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class RepoChecker:
+    def __init__(self, session=None, ttl=REPO_CHECK_TTL, negative_ttl=REPO_CHECK_NEGATIVE_TTL,
+                 timeout=(REPO_CHECK_CONNECT_TIMEOUT, REPO_CHECK_READ_TIMEOUT),
+                 max_entries=REPO_CHECK_CACHE_SIZE, clock=time.monotonic):
+        self.session = session or make_session()
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self.clock = clock
+        self.lock = threading.Lock()
+        # key -> _Entry, expired entries are kept for their ETag until evicted
+        self.cache = OrderedDict()
+        # key -> _Call of the request in flight
+        self.inflight = {}
+
+    def check(self, owner, repo, token=None):
+        """Return (exists, message, details) like the GitHub API would answer right now."""
+        token_hash = hashlib.sha256(token.encode()).hexdigest() if token else None
+        key = (owner.lower(), repo.lower(), token_hash)
+
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry is not None:
+                self.cache.move_to_end(key)
+                if entry.expires > self.clock():
+                    metrics.inc("repo_checks_total", source="cache")
+                    return entry.result
+            call = self.inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self.inflight[key] = _Call()
+
+        if not leader:
+            metrics.inc("repo_checks_total", source="coalesced")
+            # the leader's request is bounded by the timeouts, wait a little longer than that
+            call.done.wait(sum(self.timeout) + 1)
+            if call.result is None:
+                return False, "Timed out waiting for GitHub", None
+            return call.result
+
+        try:
+            call.result = self._fetch(key, owner, repo, token, entry)
+        finally:
+            with self.lock:
+                self.inflight.pop(key, None)
+            call.done.set()
+        return call.result
+
+    def _fetch(self, key, owner, repo, token, stale):
+        headers = {"Accept": "application/vnd.github+json"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        if stale is not None and stale.etag:
+            headers["If-None-Match"] = stale.etag
+
+        try:
+            response = self.session.get(f"{GITHUB_API_URL}/repos/{owner}/{repo}", headers=headers, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            if stale is not None:
+                metrics.inc("repo_checks_total", source="stale")
+                return stale.result
+            metrics.inc("repo_checks_total", source="error")
+            return False, f"Error connecting to GitHub: {str(e)}", None
+
+        status = response.status_code
+        if status == 304 and stale is not None:
+            metrics.inc("repo_checks_total", source="revalidated")
+            self._store(key, stale.result, stale.etag)
+            return stale.result
+
+        metrics.inc("repo_checks_total", source="upstream")
+        if status == 200:
+            result = (True, "Repository exists", {"url": f"https://github.com/{owner}/{repo}"})
+            self._store(key, result, response.headers.get("ETag"))
+            return result
+        if status == 404:
+            self._store(key, NOT_FOUND, response.headers.get("ETag"))
+            return NOT_FOUND
+        if status == 401:
+            return False, "Invalid or expired access token", None
+        if status in (403, 429) and response.headers.get("X-RateLimit-Remaining") == "0":
+            if stale is not None:
+                return stale.result
+            return False, "GitHub rate limit exceeded, try again later", None
+        return False, f"Unexpected status code: {status}", None
+
+    def _store(self, key, result, etag):
+        ttl = self.ttl if result[0] else self.negative_ttl
+        with self.lock:
+            self.cache[key] = _Entry(result, etag, self.clock() + ttl)
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+
+
+_checker = RepoChecker()
+
+
+def check_repo_exists(owner, repo, repoKey=None):
+    """Check if the repository exists on GitHub, see RepoChecker."""
+    return _checker.check(owner, repo, repoKey)
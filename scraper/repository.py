@@ -1,17 +1,105 @@
 import os
+import threading
 import psycopg2
+import psycopg2.extras
+import psycopg2.pool
 
-def get_connection():
+#------------------------------- connection pool -----------------------------------------------
+#  All repository functions borrow a connection from a per-process pool with get_connection()
+#  and hand it back with release_connection(). The pool is created lazily the first time it is
+#  needed in a process, so Celery prefork children never reuse the sockets of their parent.
+#  DB_POOL_MIN_SIZE idle connections are kept open, at most DB_POOL_MAX_SIZE are open at once,
+#  and callers wait up to DB_POOL_TIMEOUT seconds for a free connection.
+#------------------------------------------------------------------------------------------------
+
+DB_POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN_SIZE", 2))
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", 10))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+
+_pool = None
+_pool_pid = None
+_pool_slots = None
+_pool_lock = threading.Lock()
+
+def _connection_kwargs():
     dsn = os.environ.get("DATABASE_URL")
     if dsn:
-        return psycopg2.connect(dsn)
-    return psycopg2.connect(
-        database=os.environ.get("POSTGRES_DB", "reporacoondb"),
-        user=os.environ.get("POSTGRES_USER", "root"),
-        password=os.environ.get("POSTGRES_PASSWORD", "fisk"),
-        host=os.environ.get("DB_HOST", "127.0.0.1"),
-        port=int(os.environ.get("DB_PORT", 5432)),
-    )
+        return {"dsn": dsn}
+    return {
+        "database": os.environ.get("POSTGRES_DB", "reporacoondb"),
+        "user": os.environ.get("POSTGRES_USER", "root"),
+        "password": os.environ.get("POSTGRES_PASSWORD", "fisk"),
+        "host": os.environ.get("DB_HOST", "127.0.0.1"),
+        "port": int(os.environ.get("DB_PORT", 5432)),
+    }
+
+# Opens a dedicated connection outside the pool. The caller must close it.
+def open_connection():
+    return psycopg2.connect(**_connection_kwargs())
+
+def _get_pool():
+    global _pool, _pool_pid, _pool_slots
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                # A pool inherited through fork shares its sockets with the parent process,
+                # so it is dropped without closing and this process builds its own.
+                _pool = psycopg2.pool.ThreadedConnectionPool(DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, **_connection_kwargs())
+                _pool_slots = threading.BoundedSemaphore(DB_POOL_MAX_SIZE)
+                _pool_pid = pid
+    return _pool, _pool_slots
+
+def get_connection():
+    pool, slots = _get_pool()
+    # ThreadedConnectionPool raises when exhausted instead of blocking, so wait for a slot first
+    if not slots.acquire(timeout=DB_POOL_TIMEOUT):
+        raise psycopg2.pool.PoolError("timed out waiting for a database connection")
+    try:
+        return pool.getconn()
+    except Exception:
+        slots.release()
+        raise
+
+def release_connection(conn):
+    # Connections that did not come from this process' pool (a dedicated open_connection(),
+    # or the NonClosingConnection wrapper the tests patch in) are simply closed.
+    pool = _pool
+    if pool is None or _pool_pid != os.getpid() or not isinstance(conn, psycopg2.extensions.connection):
+        conn.close()
+        return
+
+    # Validate the connection before it goes back: roll back anything left open
+    # (read-only queries or a failed statement) and drop connections that are broken.
+    discard = bool(conn.closed)
+    if not discard and conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            discard = True
+    try:
+        pool.putconn(conn, close=discard)
+    except psycopg2.pool.PoolError:
+        conn.close()
+        return
+    _pool_slots.release()
+
+# Connections of this process' pool by state, for the metrics endpoint. All zero before the
+# pool is first used.
+def pool_stats():
+    pool = _pool
+    if pool is None or _pool_pid != os.getpid():
+        return {"in_use": 0, "idle": 0, "max": DB_POOL_MAX_SIZE}
+    return {"in_use": len(pool._used), "idle": len(pool._pool), "max": DB_POOL_MAX_SIZE}
+
+def close_pool():
+    global _pool, _pool_pid, _pool_slots
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.closeall()
+        _pool = None
+        _pool_pid = None
+        _pool_slots = None
 
 # Gets all scan jobs with status 'PENDING'. Updates the status of all the scan jobs returned by the function to 'PARSING'
 # Returns a dictionary (map) with the key being the job id and the value being the repo url
@@ -30,7 +118,7 @@ def getAllPendingScanJobs():
             return result
     finally:
         if conn:
-            conn.close()
+            release_connection(conn)
 
 def setParsingScanJobsToParsed(ids):
     conn = None
@@ -41,7 +129,7 @@ def setParsingScanJobsToParsed(ids):
             conn.commit()
     finally:
         if conn:
-            conn.close()
+            release_connection(conn)
 
 # Unused for now, but might be handy for managing size of DB later on
 def clearAllScanJobs():
@@ -55,7 +143,7 @@ def clearAllScanJobs():
             return deleted
     finally:
         if conn:
-            conn.close()
+            release_connection(conn)
 
 # Used as a debug function currently
 def getAllScanFindings():
@@ -67,7 +155,7 @@ def getAllScanFindings():
             return cur.fetchall()
     finally:
         if conn:
-            conn.close()
+            release_connection(conn)
 
 # Used as a debug function currently
 def getScanFindingById(id):
@@ -79,7 +167,7 @@ def getScanFindingById(id):
             return cur.fetchall()
     finally:
         if conn:
-            conn.close()       
+            release_connection(conn)       
 
 def insertScanFindings(job_id, file_path, line_number, code_snippet, severity, rule, branch="main"):
     conn = None
@@ -94,7 +182,173 @@ def insertScanFindings(job_id, file_path, line_number, code_snippet, severity, r
             conn.commit()
     finally:
         if conn:
-            conn.close()
+            release_connection(conn)
+
+# Bulk version of insertScanFindings used by FindingSink.
+# findings is a list of (job_id, file_path, line_number, code_snippet, severity, rule, branch, commit_sha)
+# tuples, written with a single multi-row INSERT per page and one commit for the whole batch.
+# commit_sha is only known to history scans, other scans pass None.
+def insertScanFindingsBatch(findings):
+    if not findings:
+        return
+    conn = None
+    try:
+        conn = get_connection()
+        with conn.cursor() as cur:
+            psycopg2.extras.execute_values(
+                cur,
+                "INSERT INTO scan_findings (job_id, file_path, line_number, code_snippet, severity, rule, branch, commit_sha) VALUES %s " \
+                "ON CONFLICT DO NOTHING",
+                findings,
+                page_size=1000,
+            )
+            conn.commit()
+    finally:
+        if conn:
+            release_connection(conn)
+
+# ---- Blob scan cache ----
+
+# Looks up cached findings for a set of blob shas under one ruleset version and marks
+# the hits as recently used. Returns {blob_sha: findings} for the hits only.
+def getCachedBlobFindings(ruleset, blob_shas):
+    blob_shas = list(blob_shas)
+    if not blob_shas:
+        return {}
+    conn = None
+    try:
+        conn = get_connection()
+        with conn.cursor() as cur:
+            cur.execute(
+                "UPDATE blob_scan_cache SET last_used_at = NOW() "
+                "WHERE ruleset = %s AND blob_sha = ANY(%s) RETURNING blob_sha, findings",
+                (ruleset, blob_shas),
+            )
+            rows = cur.fetchall()
+            conn.commit()
+            return {row[0]: row[1] for row in rows}
+    finally:
+        if conn:
+            release_connection(conn)
+
+# entries is a list of (blob_sha, findings) where findings is JSON serialisable
+def insertCachedBlobFindings(ruleset, entries):
+    if not entries:
+        return
+    conn = None
+    try:
+        conn = get_connection()
+        with conn.cursor() as cur:
+            psycopg2.extras.execute_values(
+                cur,
+                "INSERT INTO blob_scan_cache (blob_sha, ruleset, findings) VALUES %s "
+                "ON CONFLICT (blob_sha, ruleset) DO UPDATE SET findings = EXCLUDED.findings, last_used_at = NOW()",
+                [(sha, ruleset, psycopg2.extras.Json(findings)) for sha, findings in entries],
+                page_size=1000,
+            )
+            conn.commit()
+    finally:
+        if conn:
+            release_connection(conn)
+
+# Evicts the least recently used entries so at most max_entries remain.
+# Entries of old ruleset versions are never touched again, so they are evicted first.
+def pruneBlobScanCache(max_entries):
+    conn = None
+    try:
+        conn = get_connection()
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                DELETE FROM blob_scan_cache
+                WHERE (blob_sha, ruleset) IN (
+                    SELECT blob_sha, ruleset FROM blob_scan_cache
+                    ORDER BY last_used_at DESC
+                    OFFSET %s
+                )
+                """,
+                (max_entries,),
+            )
+            deleted = cur.rowcount
+            conn.commit()
+            return deleted
+    finally:
+        if conn:
+            release_connection(conn)
+
+# ---- Incremental scan state ----
+
+def getLastScannedCommit(scope, repo_url, branch):
+    conn = None
+    try:
+        conn = get_connection()
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT head_sha FROM incremental_scan_state WHERE scope = %s AND repo_url = %s AND branch = %s",
+                (scope, repo_url, branch),
+            )
+            row = cur.fetchone()
+            return row[0] if row else None
+    finally:
+        if conn:
+            release_connection(conn)
+
+def setLastScannedCommit(scope, repo_url, branch, head_sha):
+    conn = None
+    try:
+        conn = get_connection()
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO incremental_scan_state (scope, repo_url, branch, head_sha)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (scope, repo_url, branch)
+                DO UPDATE SET head_sha = EXCLUDED.head_sha, updated_at = NOW()
+                """,
+                (scope, repo_url, branch, head_sha),
+            )
+            conn.commit()
+    finally:
+        if conn:
+            release_connection(conn)
+
+# ---- History scan state ----
+
+# Commits a history scan for scope already covered, with everything reachable from them.
+# Returns an empty list when nothing was recorded yet.
+def getHistoryCheckpoint(scope, repo_url):
+    conn = None
+    try:
+        conn = get_connection()
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT commits FROM history_scan_state WHERE scope = %s AND repo_url = %s",
+                (scope, repo_url),
+            )
+            row = cur.fetchone()
+            return list(row[0]) if row else []
+    finally:
+        if conn:
+            release_connection(conn)
+
+def setHistoryCheckpoint(scope, repo_url, commits):
+    conn = None
+    try:
+        conn = get_connection()
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO history_scan_state (scope, repo_url, commits, updated_at)
+                VALUES (%s, %s, %s, NOW())
+                ON CONFLICT (scope, repo_url)
+                DO UPDATE SET commits = EXCLUDED.commits, updated_at = NOW()
+                """,
+                (scope, repo_url, list(commits)),
+            )
+            conn.commit()
+    finally:
+        if conn:
+            release_connection(conn)
 
 def insertDurationInScanJobs(duration, id):
     conn = None
@@ -108,7 +362,185 @@ def insertDurationInScanJobs(duration, id):
             conn.commit()
     finally:
         if conn:
-            conn.close()
+            release_connection(conn)
+
+# Records why a job stopped before scanning the whole repository (see budget.py).
+# The job still finishes as PARSED with the findings it has.
+def markScanJobPartial(job_id, reason):
+    conn = None
+    try:
+        conn = get_connection()
+        with conn.cursor() as cur:
+            cur.execute(
+                "UPDATE scan_jobs SET partial_reason = %s WHERE id = %s",
+                (reason, job_id),
+            )
+            conn.commit()
+    finally:
+        if conn:
+            release_connection(conn)
+
+# Stores the timings and counters of a finished scan (see stats.py) as JSON.
+def insertScanJobStats(job_id, stats):
+    conn = None
+    try:
+        conn = get_connection()
+        with conn.cursor() as cur:
+            cur.execute(
+                "UPDATE scan_jobs SET stats = %s WHERE id = %s",
+                (psycopg2.extras.Json(stats), job_id),
+            )
+            conn.commit()
+    finally:
+        if conn:
+            release_connection(conn)
+
+# ---- Scan checkpoints ----
+
+# Everything a scan job has finished in earlier attempts of the same head: blob shas, or paths
+# for scans of a checkout. Checkpoints of another head are deleted, the job starts over.
+def getScanCheckpoint(job_id, head):
+    conn = None
+    try:
+        conn = get_connection()
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM scan_checkpoints WHERE job_id = %s AND head <> %s", (job_id, head))
+            conn.commit()
+            cur.execute("SELECT unnest(done) FROM scan_checkpoints WHERE job_id = %s", (job_id,))
+            return {row[0] for row in cur.fetchall()}
+    finally:
+        if conn:
+            release_connection(conn)
+
+# Checkpoints are only ever added, so each write is one small insert instead of rewriting a growing row.
+def appendScanCheckpoint(job_id, head, done):
+    if not done:
+        return
+    conn = None
+    try:
+        conn = get_connection()
+        with conn.cursor() as cur:
+            cur.execute("INSERT INTO scan_checkpoints (job_id, head, done) VALUES (%s, %s, %s)",
+                        (job_id, head, list(done)))
+            conn.commit()
+    finally:
+        if conn:
+            release_connection(conn)
+
+def deleteScanCheckpoint(job_id):
+    conn = None
+    try:
+        conn = get_connection()
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM scan_checkpoints WHERE job_id = %s", (job_id,))
+            conn.commit()
+    finally:
+        if conn:
+            release_connection(conn)
+
+# ---- Coalescing of duplicate scan jobs ----
+
+# Gives each of the (job_id, coalesce_key) pairs its key and attaches every job to the oldest
+# PENDING job with the same key, which may be another job of the same batch.
+# Returns {job_id: primary_job_id} for the attached jobs; the others are the ones to enqueue.
+# Jobs without a row in scan_jobs are left alone.
+def coalescePendingScanJobs(jobs):
+    if not jobs:
+        return {}
+    conn = None
+    try:
+        conn = get_connection()
+        with conn.cursor() as cur:
+            ids = [str(job_id) for job_id, _ in jobs]
+            keys = [key for _, key in jobs]
+            cur.execute(
+                "UPDATE scan_jobs AS sj SET coalesce_key = v.key "
+                "FROM unnest(%s::uuid[], %s::text[]) AS v(id, key) WHERE sj.id = v.id",
+                (ids, keys),
+            )
+            # the row locks keep claimScanJob from starting a primary while jobs are attached to it.
+            # a job pending for more than a day is probably lost, nothing is attached to it
+            cur.execute(
+                "SELECT id, coalesce_key FROM scan_jobs "
+                "WHERE coalesce_key = ANY(%s) AND status = 'PENDING' AND shares_job_id IS NULL "
+                "AND created_at > NOW() - INTERVAL '1 day' "
+                "ORDER BY created_at, id FOR UPDATE",
+                (list(set(keys)),),
+            )
+            primaries = {}
+            for job_id, key in cur.fetchall():
+                primaries.setdefault(key, str(job_id))
+
+            attached = {
+                job_id: primaries[key] for job_id, key in zip(ids, keys)
+                if key in primaries and primaries[key] != job_id
+            }
+            if attached:
+                cur.execute(
+                    "UPDATE scan_jobs AS sj SET shares_job_id = v.primary_id "
+                    "FROM unnest(%s::uuid[], %s::uuid[]) AS v(id, primary_id) WHERE sj.id = v.id",
+                    (list(attached), list(attached.values())),
+                )
+            conn.commit()
+            return attached
+    finally:
+        if conn:
+            release_connection(conn)
+
+# Marks a coalesced job as PARSING before it scans, so no more jobs attach to it,
+# and returns the ids of the jobs attached to it so far.
+def claimScanJob(job_id):
+    conn = None
+    try:
+        conn = get_connection()
+        with conn.cursor() as cur:
+            cur.execute("UPDATE scan_jobs SET status = %s WHERE id = %s", ("PARSING", job_id))
+            conn.commit()
+            cur.execute("SELECT id FROM scan_jobs WHERE shares_job_id = %s", (job_id,))
+            return [str(row[0]) for row in cur.fetchall()]
+    finally:
+        if conn:
+            release_connection(conn)
+
+# Copies the findings, duration, partial_reason and stats of a finished job to the jobs attached to it.
+def shareScanJobResults(job_id, shared_ids):
+    if not shared_ids:
+        return
+    conn = None
+    try:
+        conn = get_connection()
+        with conn.cursor() as cur:
+            cur.execute(
+                "INSERT INTO scan_findings (job_id, file_path, line_number, code_snippet, severity, rule, branch, commit_sha) "
+                "SELECT t.id, f.file_path, f.line_number, f.code_snippet, f.severity, f.rule, f.branch, f.commit_sha "
+                "FROM scan_findings f CROSS JOIN unnest(%s::uuid[]) AS t(id) WHERE f.job_id = %s "
+                "ON CONFLICT DO NOTHING",
+                (shared_ids, job_id),
+            )
+            cur.execute(
+                "UPDATE scan_jobs AS t SET duration = s.duration, partial_reason = s.partial_reason, stats = s.stats "
+                "FROM scan_jobs AS s WHERE s.id = %s AND t.id = ANY(%s::uuid[])",
+                (job_id, shared_ids),
+            )
+            conn.commit()
+    finally:
+        if conn:
+            release_connection(conn)
+
+# Fails the jobs attached to a job that ran out of retries, nothing would ever finish them otherwise.
+def failAttachedScanJobs(job_id):
+    conn = None
+    try:
+        conn = get_connection()
+        with conn.cursor() as cur:
+            cur.execute(
+                "UPDATE scan_jobs SET status = %s WHERE shares_job_id = %s AND status = %s",
+                ("FAILED", job_id, "PENDING"),
+            )
+            conn.commit()
+    finally:
+        if conn:
+            release_connection(conn)
 
 def insertScanJob(repo_url, owner_id=None, priority=1, recursive_scan_id=None):
     """Create a new scan job and return its id."""
@@ -125,11 +557,11 @@ def insertScanJob(repo_url, owner_id=None, priority=1, recursive_scan_id=None):
             return job_id
     finally:
         if conn:
-            conn.close()
+            release_connection(conn)
 
 # ---- Recursive scan repository functions ----
 
-def insertRecursiveScan(repo_url, repoKey, interval, is_deep_scan=False, extensions=[], owner_id=None):
+def insertRecursiveScan(repo_url, repoKey, interval, is_deep_scan=False, extensions=[], owner_id=None, incremental=False):
     # next_run_at is calculated in SQL so it stays consistent with the DB clock.
     # The interval is passed twice because CASE requires the expression to be
     # evaluated independently from the column value being inserted.
@@ -139,8 +571,8 @@ def insertRecursiveScan(repo_url, repoKey, interval, is_deep_scan=False, extensi
         with conn.cursor() as cur:
             cur.execute(
                 """
-                INSERT INTO recursive_scans (repo_url, owner_id, repoKey, interval, is_deep_scan, extensions, next_run_at)
-                VALUES (%s, %s, %s, %s::scan_interval, %s, %s,
+                INSERT INTO recursive_scans (repo_url, owner_id, repoKey, interval, is_deep_scan, extensions, incremental, next_run_at)
+                VALUES (%s, %s, %s, %s::scan_interval, %s, %s, %s,
                     CASE %s::scan_interval
                         WHEN 'EVERY_MINUTE' THEN NOW() + INTERVAL '1 minute'
                         WHEN 'HOURLY'  THEN NOW() + INTERVAL '1 hour'
@@ -151,14 +583,14 @@ def insertRecursiveScan(repo_url, repoKey, interval, is_deep_scan=False, extensi
                     END)
                 RETURNING id, next_run_at
                 """,
-                (repo_url, owner_id, repoKey, interval, is_deep_scan, extensions, interval),
+                (repo_url, owner_id, repoKey, interval, is_deep_scan, extensions, incremental, interval),
             )
             row = cur.fetchone()
             conn.commit()
             return row[0], row[1]
     finally:
         if conn:
-            conn.close()
+            release_connection(conn)
 
 def getAllRecursiveScans():
     # Returns all schedules regardless of owner — used by the scraper internally.
@@ -168,19 +600,21 @@ def getAllRecursiveScans():
         conn = get_connection()
         with conn.cursor() as cur:
             cur.execute(
-                "SELECT id, repo_url, interval, repoKey, is_deep_scan, extensions, is_active, last_run_at, next_run_at, created_at "
+                "SELECT id, repo_url, interval, repoKey, is_deep_scan, extensions, is_active, last_run_at, next_run_at, created_at, "
+                "last_unchanged_at, unchanged_runs "
                 "FROM recursive_scans ORDER BY created_at DESC"
             )
             rows = cur.fetchall()
-            keys = ["id", "repo_url", "interval", "repoKey", "is_deep_scan", "extensions", "is_active", "last_run_at", "next_run_at", "created_at"]
+            keys = ["id", "repo_url", "interval", "repoKey", "is_deep_scan", "extensions", "is_active", "last_run_at", "next_run_at", "created_at",
+                    "last_unchanged_at", "unchanged_runs"]
             return [dict(zip(keys, r)) for r in rows]
     finally:
         if conn:
-            conn.close()
+            release_connection(conn)
 
 def getDueRecursiveScans():
-    # Called by the scheduler loop every 60 seconds.
     # Only returns active scans — paused scans (is_active = false) are skipped.
+    # Read-only; the dispatcher claims due scans with claimDueRecursiveScans instead.
     conn = None
     try:
         conn = get_connection()
@@ -194,12 +628,19 @@ def getDueRecursiveScans():
             return [dict(zip(keys, r)) for r in rows]
     finally:
         if conn:
-            conn.close()
+            release_connection(conn)
+
+# Due schedules that were enqueued at the same moment finish around the same time too.
+# Up to this fraction of the interval, but never more than RECURSIVE_SCAN_MAX_JITTER_SECONDS,
+# is added to next_run_at at random, so they drift apart instead of hitting the queues together
+# on every run while long intervals still run on the day they are due.
+RECURSIVE_SCAN_JITTER = float(os.environ.get("RECURSIVE_SCAN_JITTER", 0.1))
+RECURSIVE_SCAN_MAX_JITTER_SECONDS = float(os.environ.get("RECURSIVE_SCAN_MAX_JITTER_SECONDS", 300))
 
-def updateRecursiveScanAfterRun(id):
+def updateRecursiveScanAfterRun(id, jitter=RECURSIVE_SCAN_JITTER, max_jitter_seconds=RECURSIVE_SCAN_MAX_JITTER_SECONDS):
     # Called at the end of every successful scan run.
     # Advances next_run_at relative to NOW() (not the previous next_run_at) so
-    # a delayed run doesn't cause the next run to fire immediately.
+    # a delayed run doesn't cause the next run to fire immediately, and ends the dispatcher's lease.
     conn = None
     try:
         conn = get_connection()
@@ -208,22 +649,122 @@ def updateRecursiveScanAfterRun(id):
                 """
                 UPDATE recursive_scans
                 SET last_run_at = NOW(),
-                    next_run_at = CASE interval
-                        WHEN 'EVERY_MINUTE' THEN NOW() + INTERVAL '1 minute'
-                        WHEN 'HOURLY'  THEN NOW() + INTERVAL '1 hour'
-                        WHEN 'DAILY'   THEN NOW() + INTERVAL '1 day'
-                        WHEN 'WEEKLY'  THEN NOW() + INTERVAL '7 days'
-                        WHEN 'MONTHLY' THEN NOW() + INTERVAL '1 month'
-                        WHEN 'YEARLY'  THEN NOW() + INTERVAL '1 year'
-                    END
+                    lease_until = NULL,
+                    next_run_at = NOW() + step.every
+                        + LEAST(step.every * %s, make_interval(secs => %s)) * random()
+                FROM (
+                    SELECT CASE interval
+                        WHEN 'EVERY_MINUTE' THEN INTERVAL '1 minute'
+                        WHEN 'HOURLY'  THEN INTERVAL '1 hour'
+                        WHEN 'DAILY'   THEN INTERVAL '1 day'
+                        WHEN 'WEEKLY'  THEN INTERVAL '7 days'
+                        WHEN 'MONTHLY' THEN INTERVAL '1 month'
+                        WHEN 'YEARLY'  THEN INTERVAL '1 year'
+                    END AS every
+                    FROM recursive_scans WHERE id = %s
+                ) AS step
                 WHERE id = %s
                 """,
+                (jitter, max_jitter_seconds, id, id),
+            )
+            conn.commit()
+    finally:
+        if conn:
+            release_connection(conn)
+
+# Claims up to limit due schedules for the dispatcher and leases them for lease_seconds.
+# FOR UPDATE SKIP LOCKED lets several dispatchers claim at once without blocking on or
+# returning each other's rows; leased rows are skipped until their run ends
+# (updateRecursiveScanAfterRun) or the lease runs out, which retries a run that never finished.
+def claimDueRecursiveScans(limit, lease_seconds):
+    conn = None
+    try:
+        conn = get_connection()
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                WITH due AS (
+                    SELECT id FROM recursive_scans
+                    WHERE is_active = true AND next_run_at <= NOW()
+                      AND (lease_until IS NULL OR lease_until <= NOW())
+                    ORDER BY next_run_at
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                UPDATE recursive_scans AS rs
+                SET lease_until = NOW() + make_interval(secs => %s)
+                FROM due WHERE rs.id = due.id
+                RETURNING rs.id, rs.repo_url, rs.repoKey, rs.interval, rs.is_deep_scan, rs.extensions, rs.owner_id,
+                          rs.incremental
+                """,
+                (limit, lease_seconds),
+            )
+            rows = cur.fetchall()
+            conn.commit()
+            keys = ["id", "repo_url", "repoKey", "interval", "is_deep_scan", "extensions", "owner_id", "incremental"]
+            return [dict(zip(keys, r)) for r in rows]
+    finally:
+        if conn:
+            release_connection(conn)
+
+# Gives claimed schedules back, e.g. when they could not be enqueued.
+def releaseRecursiveScanLeases(ids):
+    if not ids:
+        return
+    conn = None
+    try:
+        conn = get_connection()
+        with conn.cursor() as cur:
+            cur.execute("UPDATE recursive_scans SET lease_until = NULL WHERE id = ANY(%s::uuid[])",
+                        ([str(i) for i in ids],))
+            conn.commit()
+    finally:
+        if conn:
+            release_connection(conn)
+
+# The remote refs and options the last complete run of a recurring scan covered, or None.
+def getRecursiveScanRefs(id):
+    conn = None
+    try:
+        conn = get_connection()
+        with conn.cursor() as cur:
+            cur.execute("SELECT last_refs FROM recursive_scans WHERE id = %s", (id,))
+            row = cur.fetchone()
+            return row[0] if row else None
+    finally:
+        if conn:
+            release_connection(conn)
+
+# Recorded after a complete run, which also ends the streak of unchanged runs.
+def setRecursiveScanRefs(id, refs):
+    conn = None
+    try:
+        conn = get_connection()
+        with conn.cursor() as cur:
+            cur.execute(
+                "UPDATE recursive_scans SET last_refs = %s, unchanged_runs = 0 WHERE id = %s",
+                (psycopg2.extras.Json(refs), id),
+            )
+            conn.commit()
+    finally:
+        if conn:
+            release_connection(conn)
+
+# A run that was skipped because nothing was pushed since the last complete run.
+# No scan job is created for it, the last complete run's findings stay the current ones.
+def markRecursiveScanUnchanged(id):
+    conn = None
+    try:
+        conn = get_connection()
+        with conn.cursor() as cur:
+            cur.execute(
+                "UPDATE recursive_scans SET last_unchanged_at = NOW(), unchanged_runs = unchanged_runs + 1 WHERE id = %s",
                 (id,),
             )
             conn.commit()
     finally:
         if conn:
-            conn.close()
+            release_connection(conn)
 
 def toggleRecursiveScan(id):
     # Flips is_active atomically in a single UPDATE … RETURNING so the caller
@@ -241,7 +782,7 @@ def toggleRecursiveScan(id):
             return row[0] if row else None
     finally:
         if conn:
-            conn.close()
+            release_connection(conn)
 
 def deleteRecursiveScan(id):
     # Deletes the schedule row. Linked scan_jobs rows are kept — their
@@ -256,7 +797,7 @@ def deleteRecursiveScan(id):
             return deleted
     finally:
         if conn:
-            conn.close()
+            release_connection(conn)
 
 
 def getUserTier(user_id):
@@ -269,7 +810,23 @@ def getUserTier(user_id):
             return row[0] if row else None
     finally:
         if conn:
-            conn.close()
+            release_connection(conn)
+
+
+# Tiers of many users in one query. Returns {user_id: tier} for the users that exist.
+def getUserTiers(user_ids):
+    user_ids = [str(user_id) for user_id in user_ids]
+    if not user_ids:
+        return {}
+    conn = None
+    try:
+        conn = get_connection()
+        with conn.cursor() as cur:
+            cur.execute("SELECT id, tier FROM users WHERE id = ANY(%s::uuid[])", (user_ids,))
+            return {str(row[0]): row[1] for row in cur.fetchall()}
+    finally:
+        if conn:
+            release_connection(conn)
 
 
 def setUserTier(user_id, tier):
@@ -286,4 +843,4 @@ def setUserTier(user_id, tier):
             return updated > 0
     finally:
         if conn:
-            conn.close()
\ No newline at end of file
+            release_connection(conn)
\ No newline at end of file
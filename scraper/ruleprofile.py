@@ -0,0 +1,153 @@
+import os
+import sys
+import json
+import heapq
+import argparse
+from collections import defaultdict
+
+#------------------------------- rule profiler -----------------------------------------------
+#  Measures what each rule of the pattern table costs. When a RuleProfile is passed to
+#  RuleEngine.finditer, the time spent inside each rule's regex search is recorded per rule,
+#  per file type and per file, next to the number of matches and the files the anchor
+#  prefilter let the rule skip. Only the regex engine's own work is timed, not the code
+#  that consumes the matches.
+#
+#  Profiling is opt-in: scan jobs record a profile when SCAN_PROFILE_RULES is set and store
+#  it in their stats. To profile the rules against a local directory:
+#
+#    python ruleprofile.py path/to/checkout --top 10 --worst 3
+#--------------------------------------------------------------------------------------------------
+
+SCAN_PROFILE_RULES = os.environ.get("SCAN_PROFILE_RULES", "false").lower() in ("1", "true", "yes")
+# slowest files remembered per rule
+WORST_FILES = 5
+
+
+def file_type(path):
+    """The extension of path, or its name for files without one (Dockerfile, Makefile)."""
+    name = os.path.basename(path)
+    ext = os.path.splitext(name)[1].lower()
+    return ext or name
+
+
+class RuleProfile:
+    def __init__(self, worst_files=WORST_FILES):
+        self.worst_files = worst_files
+        # rule -> {"seconds", "matches", "runs", "skipped"}
+        self.rules = defaultdict(lambda: {"seconds": 0.0, "matches": 0, "runs": 0, "skipped": 0})
+        # rule -> file type -> {"seconds", "matches"}
+        self.by_type = defaultdict(lambda: defaultdict(lambda: {"seconds": 0.0, "matches": 0}))
+        # rule -> min-heap of (seconds, path), the slowest files
+        self.worst = defaultdict(list)
+        self.path = None
+        # rule -> seconds spent on the current file, it can be searched in several windows
+        self.current = defaultdict(float)
+
+    def start_file(self, path):
+        self._finish_file()
+        self.path = path
+
+    def _finish_file(self):
+        for rule, seconds in self.current.items():
+            self._remember(rule, seconds, self.path)
+        self.current.clear()
+
+    def _remember(self, rule, seconds, path):
+        heap = self.worst[rule]
+        if len(heap) < self.worst_files:
+            heapq.heappush(heap, (seconds, path))
+        elif seconds > heap[0][0]:
+            heapq.heapreplace(heap, (seconds, path))
+
+    def record(self, rule, seconds, matches):
+        """One search of rule over the current file (or one window of it)."""
+        stats = self.rules[rule]
+        stats["seconds"] += seconds
+        stats["matches"] += matches
+        stats["runs"] += 1
+        typed = self.by_type[rule][file_type(self.path or "")]
+        typed["seconds"] += seconds
+        typed["matches"] += matches
+        self.current[rule] += seconds
+
+    def skip(self, rule):
+        """rule was not run on the current file because none of its anchors occur in it."""
+        self.rules[rule]["skipped"] += 1
+
+    def to_dict(self, top=None):
+        """Rules by total time, slowest first, optionally only the top ones."""
+        self._finish_file()
+        ranked = sorted(self.rules.items(), key=lambda item: item[1]["seconds"], reverse=True)
+        result = {}
+        for rule, stats in ranked[:top]:
+            result[rule] = {
+                "seconds": round(stats["seconds"], 6),
+                "matches": stats["matches"],
+                "runs": stats["runs"],
+                "skipped": stats["skipped"],
+                "by_type": {
+                    ext: {"seconds": round(t["seconds"], 6), "matches": t["matches"]}
+                    for ext, t in sorted(self.by_type[rule].items(), key=lambda item: item[1]["seconds"], reverse=True)
+                },
+                "worst_files": [
+                    {"path": path, "seconds": round(seconds, 6)}
+                    for seconds, path in sorted(self.worst[rule], reverse=True)
+                ],
+            }
+        return result
+
+    def merge(self, other):
+        """Add the to_dict() of another profile, e.g. one from a worker process."""
+        self._finish_file()
+        for rule, stats in other.items():
+            mine = self.rules[rule]
+            for key in ("seconds", "matches", "runs", "skipped"):
+                mine[key] += stats[key]
+            for ext, t in stats["by_type"].items():
+                self.by_type[rule][ext]["seconds"] += t["seconds"]
+                self.by_type[rule][ext]["matches"] += t["matches"]
+            for worst in stats["worst_files"]:
+                self._remember(rule, worst["seconds"], worst["path"])
+
+
+def profile_directory(path, extensions=None):
+    """Run the scanner's rules over every scannable file below path and return the profile."""
+    from logic import GitHubSecretScanner, defaultExtensions
+
+    scanner = GitHubSecretScanner(path, None, extensions=extensions or defaultExtensions, profile_rules=True)
+    scanner.write_log = lambda message: None
+    for file_path in scanner.collect_files(path):
+        try:
+            scanner.profile_file(os.path.relpath(file_path, path))
+            scanner.find_secrets_in_file(file_path)
+        except OSError as e:
+            print(f"skipping {file_path}: {e}", file=sys.stderr)
+    return scanner.rule_profile
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show which scanner rules cost the most time on a directory.")
+    parser.add_argument("path", help="directory to scan, e.g. a checkout")
+    parser.add_argument("--top", type=int, default=10, help="rules to show")
+    parser.add_argument("--worst", type=int, default=3, help="slowest files to show per rule")
+    parser.add_argument("--extensions", nargs="+", help="file extensions to scan (default: the scanner's)")
+    parser.add_argument("--json", metavar="FILE", help="also write the full profile as JSON")
+    args = parser.parse_args(argv)
+
+    profile = profile_directory(args.path, args.extensions).to_dict()
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(profile, f, indent=2)
+
+    total = sum(stats["seconds"] for stats in profile.values()) or 1e-9
+    print(f"{'rule':28} {'seconds':>9} {'share':>6} {'matches':>8} {'runs':>6} {'skipped':>8}")
+    for rule, stats in list(profile.items())[:args.top]:
+        print(f"{rule:28} {stats['seconds']:9.4f} {stats['seconds'] / total:6.1%} "
+              f"{stats['matches']:8} {stats['runs']:6} {stats['skipped']:8}")
+        for worst in stats["worst_files"][:args.worst]:
+            print(f"    {worst['seconds']:9.4f}s  {worst['path']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+import re
+import time
+from functools import lru_cache
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+#------------------------------- rule engine -----------------------------------------------
+#  The scanner's pattern table is compiled once per process into a RuleEngine.
+#  Before running a rule the engine checks that at least one of the rule's literal
+#  anchors occurs in the file. Most files contain none of the vendor prefixes
+#  (AKIA, ghp_, sk-ant-, xox, ...) so most rules are skipped without ever
+#  touching the regex engine.
+#
+#  Python's `re` does not optimise an alternation of literals (no Aho-Corasick),
+#  so a single combined prefilter regex is several times slower than plain
+#  substring probes, which run in C. The probes are what we use here.
+#--------------------------------------------------------------------------------------------
+
+# Literal substrings that every match of a rule must contain. A rule is only run
+# when at least one of its anchors is present in the file.
+# Rules that are missing from this table (or map to an empty tuple) always run.
+# Anchors for case-insensitive rules must be written in lowercase.
+RULE_ANCHORS = {
+    'AWS API Key': ('AKIA',),
+    'AWS Secret Key': ('aws',),
+    'Private Key': ('-----BEGIN ',),
+    'Stripe Key': ('_test_', '_live_'),
+    'OpenAI API Key': ('sk-',),
+    'OpenAI Legacy Key': ('T3BlbkFJ',),
+    'Anthropic API Key': ('sk-ant-api03-',),
+
+    'Google API Key': ('AIza',),
+    'Slack Token': ('xox',),
+    'GitHub Token': ('ghp_', 'github_pat_', 'gho_', 'gha_', 'ghs_', 'ghu_'),
+    'MongoDB URI': ('mongodb',),
+    'PostgreSQL URI': ('postgresql://',),
+    # Telegram and Discord bot tokens have no literal worth probing for
+    'Telegram Bot Token': (),
+    'Discord Bot Token': (),
+    'Hugging Face Token': ('hf_',),
+    'Twilio Key': ('SK',),
+    'SendGrid Key': ('SG.',),
+    'Mailgun Key': ('key-',),
+    'JWT Token': ('eyJ',),
+    'MySQL URI': ('mysql://',),
+    'Bearer Token': ('bearer',),
+
+    'Google OAuth': ('.apps.googleusercontent.com',),
+    'Generic API Key': ('api', 'secret', 'token'),
+    'Algolia Key': ('api',),
+    'Slack Webhook': ('https://hooks.slack.com/services/',),
+    'Discord Webhook': ('/api/webhooks/',),
+    'NPM Token': ('npm_',),
+    'PyPI Token': ('pypi-',),
+    'Docker Hub Token': ('dckr_pat_',),
+
+    'OpenAI Org ID': ('org-',),
+    'S3 Bucket': ('.s3.amazonaws.com',),
+    'Firebase URL': ('.firebaseio.com',),
+}
+
+
+def _max_width(pattern):
+    """Longest text the pattern can match, or None if it is unbounded."""
+    width = sre_parse.parse(pattern).getwidth()[1]
+    return None if width >= sre_parse.MAXREPEAT else width
+
+
+class RuleEngine:
+    def __init__(self, patterns):
+        # list of (name, severity, compiled regex, anchors, ignorecase)
+        self.rules = []
+        # longest match of any rule with a bounded width
+        self.max_width = max((w for w in (_max_width(p) for p, _ in patterns.values()) if w is not None), default=0)
+        for name, (pattern, severity) in patterns.items():
+            compiled = re.compile(pattern, flags=re.MULTILINE)
+            ignorecase = bool(compiled.flags & re.IGNORECASE)
+            anchors = tuple(RULE_ANCHORS.get(name, ()))
+            if ignorecase:
+                anchors = tuple(a.lower() for a in anchors)
+            self.rules.append((name, severity, compiled, anchors, ignorecase))
+
+    def finditer(self, content, pos=0, resume=None, profile=None):
+        """Yield (rule, severity, match) for every rule match in content.
+
+        Matches come out in the same order as running re.finditer for each
+        rule in table order. Searching starts at pos, or for the rules in
+        resume ({rule: offset}) at their own offset if that is further on.
+        With a profile (see ruleprofile.py) the time each rule's search takes
+        is recorded in it.
+        """
+        # Unicode case folding lets re.IGNORECASE match characters such as 'ſ'
+        # against 's', which str.lower() does not reproduce. Only prefilter the
+        # case-insensitive rules when the file is plain ASCII.
+        lowered = content.lower() if content.isascii() else None
+
+        for name, severity, compiled, anchors, ignorecase in self.rules:
+            if anchors:
+                if ignorecase:
+                    if lowered is not None and not any(a in lowered for a in anchors):
+                        if profile is not None:
+                            profile.skip(name)
+                        continue
+                elif not any(a in content for a in anchors):
+                    if profile is not None:
+                        profile.skip(name)
+                    continue
+
+            start = max(pos, resume.get(name, pos)) if resume else pos
+            if profile is None:
+                for m in compiled.finditer(content, start):
+                    yield name, severity, m
+                continue
+
+            # only time the regex engine, not whatever the caller does between matches
+            matches = compiled.finditer(content, start)
+            seconds, count = 0.0, 0
+            while True:
+                started = time.perf_counter()
+                m = next(matches, None)
+                seconds += time.perf_counter() - started
+                if m is None:
+                    break
+                count += 1
+                yield name, severity, m
+            profile.record(name, seconds, count)
+
+
+@lru_cache(maxsize=8)
+def _compile_rules(items):
+    return RuleEngine(dict(items))
+
+
+def compile_rules(patterns):
+    """Return the RuleEngine for a pattern table, compiling it once per process."""
+    return _compile_rules(tuple(patterns.items()))
@@ -0,0 +1,56 @@
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+#------------------------------- scan stats -----------------------------------------------
+#  Per-job timings and counters, so a slow job can be traced to the phase it spent its
+#  time in. The scanner fills a ScanStats while it runs and stores to_dict() in
+#  scan_jobs.stats when the job ends.
+#
+#    phases     seconds spent cloning, listing files (walk), running the rules (regex),
+#               evaluating entropy candidates and talking to the database (db)
+#    counters   clone_bytes (objects downloaded), disk_bytes (clone and checkout on disk),
+#               files_seen, files_skipped, files_scanned, cache_hits, bytes_scanned,
+#               entropy_candidates, findings_written
+#    rule_hits  regex matches per rule, before findings are deduplicated across branches
+#
+#  Worker processes of a parallel scan fill their own ScanStats, which are merged into the
+#  job's stats with merge().
+#--------------------------------------------------------------------------------------------------
+
+PHASES = ("clone", "walk", "regex", "entropy", "db")
+
+
+class ScanStats:
+    def __init__(self):
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.counters = Counter()
+        self.rule_hits = Counter()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] += time.perf_counter() - start
+
+    def add_time(self, name, seconds):
+        self.phases[name] += seconds
+
+    def count(self, name, amount=1):
+        self.counters[name] += amount
+
+    def merge(self, other):
+        """Add the to_dict() of another ScanStats, e.g. one from a worker process."""
+        for name, seconds in other["phases"].items():
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+        self.counters.update(other["counters"])
+        self.rule_hits.update(other["rule_hits"])
+
+    def to_dict(self):
+        return {
+            "phases": {name: round(seconds, 4) for name, seconds in self.phases.items()},
+            "counters": dict(sorted(self.counters.items())),
+            "rule_hits": dict(self.rule_hits.most_common()),
+        }
@@ -1,71 +1,187 @@
 import os
 import time
 import math
+import socket
+import subprocess
 from celery import Celery
+from celery.signals import before_task_publish, task_prerun, task_postrun, task_retry, task_failure
 from repository import (
     insertScanJob,
     insertDurationInScanJobs,
     setParsingScanJobsToParsed,
     updateRecursiveScanAfterRun,
+    getRecursiveScanRefs,
+    setRecursiveScanRefs,
+    markRecursiveScanUnchanged,
+    claimScanJob,
+    shareScanJobResults,
+    failAttachedScanJobs,
+    pool_stats,
 )
+import metrics
 from logic import GitHubSecretScanner
+from gitobjects import ls_remote, authenticated_url
+from budget import ScanBudget
 
 BROKER_URL = os.environ.get("CELERY_BROKER_URL", "redis://redis:6379/0")
 
 celery_app = Celery("tasks", broker=BROKER_URL, backend=BROKER_URL)
 
+# Number of processes each scan may use to scan files in parallel, per queue.
+# 1 keeps the scan inside the Celery worker process.
+FAST_QUEUE_SCAN_WORKERS = int(os.environ.get("FAST_QUEUE_SCAN_WORKERS", 1))
+SLOW_QUEUE_SCAN_WORKERS = int(os.environ.get("SLOW_QUEUE_SCAN_WORKERS", 1))
+
+# Per-queue limits on files, bytes and time a single scan may use, see budget.py.
+FAST_QUEUE_BUDGET = ScanBudget.from_env("FAST_QUEUE")
+SLOW_QUEUE_BUDGET = ScanBudget.from_env("SLOW_QUEUE")
+
 # Max 4 scans running concurrently per worker (controlled by --concurrency in docker-compose)
 celery_app.conf.update(
     task_acks_late=True,           # only ack after task completes, so a crashed worker re-queues the job
     worker_prefetch_multiplier=1,  # each worker picks up one job at a time from the queue
 )
 
+# -------------------------------------------------------------------------
+# METRICS
+# Task latency, retries and failures are recorded through Celery's signals, see metrics.py.
+# before_task_publish runs in the process that enqueues (the API, or a worker retrying).
+# -------------------------------------------------------------------------
+
+# task id -> perf_counter() when this worker process started it
+_task_started = {}
+
+@before_task_publish.connect
+def _record_enqueued(sender=None, headers=None, **kwargs):
+    if headers and "id" in headers:
+        metrics.mark_enqueued(headers["id"])
+
+@task_prerun.connect
+def _record_started(task_id=None, task=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+    enqueued = metrics.pop_enqueued(task_id)
+    if enqueued is not None:
+        metrics.observe("task_queue_wait_seconds", max(time.time() - enqueued, 0.0), queue=task.queue)
+
+@task_postrun.connect
+def _record_finished(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        metrics.observe("task_duration_seconds", time.perf_counter() - started,
+                        task=task.name, queue=task.queue, state=state or "UNKNOWN")
+    db = pool_stats()
+    metrics.set_gauge("db_pool_connections", f"{socket.gethostname()}:{os.getpid()}",
+                      [({"state": "in_use"}, db["in_use"]), ({"state": "idle"}, db["idle"])])
+
+@task_retry.connect
+def _record_retry(sender=None, **kwargs):
+    metrics.inc("task_retries_total", task=sender.name)
+
+@task_failure.connect
+def _record_failure(sender=None, **kwargs):
+    metrics.inc("task_failures_total", task=sender.name)
+
 # -------------------------------------------------------------------------
 # STANDARD SCANS
-# Expected delay call: task.delay(job_id, repo_url, is_deep_scan, extensions, repoKey)
+# Expected delay call: task.delay(job_id, repo_url, is_deep_scan, extensions, repoKey, incremental_scope=None, history=False,
+#                                 ref=None, sha=None)
+# history=True scans every commit instead of the current trees, see GitHubSecretScanner.scan_history
+# ref and sha scan a pushed branch or commit instead of the default branch, see GitHubSecretScanner.fetch_target
+# coalesced=True is set for jobs enqueued through enqueue.py; other jobs with the same
+# coalesce key may be attached to them and get a copy of their findings. When such a job
+# fails its last retry, the jobs attached to it are marked FAILED.
 # -------------------------------------------------------------------------
 
 @celery_app.task(bind=True, max_retries=3, default_retry_delay=30, queue='fast')
-def run_scan_job_pro(self, job_id, repo_url, is_deep_scan, extensions, repoKey):
+def run_scan_job_pro(self, job_id, repo_url, is_deep_scan, extensions, repoKey, incremental_scope=None, coalesced=False,
+                     history=False, ref=None, sha=None):
     """Pro tier: runs on fast queue (concurrency=4)."""
     try:
-        scanner = GitHubSecretScanner(repo_url, job_id, is_deep_scan, extensions, repoKey)
+        shared = claimScanJob(job_id) if coalesced else []
+        scanner = GitHubSecretScanner(repo_url, job_id, is_deep_scan, extensions, repoKey, workers=FAST_QUEUE_SCAN_WORKERS,
+                                      incremental_scope=incremental_scope, budget=FAST_QUEUE_BUDGET, history=history,
+                                      ref=ref, sha=sha)
         start = time.time()
         scanner.run()
         end = time.time()
 
         insertDurationInScanJobs(math.floor(end - start), job_id)
-        setParsingScanJobsToParsed([str(job_id)])
+        shareScanJobResults(job_id, shared)
+        setParsingScanJobsToParsed([str(job_id)] + shared)
     except Exception as exc:
+        if coalesced and self.request.retries >= self.max_retries:
+            # the last attempt failed, the attached jobs would stay PENDING forever
+            failAttachedScanJobs(job_id)
         raise self.retry(exc=exc)
 
 
 @celery_app.task(bind=True, max_retries=3, default_retry_delay=30, queue='slow')
-def run_scan_job_free(self, job_id, repo_url, is_deep_scan, extensions, repoKey):
+def run_scan_job_free(self, job_id, repo_url, is_deep_scan, extensions, repoKey, incremental_scope=None, coalesced=False,
+                      history=False, ref=None, sha=None):
     """Free tier: runs on slow queue (concurrency=1)."""
     try:
-        scanner = GitHubSecretScanner(repo_url, job_id, is_deep_scan, extensions, repoKey)
+        shared = claimScanJob(job_id) if coalesced else []
+        scanner = GitHubSecretScanner(repo_url, job_id, is_deep_scan, extensions, repoKey, workers=SLOW_QUEUE_SCAN_WORKERS,
+                                      incremental_scope=incremental_scope, budget=SLOW_QUEUE_BUDGET, history=history,
+                                      ref=ref, sha=sha)
         start = time.time()
         scanner.run()
         end = time.time()
 
         insertDurationInScanJobs(math.floor(end - start), job_id)
-        setParsingScanJobsToParsed([str(job_id)])
+        shareScanJobResults(job_id, shared)
+        setParsingScanJobsToParsed([str(job_id)] + shared)
     except Exception as exc:
+        if coalesced and self.request.retries >= self.max_retries:
+            # the last attempt failed, the attached jobs would stay PENDING forever
+            failAttachedScanJobs(job_id)
         raise self.retry(exc=exc)
 
 
 # -------------------------------------------------------------------------
 # RECURSIVE SCANS
-# Expected delay call: task.delay(recursive_id, repo_url, repoKey, is_deep_scan, extensions)
+# Expected delay call: task.delay(recursive_id, repo_url, repoKey, is_deep_scan, extensions, incremental_scope=None)
+# incremental_scope turns on incremental scanning, see GitHubSecretScanner.scan_incremental
+# job_id is only set by retries, which continue the scan job of the failed attempt instead of creating one
+# Before cloning, the remote's refs are listed with `git ls-remote`. When they and the scan's
+# options are the same as after the last complete run, the run is skipped: no scan job is
+# created, the last job's findings stay the current ones. The skip is recorded on the schedule
+# (last_unchanged_at, unchanged_runs) and the schedule moves on.
 # -------------------------------------------------------------------------
 
+def remote_refs(repo_url, repoKey, is_deep_scan, extensions):
+    """What a recurring scan would scan right now, or None if the remote cannot be listed."""
+    try:
+        # deep scans cover every branch, the others only the default one
+        refs = ls_remote(authenticated_url(repo_url, repoKey), "refs/heads/*" if is_deep_scan else "HEAD")
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError):
+        return None
+    return {"refs": refs, "is_deep_scan": bool(is_deep_scan), "extensions": sorted(extensions or [])}
+
+
+def unchanged_since_last_run(recursive_id, refs):
+    if refs is None or refs != getRecursiveScanRefs(recursive_id):
+        return False
+    markRecursiveScanUnchanged(recursive_id)
+    updateRecursiveScanAfterRun(recursive_id)
+    metrics.inc("recursive_scans_unchanged_total")
+    return True
+
+
 @celery_app.task(bind=True, max_retries=3, default_retry_delay=30, queue='fast')
-def run_recursive_scan_job_pro(self, recursive_id, repo_url, repoKey, is_deep_scan, extensions):
+def run_recursive_scan_job_pro(self, recursive_id, repo_url, repoKey, is_deep_scan, extensions, incremental_scope=None,
+                               job_id=None):
     """Pro tier recurring scan: runs on fast queue."""
     try:
-        job_id = insertScanJob(repo_url, recursive_scan_id=recursive_id)
-        scanner = GitHubSecretScanner(repo_url, job_id, is_deep_scan, extensions, repoKey)
+        refs = remote_refs(repo_url, repoKey, is_deep_scan, extensions)
+        # a retry finishes the scan job it already created, even if another run covered these refs since
+        if job_id is None and unchanged_since_last_run(recursive_id, refs):
+            print(f"[celery] Pro recurring scan skipped for {repo_url}, nothing pushed since the last run")
+            return
+
+        job_id = job_id or insertScanJob(repo_url, recursive_scan_id=recursive_id)
+        scanner = GitHubSecretScanner(repo_url, job_id, is_deep_scan, extensions, repoKey, workers=FAST_QUEUE_SCAN_WORKERS,
+                                      incremental_scope=incremental_scope, budget=FAST_QUEUE_BUDGET)
 
         start = time.time()
         scanner.run()
@@ -73,19 +189,31 @@ def run_recursive_scan_job_pro(self, recursive_id, repo_url, repoKey, is_deep_sc
 
         insertDurationInScanJobs(math.floor(end - start), job_id)
         setParsingScanJobsToParsed([str(job_id)])
+        # a partial run did not cover these refs, the next run scans them again
+        if refs is not None and not scanner.partial_reason:
+            setRecursiveScanRefs(recursive_id, refs)
         updateRecursiveScanAfterRun(recursive_id)
 
         print(f"[celery] Pro recurring scan complete for {repo_url} (job {job_id})")
     except Exception as exc:
-        raise self.retry(exc=exc)
+        # the retry keeps the scan job, so it resumes from the job's checkpoint
+        raise self.retry(exc=exc, kwargs={**self.request.kwargs, "job_id": job_id})
 
 
 @celery_app.task(bind=True, max_retries=3, default_retry_delay=30, queue='slow')
-def run_recursive_scan_job_free(self, recursive_id, repo_url, repoKey, is_deep_scan, extensions):
+def run_recursive_scan_job_free(self, recursive_id, repo_url, repoKey, is_deep_scan, extensions, incremental_scope=None,
+                                job_id=None):
     """Free tier recurring scan: runs on slow queue."""
     try:
-        job_id = insertScanJob(repo_url, recursive_scan_id=recursive_id)
-        scanner = GitHubSecretScanner(repo_url, job_id, is_deep_scan, extensions, repoKey)
+        refs = remote_refs(repo_url, repoKey, is_deep_scan, extensions)
+        # a retry finishes the scan job it already created, even if another run covered these refs since
+        if job_id is None and unchanged_since_last_run(recursive_id, refs):
+            print(f"[celery] Free recurring scan skipped for {repo_url}, nothing pushed since the last run")
+            return
+
+        job_id = job_id or insertScanJob(repo_url, recursive_scan_id=recursive_id)
+        scanner = GitHubSecretScanner(repo_url, job_id, is_deep_scan, extensions, repoKey, workers=SLOW_QUEUE_SCAN_WORKERS,
+                                      incremental_scope=incremental_scope, budget=SLOW_QUEUE_BUDGET)
 
         start = time.time()
         scanner.run()
@@ -93,8 +221,12 @@ def run_recursive_scan_job_free(self, recursive_id, repo_url, repoKey, is_deep_s
 
         insertDurationInScanJobs(math.floor(end - start), job_id)
         setParsingScanJobsToParsed([str(job_id)])
+        # a partial run did not cover these refs, the next run scans them again
+        if refs is not None and not scanner.partial_reason:
+            setRecursiveScanRefs(recursive_id, refs)
         updateRecursiveScanAfterRun(recursive_id)
 
         print(f"[celery] Free recurring scan complete for {repo_url} (job {job_id})")
     except Exception as exc:
-        raise self.retry(exc=exc)
\ No newline at end of file
+        # the retry keeps the scan job, so it resumes from the job's checkpoint
+        raise self.retry(exc=exc, kwargs={**self.request.kwargs, "job_id": job_id})
\ No newline at end of file
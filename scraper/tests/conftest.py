@@ -2,6 +2,7 @@ import pytest
 import uuid
 import sys
 import os
+import subprocess
 from contextlib import contextmanager
 from unittest.mock import patch, MagicMock
 import psycopg2.extras
@@ -36,9 +37,11 @@ class NonClosingConnection:
     def close(self):
         pass
 
+# The test connection is opened outside the pool; repository functions get it through
+# mock_get_connection and hand it to release_connection, which just calls close() on it.
 @contextmanager
 def get_test_connection():
-    conn = repository.get_connection()
+    conn = repository.open_connection()
     try:
         yield NonClosingConnection(conn)
     finally:
@@ -89,7 +92,12 @@ def db_transaction():
                     is_active BOOLEAN NOT NULL DEFAULT true,
                     last_run_at TIMESTAMPTZ,
                     next_run_at TIMESTAMPTZ NOT NULL,
-                    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+                    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                    lease_until TIMESTAMPTZ,
+                    last_refs JSONB,
+                    last_unchanged_at TIMESTAMPTZ,
+                    unchanged_runs INTEGER NOT NULL DEFAULT 0,
+                    incremental BOOLEAN NOT NULL DEFAULT false
                 );
                 
                 ALTER TABLE recursive_scans ADD COLUMN IF NOT EXISTS repoKey TEXT;
@@ -103,7 +111,11 @@ def db_transaction():
                     priority INTEGER NOT NULL DEFAULT 1 CHECK (priority BETWEEN 1 AND 5),
                     created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(), 
                     duration INTEGER,
-                    recursive_scan_id UUID REFERENCES recursive_scans(id) ON DELETE SET NULL
+                    recursive_scan_id UUID REFERENCES recursive_scans(id) ON DELETE SET NULL,
+                    partial_reason TEXT,
+                    stats JSONB,
+                    coalesce_key TEXT,
+                    shares_job_id UUID REFERENCES scan_jobs(id) ON DELETE SET NULL
                 );
                 
                 ALTER TABLE scan_jobs ADD COLUMN IF NOT EXISTS repoKey TEXT;
@@ -113,7 +125,42 @@ def db_transaction():
                     job_id UUID NOT NULL REFERENCES scan_jobs(id) ON DELETE CASCADE,
                     file_path TEXT NOT NULL, line_number INTEGER NOT NULL,
                     code_snippet TEXT NOT NULL, severity Severity NOT NULL, rule TEXT NOT NULL,
-                    branch TEXT
+                    branch TEXT, commit_sha TEXT,
+                    CONSTRAINT unique_finding_with_branch
+                        UNIQUE (job_id, file_path, line_number, rule, code_snippet, branch)
+                );
+
+                CREATE TABLE IF NOT EXISTS scan_checkpoints (
+                    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+                    job_id UUID NOT NULL REFERENCES scan_jobs(id) ON DELETE CASCADE,
+                    head TEXT NOT NULL,
+                    done TEXT[] NOT NULL,
+                    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+                );
+
+                CREATE TABLE IF NOT EXISTS blob_scan_cache (
+                    blob_sha TEXT NOT NULL,
+                    ruleset TEXT NOT NULL,
+                    findings JSONB NOT NULL DEFAULT '[]',
+                    last_used_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                    PRIMARY KEY (blob_sha, ruleset)
+                );
+
+                CREATE TABLE IF NOT EXISTS incremental_scan_state (
+                    scope TEXT NOT NULL,
+                    repo_url TEXT NOT NULL,
+                    branch TEXT NOT NULL,
+                    head_sha TEXT NOT NULL,
+                    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                    PRIMARY KEY (scope, repo_url, branch)
+                );
+
+                CREATE TABLE IF NOT EXISTS history_scan_state (
+                    scope TEXT NOT NULL,
+                    repo_url TEXT NOT NULL,
+                    commits TEXT[] NOT NULL,
+                    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                    PRIMARY KEY (scope, repo_url)
                 );
             """)
         yield test_conn.real_conn
@@ -145,4 +192,50 @@ def insert_helpers(db_transaction):
             )
             return cur.fetchone()[0]
     
-    return _insert_user, _insert_scan_job
\ No newline at end of file
+    return _insert_user, _insert_scan_job
+
+
+# ---- local git repositories ----
+
+def run_git(cwd, *args):
+    return subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+        cwd=cwd, check=True, capture_output=True, text=True,
+    ).stdout.strip()
+
+class LocalGitRepo:
+    """A throwaway repository on disk that tests can commit to and clone from."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        os.makedirs(self.path, exist_ok=True)
+        run_git(self.path, "init", "-q", "-b", "main")
+        # let clones use partial clone filters and fetch single commits/blobs, like GitHub does
+        run_git(self.path, "config", "uploadpack.allowFilter", "true")
+        run_git(self.path, "config", "uploadpack.allowAnySHA1InWant", "true")
+
+    @property
+    def url(self):
+        return f"file://{self.path}"
+
+    def commit(self, files=None, branch="main", message="commit", delete=()):
+        """Write files ({path: content}) on branch, creating it from main if needed, and return the commit sha."""
+        branches = run_git(self.path, "branch", "--format=%(refname:short)").splitlines()
+        if branches and branch not in branches:
+            run_git(self.path, "checkout", "-q", "-b", branch, "main")
+        elif branches:
+            run_git(self.path, "checkout", "-q", branch)
+        for name, content in (files or {}).items():
+            full = os.path.join(self.path, name)
+            os.makedirs(os.path.dirname(full), exist_ok=True)
+            with open(full, "w") as f:
+                f.write(content)
+            run_git(self.path, "add", name)
+        for name in delete:
+            run_git(self.path, "rm", "-q", name)
+        run_git(self.path, "commit", "-q", "--allow-empty", "-m", message)
+        return run_git(self.path, "rev-parse", "HEAD")
+
+@pytest.fixture
+def local_git_repo(tmp_path):
+    return LocalGitRepo(tmp_path / "origin")
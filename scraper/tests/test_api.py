@@ -15,6 +15,16 @@ def test_health_check(client):
     assert response.status_code == 200
     assert response.json['status'] == 'ok'
 
+def test_metrics_endpoint(client):
+    with patch('metrics.queue_depths', return_value={"fast": 3, "slow": 0}):
+        response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    body = response.get_data(as_text=True)
+    assert '# TYPE reporacoon_task_duration_seconds histogram' in body
+    assert 'reporacoon_queue_depth{queue="fast"} 3' in body
+    assert 'reporacoon_db_pool_connections{process="api",state="in_use"} 0' in body
+
 def test_validate_endpoint(client):
     response = client.post('/validate', json={
         "url": "https://github.com/62595-fullstack-gruppe-placeholder/testrepo"
@@ -60,11 +70,43 @@ def test_scan_endpoint(client):
         })
         assert response.status_code == 202
         assert response.json['success'] is True
-        mock_free.delay.assert_called_once_with(FAKE_JOB_ID, REPO_URL, False, [], None)
+        mock_free.delay.assert_called_once_with(FAKE_JOB_ID, REPO_URL, False, [], None, incremental_scope=None, history=False,
+                                                ref=None, sha=None)
 
     response = client.post('/scan', json={"url": REPO_URL})
     assert response.status_code == 400
 
+def test_scan_endpoint_incremental_scope(client):
+    with patch('api.getUserTier', return_value='free'), \
+         patch('api.run_scan_job_free') as mock_free:
+
+        mock_free.delay = MagicMock()
+
+        response = client.post('/scan', json={
+            "id": FAKE_JOB_ID,
+            "url": REPO_URL,
+            "userId": "user-1",
+            "incremental": True,
+        })
+        assert response.status_code == 202
+        mock_free.delay.assert_called_once_with(FAKE_JOB_ID, REPO_URL, False, [], None, incremental_scope="user:user-1", history=False,
+                                                ref=None, sha=None)
+
+def test_scan_endpoint_passes_ref_and_sha(client):
+    sha = "a" * 40
+    with patch('api.getUserTier', return_value='free'), \
+         patch('api.run_scan_job_free') as mock_free:
+
+        response = client.post('/scan', json={"id": FAKE_JOB_ID, "url": REPO_URL, "ref": "refs/heads/feature/x", "sha": sha})
+        assert response.status_code == 202
+        mock_free.delay.assert_called_once_with(FAKE_JOB_ID, REPO_URL, False, [], None, incremental_scope=None, history=False,
+                                                ref="refs/heads/feature/x", sha=sha)
+
+        for target in ({"ref": "--upload-pack=evil"}, {"ref": "a..b"}, {"ref": "refs/tags/v1:x"}, {"sha": "HEAD"}):
+            response = client.post('/scan', json={"id": FAKE_JOB_ID, "url": REPO_URL, **target})
+            assert response.status_code == 400
+        mock_free.delay.assert_called_once()
+
 def test_scan_routes_free_user_to_slow_queue(client):
     with patch('api.getUserTier', return_value='free'), \
          patch('api.run_scan_job_free') as mock_free, \
@@ -141,6 +183,24 @@ def test_downgrade_user_not_found(client):
     assert response.status_code == 404
 
 
+def test_scan_batch_endpoint(client):
+    jobs = [{"id": FAKE_JOB_ID, "url": REPO_URL}, {"id": "job-2", "url": REPO_URL}]
+    with patch('api.enqueue_scans', return_value=([FAKE_JOB_ID], {"job-2": FAKE_JOB_ID})) as mock_enqueue:
+        response = client.post('/scan/batch', json={"jobs": jobs})
+
+    assert response.status_code == 202
+    assert response.json['queued'] == [FAKE_JOB_ID]
+    assert response.json['coalesced'] == {"job-2": FAKE_JOB_ID}
+    mock_enqueue.assert_called_once_with(jobs)
+
+def test_scan_batch_endpoint_rejects_bad_batches(client):
+    assert client.post('/scan/batch', json={"jobs": []}).status_code == 400
+    assert client.post('/scan/batch', json={"jobs": [{"url": REPO_URL}]}).status_code == 400
+    with patch('api.MAX_BATCH_SIZE', 1):
+        response = client.post('/scan/batch', json={"jobs": [{"id": "a", "url": REPO_URL}] * 2})
+    assert response.status_code == 400
+
+
 # =========================================
 #        Recursive scan endpoint tests
 # =========================================
@@ -161,7 +221,23 @@ def test_create_recursive_scan_success(client):
         
     assert response.status_code == 202
     assert response.json['success'] is True
-    mock_free.delay.assert_called_once_with(FAKE_SCAN_ID, REPO_URL, None, False, [])
+    mock_free.delay.assert_called_once_with(FAKE_SCAN_ID, REPO_URL, None, False, [], incremental_scope=None)
+
+def test_create_recursive_scan_incremental_scope(client):
+    with patch('api.validate_github_url', return_value=(True, 'OK', None)), \
+         patch('api.run_recursive_scan_job_free') as mock_free:
+
+        mock_free.delay = MagicMock()
+
+        response = client.post('/recursive-scan', json={
+            "id": FAKE_SCAN_ID,
+            "url": REPO_URL,
+            "incremental": True,
+        })
+
+    assert response.status_code == 202
+    mock_free.delay.assert_called_once_with(FAKE_SCAN_ID, REPO_URL, None, False, [],
+                                            incremental_scope=f"recursive:{FAKE_SCAN_ID}")
 
 def test_create_recursive_scan_missing_fields(client):
     response = client.post('/recursive-scan', json={"url": REPO_URL})
@@ -170,6 +246,17 @@ def test_create_recursive_scan_missing_fields(client):
     response = client.post('/recursive-scan', json={"id": FAKE_SCAN_ID})
     assert response.status_code == 400
 
+def test_create_recursive_scan_batch(client):
+    scans = [{"id": FAKE_SCAN_ID, "url": REPO_URL}]
+    with patch('api.enqueue_recursive_scans', return_value=[FAKE_SCAN_ID]) as mock_enqueue:
+        response = client.post('/recursive-scan/batch', json={"scans": scans})
+    assert response.status_code == 202
+    assert response.json['ids'] == [FAKE_SCAN_ID]
+    mock_enqueue.assert_called_once_with(scans)
+
+    response = client.post('/recursive-scan/batch', json={"scans": [{"id": FAKE_SCAN_ID, "url": "not-a-github-url.com"}]})
+    assert response.status_code == 400
+
 def test_create_recursive_scan_invalid_url(client):
     response = client.post('/recursive-scan', json={
         "id": FAKE_SCAN_ID,
@@ -0,0 +1,47 @@
+import sys
+import os
+import subprocess
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark import build_corpus, run_case, compare
+from stats import PHASES
+
+# =========================================
+#             Benchmark tests
+# =========================================
+
+def _head(repo):
+    return subprocess.run(["git", "rev-parse", "HEAD"], cwd=repo, check=True, capture_output=True, text=True).stdout
+
+# Test that the same seed gives the same repository, down to the commit sha
+def test_build_corpus_is_deterministic(tmp_path):
+    first = build_corpus("dense_secrets", str(tmp_path / "a"), seed=7)
+    second = build_corpus("dense_secrets", str(tmp_path / "b"), seed=7)
+    other = build_corpus("dense_secrets", str(tmp_path / "c"), seed=8)
+    assert _head(first) == _head(second)
+    assert _head(first) != _head(other)
+
+# Test that a case scans the corpus without a database and reports every phase
+def test_run_case_reports_throughput_and_phases(tmp_path):
+    repo = build_corpus("dense_secrets", str(tmp_path), seed=0)
+    result = run_case("dense_secrets", f"file://{repo}")
+
+    assert result["files_scanned"] == 50
+    assert result["findings"] > 0
+    assert result["bytes_scanned"] > 0
+    assert result["files_per_second"] > 0
+    assert set(result["phases"]) == set(PHASES)
+    assert result["peak_rss_kb"] > 0
+
+# Test that a files/s drop beyond the allowed margin is reported as a regression
+def test_compare_flags_regressions():
+    baseline = {"cases": {"source": {"files_per_second": 1000.0, "findings": 10}}}
+    slower = {"cases": {"source": {"files_per_second": 850.0, "findings": 10}}}
+    noise = {"cases": {"source": {"files_per_second": 950.0, "findings": 12}}}
+
+    lines, regressed = compare(baseline, slower, max_regression=0.10)
+    assert regressed and "REGRESSION" in lines[0]
+
+    lines, regressed = compare(baseline, noise, max_regression=0.10)
+    assert not regressed and "findings 10 -> 12" in lines[0]
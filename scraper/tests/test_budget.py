@@ -0,0 +1,58 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from budget import ScanBudget, BudgetExceeded
+
+# =========================================
+#             Scan budget tests
+# =========================================
+
+def test_unlimited_budget_never_runs_out():
+    budget = ScanBudget()
+    for _ in range(1000):
+        budget.charge(1 << 20)
+    assert not budget.exhausted()
+    assert budget.allows_file_size(1 << 40)
+
+def test_file_limit():
+    budget = ScanBudget(max_files=2)
+    budget.charge(10)
+    budget.charge(10)
+    assert budget.exhausted()
+    with pytest.raises(BudgetExceeded) as exc:
+        budget.charge(10)
+    assert "file limit" in exc.value.reason
+
+def test_byte_limit_rejects_file_that_does_not_fit():
+    budget = ScanBudget(max_bytes=100)
+    budget.charge(60)
+    with pytest.raises(BudgetExceeded):
+        budget.charge(50)
+    # the rejected file is not counted
+    assert (budget.files, budget.bytes) == (1, 60)
+
+def test_deadline(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('budget.time.monotonic', lambda: now[0])
+    budget = ScanBudget(deadline_seconds=10)
+    budget.charge(1)
+    now[0] += 11
+    with pytest.raises(BudgetExceeded) as exc:
+        budget.check()
+    assert "deadline" in exc.value.reason
+
+def test_from_env_and_copy(monkeypatch):
+    monkeypatch.setenv("SLOW_QUEUE_SCAN_MAX_FILES", "5")
+    monkeypatch.setenv("SLOW_QUEUE_SCAN_MAX_FILE_SIZE", "0")
+    budget = ScanBudget.from_env("SLOW_QUEUE")
+    assert budget.max_files == 5
+    assert budget.max_file_size is None
+    assert budget.deadline_seconds is None
+
+    budget.charge(1)
+    fresh = budget.copy()
+    assert fresh.max_files == 5
+    assert fresh.files == 0
@@ -0,0 +1,32 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from classify import skip_reason_for_path, skip_reason_for_sample
+
+# =========================================
+#             Classifier tests
+# =========================================
+
+def test_skip_reason_for_path():
+    assert skip_reason_for_path("src/app.js") is None
+    assert skip_reason_for_path("node_modules/left-pad/index.js") == "vendored_directory"
+    assert skip_reason_for_path("web/node_modules/x/y.js") == "vendored_directory"
+    assert skip_reason_for_path("package-lock.json") == "lockfile"
+    assert skip_reason_for_path("static/app.min.js") == "minified"
+    # only directories are pruned, a file that happens to be called vendor is scanned
+    assert skip_reason_for_path("docs/vendor") is None
+
+def test_skip_reason_for_sample():
+    assert skip_reason_for_sample("") is None
+    assert skip_reason_for_sample("api_key = 'abc'\nprint('hi')\n") is None
+    assert skip_reason_for_sample("PNG\x00\x01\x02 header") == "binary"
+    assert skip_reason_for_sample("\x01\x02\x03\x04 abc") == "binary"
+    assert skip_reason_for_sample("var a=1;" * 1000) == "minified"
+    assert skip_reason_for_sample("// Code generated by protoc-gen-go. DO NOT EDIT.\npackage pb\n") == "generated"
+
+def test_long_line_in_small_file_is_not_minified():
+    # a service-account style json keeps its private key on one long line
+    sample = '{\n  "type": "service_account",\n  "private_key": "' + "A" * 1700 + '"\n}\n'
+    assert skip_reason_for_sample(sample) is None
@@ -0,0 +1,91 @@
+import sys
+import os
+import uuid
+from unittest.mock import patch, call
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import encryption
+from dispatcher import dispatch_once
+from repository import insertRecursiveScan
+
+# =========================================
+#        Recurring scan dispatcher tests
+# =========================================
+
+OWNER_ID = uuid.UUID("00000000-0000-0000-0000-00000000000a")
+REPO_URL = "https://github.com/owner/repo"
+
+@pytest.fixture(autouse=True)
+def encryption_secret(monkeypatch):
+    monkeypatch.setenv("ENCRYPTION_SECRET", "test-secret")
+
+def row(repoKey=None, owner_id=OWNER_ID, incremental=False):
+    return {"id": uuid.uuid4(), "repo_url": REPO_URL, "repoKey": repoKey, "interval": "HOURLY",
+            "is_deep_scan": False, "extensions": ["py"], "owner_id": owner_id, "incremental": incremental}
+
+def test_encryption_roundtrip():
+    ciphertext = encryption.encrypt("ghp_token")
+    assert ciphertext != encryption.encrypt("ghp_token")
+    assert encryption.decrypt(ciphertext) == "ghp_token"
+
+def test_decrypts_tokens_of_the_web_app():
+    # produced by encrypt() in web/src/lib/encryption.ts with ENCRYPTION_SECRET=test-secret
+    ciphertext = "clwaFGUw2W9/xoPvqNuECFB8tVPRC50jytU9yqKCcSceLAnLUXwCeRV+WLlHaEmLksNd/Ts="
+    assert encryption.decrypt(ciphertext) == "ghp_token"
+
+def test_dispatch_enqueues_claimed_rows():
+    claimed = [row(repoKey=encryption.encrypt("ghp_token"), incremental=True), row(owner_id=None)]
+    with patch('dispatcher.claimDueRecursiveScans', side_effect=[claimed]) as mock_claim, \
+         patch('dispatcher.enqueue_recursive_scans') as mock_enqueue:
+
+        assert dispatch_once(batch_size=10, lease_seconds=60) == 2
+
+    mock_claim.assert_called_once_with(10, 60)
+    scans = mock_enqueue.call_args[0][0]
+    assert scans[0] == {"id": str(claimed[0]["id"]), "url": REPO_URL, "repoKey": "ghp_token", "isDeepScan": False,
+                        "extensions": ["py"], "owner_id": str(OWNER_ID), "incremental": True}
+    assert scans[1]["repoKey"] is None and scans[1]["owner_id"] is None
+    # schedules scan the whole repository unless they were created as incremental
+    assert scans[1]["incremental"] is False
+
+def test_dispatch_claims_batches_until_nothing_is_due():
+    with patch('dispatcher.claimDueRecursiveScans', side_effect=[[row(), row()], [row()]]) as mock_claim, \
+         patch('dispatcher.enqueue_recursive_scans') as mock_enqueue:
+
+        assert dispatch_once(batch_size=2, lease_seconds=60) == 3
+
+    assert mock_claim.call_count == 2
+    assert [len(c.args[0]) for c in mock_enqueue.call_args_list] == [2, 1]
+
+def test_dispatch_skips_tokens_it_cannot_decrypt():
+    with patch('dispatcher.claimDueRecursiveScans', side_effect=[[row(repoKey="not-encrypted"), row()]]), \
+         patch('dispatcher.enqueue_recursive_scans') as mock_enqueue:
+
+        assert dispatch_once(batch_size=10, lease_seconds=60) == 1
+    assert len(mock_enqueue.call_args[0][0]) == 1
+
+def test_dispatch_releases_leases_when_enqueue_fails():
+    claimed = [row()]
+    with patch('dispatcher.claimDueRecursiveScans', side_effect=[claimed]), \
+         patch('dispatcher.enqueue_recursive_scans', side_effect=ConnectionError("broker down")), \
+         patch('dispatcher.releaseRecursiveScanLeases') as mock_release:
+
+        with pytest.raises(ConnectionError):
+            dispatch_once(batch_size=10, lease_seconds=60)
+    mock_release.assert_called_once_with([str(claimed[0]["id"])])
+
+@pytest.mark.parametrize("incremental", [True, False])
+def test_dispatch_sends_the_stored_incremental_flag(mock_get_connection, db_transaction, incremental):
+    # same columns the web app writes in createRecursiveScan
+    scan_id, _ = insertRecursiveScan(REPO_URL, None, "HOURLY", extensions=["py"], incremental=incremental)
+    with db_transaction.cursor() as cur:
+        cur.execute("UPDATE recursive_scans SET next_run_at = NOW() - INTERVAL '1 second' WHERE id = %s", (scan_id,))
+
+    with patch('dispatcher.enqueue_recursive_scans') as mock_enqueue:
+        dispatch_once(batch_size=10, lease_seconds=60)
+
+    scans = [s for c in mock_enqueue.call_args_list for s in c.args[0] if s["id"] == str(scan_id)]
+    assert len(scans) == 1
+    assert scans[0]["incremental"] is incremental
@@ -0,0 +1,91 @@
+import sys
+import os
+from unittest.mock import patch, MagicMock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import enqueue
+from enqueue import coalesce_key, enqueue_scans, enqueue_recursive_scans, resolve_tiers, forget_tier
+
+# =========================================
+#             Bulk enqueue tests
+# =========================================
+
+PRO_USER = "00000000-0000-0000-0000-00000000000a"
+FREE_USER = "00000000-0000-0000-0000-00000000000b"
+REPO_URL = "https://github.com/someuser/somerepo"
+
+@pytest.fixture(autouse=True)
+def empty_tier_cache():
+    enqueue._tiers.clear()
+    yield
+    enqueue._tiers.clear()
+
+@pytest.fixture
+def producer():
+    with patch.object(enqueue.celery_app, 'producer_or_acquire') as acquire:
+        yield acquire.return_value.__enter__.return_value
+
+def test_tiers_are_resolved_in_one_query_and_cached():
+    with patch('enqueue.getUserTiers', return_value={PRO_USER: "pro"}) as mock_tiers:
+        assert resolve_tiers([PRO_USER, FREE_USER, PRO_USER]) == {PRO_USER: "pro", FREE_USER: "free"}
+        assert resolve_tiers([PRO_USER]) == {PRO_USER: "pro"}
+    mock_tiers.assert_called_once_with({PRO_USER, FREE_USER})
+
+def test_forgotten_tier_is_looked_up_again():
+    with patch('enqueue.getUserTiers', return_value={PRO_USER: "free"}) as mock_tiers:
+        resolve_tiers([PRO_USER])
+        forget_tier(PRO_USER)
+        resolve_tiers([PRO_USER])
+    assert mock_tiers.call_count == 2
+
+def test_coalesce_key():
+    base = coalesce_key(REPO_URL, False, ["py", "js"], None, None)
+    assert coalesce_key(REPO_URL.upper() + ".git/", False, ["js", "py"], None, None) == base
+    assert coalesce_key(REPO_URL, True, ["py", "js"], None, None) != base
+    assert coalesce_key(REPO_URL, False, ["py", "js"], "token", None) != base
+    assert coalesce_key(REPO_URL, False, ["py", "js"], None, "user:1") != base
+    assert coalesce_key(REPO_URL, False, ["py", "js"], None, None, history=True) != base
+
+def test_enqueue_scans_publishes_once_per_unattached_job(producer):
+    jobs = [
+        {"id": "job-1", "url": REPO_URL, "userId": PRO_USER, "incremental": True},
+        {"id": "job-2", "url": REPO_URL, "userId": PRO_USER, "incremental": True},
+        {"id": "job-3", "url": REPO_URL, "userId": FREE_USER, "extensions": ["py"]},
+    ]
+    with patch('enqueue.getUserTiers', return_value={PRO_USER: "pro", FREE_USER: "free"}) as mock_tiers, \
+         patch('enqueue.coalescePendingScanJobs', return_value={"job-2": "job-1"}) as mock_coalesce, \
+         patch('enqueue.run_scan_job_pro') as mock_pro, \
+         patch('enqueue.run_scan_job_free') as mock_free:
+
+        queued, coalesced = enqueue_scans(jobs)
+
+    assert queued == ["job-1", "job-3"]
+    assert coalesced == {"job-2": "job-1"}
+    mock_tiers.assert_called_once()
+    keys = [key for _, key in mock_coalesce.call_args[0][0]]
+    assert keys[0] == keys[1] != keys[2]
+
+    mock_pro.apply_async.assert_called_once_with(
+        ("job-1", REPO_URL, False, [], None), {"incremental_scope": f"user:{PRO_USER}", "coalesced": True, "history": False,
+         "ref": None, "sha": None}, producer=producer)
+    mock_free.apply_async.assert_called_once_with(
+        ("job-3", REPO_URL, False, ["py"], None), {"incremental_scope": None, "coalesced": True, "history": False,
+         "ref": None, "sha": None}, producer=producer)
+
+def test_enqueue_recursive_scans(producer):
+    scans = [
+        {"id": "rec-1", "url": REPO_URL, "owner_id": PRO_USER, "incremental": True},
+        {"id": "rec-2", "url": REPO_URL, "repoKey": "token", "isDeepScan": True},
+    ]
+    with patch('enqueue.getUserTiers', return_value={PRO_USER: "pro"}), \
+         patch('enqueue.run_recursive_scan_job_pro') as mock_pro, \
+         patch('enqueue.run_recursive_scan_job_free') as mock_free:
+
+        assert enqueue_recursive_scans(scans) == ["rec-1", "rec-2"]
+
+    mock_pro.apply_async.assert_called_once_with(
+        ("rec-1", REPO_URL, None, False, []), {"incremental_scope": "recursive:rec-1"}, producer=producer)
+    mock_free.apply_async.assert_called_once_with(
+        ("rec-2", REPO_URL, "token", True, []), {"incremental_scope": None}, producer=producer)
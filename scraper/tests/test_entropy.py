@@ -0,0 +1,48 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import random
+import string
+import entropy
+from entropy import BASE64_CHARSET, entropy_severity, entropy_severities, relative_entropy
+
+# =========================================
+#             Entropy tests
+# =========================================
+
+def random_tokens(count, seed=7):
+    rng = random.Random(seed)
+    alphabets = [
+        string.hexdigits,
+        string.ascii_letters + string.digits + "+/=",
+        string.ascii_letters + string.digits + "-_",
+        "abcdef0123",
+        string.ascii_letters + "é€",
+    ]
+    return ["".join(rng.choice(alphabet) for _ in range(rng.randint(18, 90)))
+            for alphabet in (rng.choice(alphabets) for _ in range(count))]
+
+def test_vectorized_severities_match_scalar():
+    tokens = random_tokens(3000)
+    expected = [entropy_severity(token) for token in tokens]
+    # the sample has to contain both verdicts to mean anything
+    assert "HIGH" in expected and None in expected
+    assert entropy_severities(tokens) == expected
+
+def test_vectorized_severities_across_batches(monkeypatch):
+    monkeypatch.setattr(entropy, "VECTORIZE_BATCH_SIZE", 64)
+    tokens = random_tokens(500, seed=11)
+    assert entropy_severities(tokens) == [entropy_severity(token) for token in tokens]
+
+def test_token_exactly_at_threshold(monkeypatch):
+    token = "Zm9vYmFyYmF6cXV4cXV1eGNvcmdlZ3JhdWx0"
+    tokens = [token] + random_tokens(100)
+    # move the threshold onto the token's own entropy: the exact check says >=, so it is reported
+    monkeypatch.setitem(entropy.ENTROPY_THRESHOLDS, "base64", relative_entropy(token, BASE64_CHARSET))
+    monkeypatch.setitem(entropy.ENTROPY_THRESHOLDS, "hex", 2.0)
+
+    severities = entropy_severities(tokens)
+    assert severities[0] == "HIGH"
+    assert severities == [entropy_severity(t) for t in tokens]
@@ -0,0 +1,34 @@
+import sys
+import os
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from findings import FindingSink
+
+FAKE_JOB_ID = "job-0000-0000-0000-000000000001"
+
+def test_sink_buffers_until_batch_size():
+    with patch('findings.insertScanFindingsBatch') as mock_batch:
+        sink = FindingSink(FAKE_JOB_ID, batch_size=3)
+        sink.add("a.py", 1, "x", "HIGH", "rule")
+        sink.add("a.py", 2, "y", "HIGH", "rule")
+        mock_batch.assert_not_called()
+
+        sink.add("b.py", 3, "z", "LOW", "rule", "dev")
+        mock_batch.assert_called_once()
+        rows = mock_batch.call_args.args[0]
+        assert rows[0] == (FAKE_JOB_ID, "a.py", 1, "x", "HIGH", "rule", "main", None)
+        assert rows[2] == (FAKE_JOB_ID, "b.py", 3, "z", "LOW", "rule", "dev", None)
+        assert sink.pending == []
+        assert sink.written == 3
+
+def test_sink_flush_writes_remainder_once():
+    with patch('findings.insertScanFindingsBatch') as mock_batch:
+        sink = FindingSink(FAKE_JOB_ID, batch_size=100)
+        sink.add("a.py", 1, "x", "HIGH", "rule")
+
+        assert sink.flush() == 1
+        assert sink.flush() == 0
+        mock_batch.assert_called_once()
+        assert sink.written == 1
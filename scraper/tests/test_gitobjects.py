@@ -0,0 +1,73 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conftest import run_git
+from gitobjects import GitObjectReader, list_remote_branches, list_tree, object_store_size, remote_heads, iter_history
+
+def test_list_tree_and_read_blobs(local_git_repo, tmp_path):
+    local_git_repo.commit({"a.py": "print('a')\n", "dir/b.txt": "bee\n"})
+    os.symlink("a.py", os.path.join(local_git_repo.path, "link.py"))
+    run_git(local_git_repo.path, "add", "link.py")
+    local_git_repo.commit(message="add symlink")
+
+    entries = dict((path, sha) for sha, path in list_tree(local_git_repo.path, "HEAD"))
+    # symlinks are not regular files and are skipped
+    assert set(entries) == {"a.py", "dir/b.txt"}
+
+    with GitObjectReader(local_git_repo.path) as reader:
+        assert reader.read(entries["a.py"]) == b"print('a')\n"
+        assert reader.read(entries["dir/b.txt"]) == b"bee\n"
+        assert reader.read("0" * 40) is None
+        # the same process keeps serving requests after a missing object
+        assert reader.read(entries["a.py"]) == b"print('a')\n"
+
+def test_iter_text_can_be_abandoned(local_git_repo):
+    sha = local_git_repo.commit({"big.txt": "0123456789\n" * 100})
+    entries = dict((path, sha) for sha, path in list_tree(local_git_repo.path, "HEAD"))
+
+    with GitObjectReader(local_git_repo.path) as reader:
+        size = reader.read_header(entries["big.txt"])
+        assert "".join(reader.iter_text(size, block_size=64)) == "0123456789\n" * 100
+
+        # stop after the first block, the rest is skipped when the generator is closed
+        blocks = reader.iter_text(reader.read_header(entries["big.txt"]), block_size=64)
+        assert next(blocks) == "0123456789\n" * 5 + "0123456789"[:9]
+        blocks.close()
+        assert reader.read(entries["big.txt"]) == b"0123456789\n" * 100
+
+def test_list_remote_branches(local_git_repo, tmp_path):
+    local_git_repo.commit({"a.py": "a\n"})
+    local_git_repo.commit({"b.py": "b\n"}, branch="feature/x")
+
+    clone = str(tmp_path / "clone")
+    run_git(str(tmp_path), "clone", "-q", local_git_repo.url, clone)
+
+    assert sorted(list_remote_branches(clone)) == ["feature/x", "main"]
+
+def test_object_store_size(local_git_repo, tmp_path):
+    local_git_repo.commit({"a.py": "a\n" * 1000})
+    assert object_store_size(local_git_repo.path) > 0
+    # not a repository
+    assert object_store_size(str(tmp_path)) == 0
+
+def test_iter_history_lists_commits_oldest_first(local_git_repo, tmp_path):
+    first = local_git_repo.commit({"a.py": "a\n", "b.py": "b\n"})
+    second = local_git_repo.commit({"a.py": "a2\n"}, delete=["b.py"])
+    feature = local_git_repo.commit({"c.py": "c\n"}, branch="feature/x")
+
+    clone = str(tmp_path / "clone")
+    run_git(str(tmp_path), "clone", "-q", "--no-checkout", local_git_repo.url, clone)
+    assert remote_heads(clone) == {"main": second, "feature/x": feature}
+
+    history = [(commit, branch, sorted(path for _, path in entries)) for commit, branch, entries in iter_history(clone)]
+    # deleted files are not listed, the commits that added them are
+    assert history[0] == (first, "main", ["a.py", "b.py"])
+    assert (second, "main", ["a.py"]) in history
+    assert history[-1][0] in (second, feature)
+    assert (feature, "feature/x", ["c.py"]) in history
+    assert len(history) == 3
+
+    # commits reachable from exclude are left out
+    assert [commit for commit, _, _ in iter_history(clone, exclude=[second])] == [feature]
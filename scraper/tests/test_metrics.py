@@ -0,0 +1,44 @@
+import sys
+import os
+from unittest.mock import patch, MagicMock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics
+
+# =========================================
+#             Metrics tests
+# =========================================
+
+def test_disabled_without_redis_url():
+    with patch('metrics.METRICS_REDIS_URL', ''):
+        # nothing to talk to, none of these may raise
+        metrics.inc("task_retries_total", task="t")
+        metrics.observe("task_duration_seconds", 3.0, task="t")
+        assert metrics.pop_enqueued("some-task") is None
+        body = metrics.render({"queue_depth": [({"queue": "slow"}, 2)]})
+    assert '# HELP reporacoon_rule_hits_total' in body
+    assert 'reporacoon_queue_depth{queue="slow"} 2' in body
+
+def test_observe_counts_value_in_smallest_fitting_bucket():
+    client = MagicMock()
+    with patch('metrics._redis', return_value=client):
+        metrics.observe("task_duration_seconds", 42.0, queue="fast")
+    pipe = client.pipeline.return_value
+    pipe.hincrby.assert_called_once_with("metrics:histogram:task_duration_seconds", 'queue="fast"|60', 1)
+    pipe.hincrbyfloat.assert_called_once_with("metrics:histogram:task_duration_seconds", 'queue="fast"|sum', 42.0)
+
+def test_histogram_buckets_are_rendered_cumulative():
+    fields = {'queue="fast"|1': b"2", 'queue="fast"|5': b"1", 'queue="fast"|+Inf': b"1", 'queue="fast"|sum': b"4000.5"}
+    lines = metrics._render_histogram("h", fields, (1, 5, 15))
+    assert lines == [
+        'h_bucket{queue="fast",le="1"} 2',
+        'h_bucket{queue="fast",le="5"} 3',
+        'h_bucket{queue="fast",le="15"} 3',
+        'h_bucket{queue="fast",le="+Inf"} 4',
+        'h_sum{queue="fast"} 4000.5',
+        'h_count{queue="fast"} 4',
+    ]
+
+def test_label_values_are_escaped():
+    assert metrics._labels({"rule": 'a "quoted"\\rule'}) == 'rule="a \\"quoted\\"\\\\rule"'
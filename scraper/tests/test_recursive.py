@@ -15,6 +15,11 @@ from repository import (
     toggleRecursiveScan,
     deleteRecursiveScan,
     insertScanJob,
+    claimDueRecursiveScans,
+    releaseRecursiveScanLeases,
+    getRecursiveScanRefs,
+    setRecursiveScanRefs,
+    markRecursiveScanUnchanged,
 )
 
 @pytest.fixture
@@ -103,6 +108,83 @@ def test_update_recursive_scan_after_run(mock_get_connection, insert_recursive_s
     assert last_run_at <= after + timedelta(seconds=1)
     assert next_run_at > last_run_at
 
+def test_update_recursive_scan_after_run_adds_jitter(mock_get_connection, insert_recursive_scan):
+    scan_id = insert_recursive_scan(interval="DAILY")
+
+    updateRecursiveScanAfterRun(scan_id, jitter=0.5, max_jitter_seconds=86400)
+
+    with repository.get_connection().cursor() as cur:
+        cur.execute("SELECT next_run_at - last_run_at FROM recursive_scans WHERE id = %s", (scan_id,))
+        step = cur.fetchone()[0]
+    assert timedelta(days=1) <= step <= timedelta(days=1.5)
+
+def test_update_recursive_scan_after_run_caps_jitter(mock_get_connection, insert_recursive_scan):
+    scan_id = insert_recursive_scan(interval="YEARLY")
+
+    updateRecursiveScanAfterRun(scan_id, jitter=0.1, max_jitter_seconds=300)
+
+    # a tenth of a year would be over a month, the cap keeps it to minutes
+    with repository.get_connection().cursor() as cur:
+        cur.execute("SELECT next_run_at - (last_run_at + INTERVAL '1 year') FROM recursive_scans WHERE id = %s",
+                    (scan_id,))
+        jitter = cur.fetchone()[0]
+    assert timedelta(0) <= jitter <= timedelta(minutes=5)
+
+def test_claim_due_recursive_scans_leases_them(mock_get_connection, insert_recursive_scan):
+    past = datetime.now(timezone.utc) - timedelta(seconds=1)
+    due_id = insert_recursive_scan(next_run_at=past)
+    _paused = insert_recursive_scan(next_run_at=past, is_active=False)
+    _not_due = insert_recursive_scan()
+
+    claimed = claimDueRecursiveScans(10, 600)
+    assert [str(s["id"]) for s in claimed] == [due_id]
+    assert claimed[0]["repo_url"] == "https://github.com/owner/repo"
+    assert claimed[0]["incremental"] is False
+
+    # leased until the run finishes
+    assert claimDueRecursiveScans(10, 600) == []
+    updateRecursiveScanAfterRun(due_id)
+    with repository.get_connection().cursor() as cur:
+        cur.execute("SELECT lease_until FROM recursive_scans WHERE id = %s", (due_id,))
+        assert cur.fetchone()[0] is None
+
+def test_claim_due_recursive_scans_respects_limit_and_release(mock_get_connection, insert_recursive_scan):
+    past = datetime.now(timezone.utc) - timedelta(minutes=5)
+    older = insert_recursive_scan(next_run_at=past - timedelta(minutes=1))
+    newer = insert_recursive_scan(next_run_at=past)
+
+    assert [str(s["id"]) for s in claimDueRecursiveScans(1, 600)] == [older]
+    releaseRecursiveScanLeases([older])
+    assert {str(s["id"]) for s in claimDueRecursiveScans(10, 600)} == {older, newer}
+
+def test_expired_lease_is_claimed_again(mock_get_connection, insert_recursive_scan):
+    due_id = insert_recursive_scan(next_run_at=datetime.now(timezone.utc) - timedelta(seconds=1))
+    claimDueRecursiveScans(10, 0)
+    assert [str(s["id"]) for s in claimDueRecursiveScans(10, 600)] == [due_id]
+
+def test_recursive_scan_refs_roundtrip(mock_get_connection, insert_recursive_scan):
+    scan_id = insert_recursive_scan()
+    assert getRecursiveScanRefs(scan_id) is None
+
+    refs = {"refs": {"HEAD": "a" * 40}, "is_deep_scan": False, "extensions": [".py"]}
+    setRecursiveScanRefs(scan_id, refs)
+    assert getRecursiveScanRefs(scan_id) == refs
+
+def test_unchanged_runs_are_recorded_until_the_next_complete_run(mock_get_connection, insert_recursive_scan):
+    scan_id = insert_recursive_scan()
+
+    def unchanged():
+        scan = next(s for s in getAllRecursiveScans() if str(s["id"]) == scan_id)
+        return scan["unchanged_runs"], scan["last_unchanged_at"] is not None
+
+    assert unchanged() == (0, False)
+    markRecursiveScanUnchanged(scan_id)
+    markRecursiveScanUnchanged(scan_id)
+    assert unchanged() == (2, True)
+
+    setRecursiveScanRefs(scan_id, {"refs": {}})
+    assert unchanged() == (0, True)
+
 def test_toggle_recursive_scan(mock_get_connection, insert_recursive_scan):
     scan_id = insert_recursive_scan(is_active=True)
 
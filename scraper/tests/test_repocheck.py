@@ -0,0 +1,142 @@
+import sys
+import os
+import time
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+from repocheck import RepoChecker, GITHUB_API_URL
+
+# =========================================
+#           Repository check tests
+# =========================================
+
+REPO_API_URL = f"{GITHUB_API_URL}/repos/owner/repo"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_checker(**kwargs):
+    clock = FakeClock()
+    return RepoChecker(ttl=300, negative_ttl=60, clock=clock, **kwargs), clock
+
+
+def test_existing_repo_is_cached(requests_mock):
+    checker, clock = make_checker()
+    requests_mock.get(REPO_API_URL, status_code=200, headers={"ETag": '"abc"'}, json={})
+
+    assert checker.check("owner", "repo") == (True, "Repository exists", {"url": "https://github.com/owner/repo"})
+    assert checker.check("Owner", "REPO")[0] is True
+    assert requests_mock.call_count == 1
+
+    # a different token may see different repositories
+    checker.check("owner", "repo", "token")
+    assert requests_mock.call_count == 2
+    assert requests_mock.last_request.headers["Authorization"] == "Bearer token"
+
+def test_expired_result_is_revalidated_with_etag(requests_mock):
+    checker, clock = make_checker()
+    requests_mock.get(REPO_API_URL, status_code=200, headers={"ETag": '"abc"'}, json={})
+    checker.check("owner", "repo")
+
+    clock.now += 301
+    requests_mock.get(REPO_API_URL, status_code=304)
+    assert checker.check("owner", "repo")[0] is True
+    assert requests_mock.last_request.headers["If-None-Match"] == '"abc"'
+
+    # the 304 renewed the entry
+    checker.check("owner", "repo")
+    assert requests_mock.call_count == 2
+
+def test_missing_repo_is_cached_shorter(requests_mock):
+    checker, clock = make_checker()
+    requests_mock.get(REPO_API_URL, status_code=404)
+
+    assert checker.check("owner", "repo") == (False, "Repository not found or no access", None)
+    checker.check("owner", "repo")
+    assert requests_mock.call_count == 1
+
+    clock.now += 61
+    checker.check("owner", "repo")
+    assert requests_mock.call_count == 2
+
+def test_auth_errors_are_not_cached(requests_mock):
+    checker, _ = make_checker()
+    requests_mock.get(REPO_API_URL, status_code=401)
+
+    assert checker.check("owner", "repo", "bad")[1] == "Invalid or expired access token"
+    checker.check("owner", "repo", "bad")
+    assert requests_mock.call_count == 2
+
+def test_stale_result_is_served_when_github_fails(requests_mock):
+    checker, clock = make_checker()
+    requests_mock.get(REPO_API_URL, status_code=200, json={})
+    checker.check("owner", "repo")
+
+    clock.now += 301
+    requests_mock.get(REPO_API_URL, exc=requests.exceptions.ConnectTimeout)
+    assert checker.check("owner", "repo")[0] is True
+
+    requests_mock.get(REPO_API_URL, status_code=403, headers={"X-RateLimit-Remaining": "0"})
+    assert checker.check("owner", "repo")[0] is True
+
+    # nothing to fall back on
+    requests_mock.get(f"{GITHUB_API_URL}/repos/owner/other", exc=requests.exceptions.ConnectTimeout)
+    assert checker.check("owner", "other")[1].startswith("Error connecting to GitHub")
+
+def test_timeouts_are_passed_to_the_request(requests_mock):
+    checker, _ = make_checker(timeout=(1, 2))
+    requests_mock.get(REPO_API_URL, status_code=200, json={})
+    checker.check("owner", "repo")
+    assert requests_mock.last_request.timeout == (1, 2)
+
+def test_cache_evicts_least_recently_used(requests_mock):
+    checker, _ = make_checker(max_entries=2)
+    requests_mock.get(f"{GITHUB_API_URL}/repos/owner/a", status_code=200, json={})
+    requests_mock.get(f"{GITHUB_API_URL}/repos/owner/b", status_code=200, json={})
+    requests_mock.get(f"{GITHUB_API_URL}/repos/owner/c", status_code=200, json={})
+
+    checker.check("owner", "a")
+    checker.check("owner", "b")
+    checker.check("owner", "a")
+    checker.check("owner", "c")
+    assert [key[1] for key in checker.cache] == ["a", "c"]
+
+def test_concurrent_checks_share_one_request():
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    class SlowSession:
+        def get(self, url, headers, timeout):
+            calls.append(url)
+            started.set()
+            release.wait(5)
+            response = requests.Response()
+            response.status_code = 200
+            return response
+
+    checker, _ = make_checker(session=SlowSession())
+    results = []
+    leader = threading.Thread(target=lambda: results.append(checker.check("owner", "repo")))
+    leader.start()
+    started.wait(5)
+
+    followers = [threading.Thread(target=lambda: results.append(checker.check("owner", "repo"))) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    # followers block on the leader's request instead of sending their own
+    time.sleep(0.1)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert len(results) == 4
+    assert all(result[0] is True for result in results)
@@ -3,6 +3,8 @@ import os
 import uuid
 import pytest
 import psycopg2
+import psycopg2.pool
+from unittest.mock import patch, MagicMock
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -11,11 +13,18 @@ from repository import (
     get_connection,
     getAllPendingScanJobs,
     setParsingScanJobsToParsed,
+    markScanJobPartial,
+    insertScanJobStats,
     getAllScanFindings,
     insertScanFindings,
     insertDurationInScanJobs,
     getUserTier,
+    getUserTiers,
     setUserTier,
+    coalescePendingScanJobs,
+    claimScanJob,
+    shareScanJobResults,
+    failAttachedScanJobs,
 )
 
 def test_get_connection(mock_get_connection):
@@ -111,6 +120,32 @@ def test_insert_duration_in_scanjobs(mock_get_connection, insert_helpers):
     assert d1 == 123
     assert d2 is None
 
+def test_mark_scan_job_partial(mock_get_connection, insert_helpers):
+    _, insert_scan = insert_helpers
+    id1 = insert_scan("p1")
+    id2 = insert_scan("p2")
+
+    markScanJobPartial(id1, "deadline of 900s reached")
+
+    with repository.get_connection().cursor() as cur:
+        cur.execute("SELECT partial_reason FROM scan_jobs WHERE id = %s", (id1,))
+        r1 = cur.fetchone()[0]
+        cur.execute("SELECT partial_reason FROM scan_jobs WHERE id = %s", (id2,))
+        r2 = cur.fetchone()[0]
+    assert r1 == "deadline of 900s reached"
+    assert r2 is None
+
+def test_insert_scan_job_stats(mock_get_connection, insert_helpers):
+    _, insert_scan = insert_helpers
+    job_id = insert_scan("s1")
+    stats = {"phases": {"clone": 1.5}, "counters": {"files_scanned": 3}, "rule_hits": {"AWS API Key": 1}}
+
+    insertScanJobStats(job_id, stats)
+
+    with repository.get_connection().cursor() as cur:
+        cur.execute("SELECT stats FROM scan_jobs WHERE id = %s", (job_id,))
+        assert cur.fetchone()[0] == stats
+
 def test_get_user_tier_defaults_to_free(mock_get_connection, insert_helpers):
     insert_user, _ = insert_helpers
     user_id = insert_user("tier_free@example.com")
@@ -139,4 +174,203 @@ def test_get_user_tier_unknown_user(mock_get_connection):
 
 def test_set_user_tier_unknown_user(mock_get_connection):
     result = setUserTier(str(uuid.uuid4()), "pro")
-    assert result is False
\ No newline at end of file
+    assert result is False
+
+def test_get_user_tiers(mock_get_connection, insert_helpers):
+    insert_user, _ = insert_helpers
+    free_id = insert_user("tiers_free@example.com")
+    pro_id = insert_user("tiers_pro@example.com")
+    setUserTier(pro_id, "pro")
+
+    tiers = getUserTiers([free_id, pro_id, str(uuid.uuid4())])
+    assert tiers == {str(free_id): "free", str(pro_id): "pro"}
+    assert getUserTiers([]) == {}
+
+def test_insert_scan_findings_batch(db_transaction, mock_get_connection, insert_helpers):
+    _, insert_scan_job = insert_helpers
+    jid = insert_scan_job("batch")
+
+    row = (jid, "/file", 10, "abc", "MEDIUM", "ruleY", "main", None)
+    repository.insertScanFindingsBatch([row, (jid, "/file", 11, "def", "HIGH", "ruleZ", "main", "0" * 40)])
+    # flushing the same finding again must not raise or duplicate it
+    repository.insertScanFindingsBatch([row])
+
+    with db_transaction.cursor() as cur:
+        cur.execute("SELECT COUNT(*) FROM scan_findings WHERE job_id = %s", (jid,))
+        assert cur.fetchone()[0] == 2
+
+# ---- connection pool ----
+
+@pytest.fixture
+def fake_pool():
+    repository.close_pool()
+    with patch.object(repository.psycopg2.pool, 'ThreadedConnectionPool') as pool_cls:
+        yield pool_cls
+    repository._pool = None
+    repository._pool_pid = None
+    repository._pool_slots = None
+
+def test_pool_is_created_lazily_once_per_process(fake_pool):
+    assert repository._pool is None
+    repository.get_connection()
+    repository.get_connection()
+    fake_pool.assert_called_once()
+    assert repository._pool_pid == os.getpid()
+
+def test_pool_is_rebuilt_after_fork(fake_pool):
+    repository.get_connection()
+    # pretend the pool was created by the parent of a prefork worker
+    repository._pool_pid = -1
+    repository.get_connection()
+    assert fake_pool.call_count == 2
+
+def test_release_connection_rolls_back_and_returns_to_pool(fake_pool):
+    conn = MagicMock(spec=psycopg2.extensions.connection)
+    conn.closed = 0
+    conn.info.transaction_status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+    fake_pool.return_value.getconn.return_value = conn
+
+    assert repository.get_connection() is conn
+    repository.release_connection(conn)
+
+    conn.rollback.assert_called_once()
+    fake_pool.return_value.putconn.assert_called_once_with(conn, close=False)
+
+def test_release_connection_discards_broken_connection(fake_pool):
+    conn = MagicMock(spec=psycopg2.extensions.connection)
+    conn.closed = 0
+    conn.info.transaction_status = psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN
+    conn.rollback.side_effect = psycopg2.OperationalError("server closed the connection")
+    fake_pool.return_value.getconn.return_value = conn
+
+    repository.get_connection()
+    repository.release_connection(conn)
+
+    fake_pool.return_value.putconn.assert_called_once_with(conn, close=True)
+
+def test_pool_waits_for_free_slot(fake_pool, monkeypatch):
+    monkeypatch.setattr(repository, 'DB_POOL_MAX_SIZE', 1)
+    monkeypatch.setattr(repository, 'DB_POOL_TIMEOUT', 0.01)
+    repository.get_connection()
+    with pytest.raises(psycopg2.pool.PoolError):
+        repository.get_connection()
+
+# ---- blob scan cache ----
+
+def test_blob_cache_roundtrip_and_prune(mock_get_connection):
+    repository.insertCachedBlobFindings("rs1", [
+        ("sha-a", [[1, "x", "HIGH", "rule"]]),
+        ("sha-b", []),
+    ])
+    # a different ruleset never sees these entries
+    assert repository.getCachedBlobFindings("rs2", ["sha-a"]) == {}
+
+    cached = repository.getCachedBlobFindings("rs1", ["sha-a", "sha-b", "sha-c"])
+    assert cached == {"sha-a": [[1, "x", "HIGH", "rule"]], "sha-b": []}
+
+    repository.pruneBlobScanCache(1)
+    assert len(repository.getCachedBlobFindings("rs1", ["sha-a", "sha-b"])) == 1
+
+# ---- incremental scan state ----
+
+def test_last_scanned_commit_roundtrip(mock_get_connection):
+    url = "https://github.com/someuser/somerepo"
+    assert repository.getLastScannedCommit("user:1", url, "main") is None
+
+    repository.setLastScannedCommit("user:1", url, "main", "aaa")
+    repository.setLastScannedCommit("user:1", url, "main", "bbb")
+    assert repository.getLastScannedCommit("user:1", url, "main") == "bbb"
+
+    # other subscribers keep their own position
+    assert repository.getLastScannedCommit("recursive:2", url, "main") is None
+
+# ---- coalescing ----
+
+def test_coalesce_pending_scan_jobs(db_transaction, mock_get_connection, insert_helpers):
+    _, insert_scan = insert_helpers
+    pending = str(insert_scan("https://github.com/a/b"))
+    assert coalescePendingScanJobs([(pending, "key-a")]) == {}
+    with db_transaction.cursor() as cur:
+        cur.execute("UPDATE scan_jobs SET created_at = NOW() - INTERVAL '1 minute' WHERE id = %s", (pending,))
+
+    first = str(insert_scan("https://github.com/a/b"))
+    second = str(insert_scan("https://github.com/a/b"))
+    other = str(insert_scan("https://github.com/c/d"))
+
+    attached = coalescePendingScanJobs([(first, "key-a"), (second, "key-a"), (other, "key-c")])
+    assert attached == {first: pending, second: pending}
+
+    with db_transaction.cursor() as cur:
+        cur.execute("SELECT shares_job_id FROM scan_jobs WHERE id = %s", (other,))
+        assert cur.fetchone()[0] is None
+
+def test_coalesce_skips_started_jobs(db_transaction, mock_get_connection, insert_helpers):
+    _, insert_scan = insert_helpers
+    started = str(insert_scan("https://github.com/a/b", status="PARSING"))
+    new = str(insert_scan("https://github.com/a/b"))
+    with db_transaction.cursor() as cur:
+        cur.execute("UPDATE scan_jobs SET coalesce_key = 'key-a' WHERE id = %s", (started,))
+
+    assert coalescePendingScanJobs([(new, "key-a")]) == {}
+
+def test_claim_and_share_scan_job_results(db_transaction, mock_get_connection, insert_helpers):
+    _, insert_scan = insert_helpers
+    primary = str(insert_scan("https://github.com/a/b"))
+    coalescePendingScanJobs([(primary, "key-a")])
+    with db_transaction.cursor() as cur:
+        cur.execute("UPDATE scan_jobs SET created_at = NOW() - INTERVAL '1 minute' WHERE id = %s", (primary,))
+    duplicate = str(insert_scan("https://github.com/a/b"))
+    coalescePendingScanJobs([(duplicate, "key-a")])
+
+    assert claimScanJob(primary) == [duplicate]
+
+    repository.insertScanFindingsBatch([(primary, "/config.py", 3, "AKIA...", "HIGH", "AWS API Key", "main", None)])
+    insertDurationInScanJobs(42, primary)
+    shareScanJobResults(primary, [duplicate])
+
+    with db_transaction.cursor() as cur:
+        cur.execute("SELECT status FROM scan_jobs WHERE id = %s", (primary,))
+        assert cur.fetchone()[0] == "PARSING"
+        cur.execute("SELECT duration FROM scan_jobs WHERE id = %s", (duplicate,))
+        assert cur.fetchone()[0] == 42
+        cur.execute("SELECT file_path, rule FROM scan_findings WHERE job_id = %s", (duplicate,))
+        assert cur.fetchall() == [("/config.py", "AWS API Key")]
+
+def test_fail_attached_scan_jobs(db_transaction, mock_get_connection, insert_helpers):
+    _, insert_scan = insert_helpers
+    primary = str(insert_scan("https://github.com/a/b"))
+    attached = str(insert_scan("https://github.com/a/b"))
+    other = str(insert_scan("https://github.com/a/b"))
+    with db_transaction.cursor() as cur:
+        cur.execute("UPDATE scan_jobs SET shares_job_id = %s WHERE id = %s", (primary, attached))
+
+    failAttachedScanJobs(primary)
+
+    with db_transaction.cursor() as cur:
+        cur.execute("SELECT id, status FROM scan_jobs WHERE id = ANY(%s::uuid[])", ([primary, attached, other],))
+        statuses = {str(job_id): status for job_id, status in cur.fetchall()}
+    assert statuses == {primary: "PENDING", attached: "FAILED", other: "PENDING"}
+
+# ---- scan checkpoints ----
+
+def test_scan_checkpoint_roundtrip(mock_get_connection, insert_helpers):
+    _, insert_scan_job = insert_helpers
+    jid = insert_scan_job("checkpoint")
+    assert repository.getScanCheckpoint(jid, "head-1") == set()
+
+    repository.appendScanCheckpoint(jid, "head-1", ["a" * 40, "b" * 40])
+    repository.appendScanCheckpoint(jid, "head-1", ["src/app.py"])
+    repository.appendScanCheckpoint(jid, "head-1", [])
+    assert repository.getScanCheckpoint(jid, "head-1") == {"a" * 40, "b" * 40, "src/app.py"}
+
+    repository.deleteScanCheckpoint(jid)
+    assert repository.getScanCheckpoint(jid, "head-1") == set()
+
+def test_scan_checkpoint_of_another_head_is_dropped(mock_get_connection, insert_helpers):
+    _, insert_scan_job = insert_helpers
+    jid = insert_scan_job("checkpoint")
+    repository.appendScanCheckpoint(jid, "head-1", ["src/app.py"])
+
+    # the retry cloned newer commits, src/app.py may have changed since
+    assert repository.getScanCheckpoint(jid, "head-2") == set()
+    assert repository.getScanCheckpoint(jid, "head-1") == set()
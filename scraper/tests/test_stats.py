@@ -0,0 +1,36 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stats import ScanStats, PHASES
+
+# =========================================
+#             Scan stats tests
+# =========================================
+
+def test_phase_accumulates_time():
+    stats = ScanStats()
+    with stats.phase("regex"):
+        pass
+    stats.add_time("regex", 1.5)
+    assert stats.phases["regex"] >= 1.5
+    assert set(stats.to_dict()["phases"]) == set(PHASES)
+
+def test_merge_adds_worker_stats():
+    parent = ScanStats()
+    parent.count("entropy_candidates", 2)
+    parent.rule_hits["AWS API Key"] += 1
+
+    worker = ScanStats()
+    worker.add_time("regex", 0.25)
+    worker.count("entropy_candidates", 3)
+    worker.rule_hits["AWS API Key"] += 2
+    worker.rule_hits["GitHub Token"] += 1
+
+    parent.merge(worker.to_dict())
+    result = parent.to_dict()
+    assert result["phases"]["regex"] == 0.25
+    assert result["counters"] == {"entropy_candidates": 5}
+    # most frequent rule first
+    assert list(result["rule_hits"].items()) == [("AWS API Key", 3), ("GitHub Token", 1)]
@@ -6,7 +6,8 @@ from unittest.mock import patch, MagicMock, call
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import pytest
-from tasks import celery_app, run_scan_job_pro, run_scan_job_free, run_recursive_scan_job_pro, run_recursive_scan_job_free
+from celery.exceptions import Retry
+from tasks import celery_app, FAST_QUEUE_SCAN_WORKERS, SLOW_QUEUE_SCAN_WORKERS, FAST_QUEUE_BUDGET, SLOW_QUEUE_BUDGET, run_scan_job_pro, run_scan_job_free, run_recursive_scan_job_pro, run_recursive_scan_job_free
 
 @pytest.fixture(autouse=True)
 def celery_eager():
@@ -28,11 +29,41 @@ def test_run_scan_job_pro_success():
         mock_scanner_cls.return_value.run = MagicMock()
         run_scan_job_pro.delay(FAKE_JOB_ID, REPO_URL, False, [], None)
 
-        mock_scanner_cls.assert_called_once_with(REPO_URL, FAKE_JOB_ID, False, [], None)
+        mock_scanner_cls.assert_called_once_with(REPO_URL, FAKE_JOB_ID, False, [], None, workers=FAST_QUEUE_SCAN_WORKERS,
+                                                  incremental_scope=None, budget=FAST_QUEUE_BUDGET, history=False,
+                                                  ref=None, sha=None)
         mock_scanner_cls.return_value.run.assert_called_once()
         mock_duration.assert_called_once()
         mock_parsed.assert_called_once_with([str(FAKE_JOB_ID)])
 
+def test_coalesced_scan_job_shares_its_results():
+    with patch('tasks.GitHubSecretScanner') as mock_scanner_cls, \
+         patch('tasks.insertDurationInScanJobs'), \
+         patch('tasks.claimScanJob', return_value=["job-2"]) as mock_claim, \
+         patch('tasks.shareScanJobResults') as mock_share, \
+         patch('tasks.setParsingScanJobsToParsed') as mock_parsed:
+
+        run_scan_job_pro.delay(FAKE_JOB_ID, REPO_URL, False, [], None, coalesced=True)
+
+        mock_claim.assert_called_once_with(FAKE_JOB_ID)
+        mock_share.assert_called_once_with(FAKE_JOB_ID, ["job-2"])
+        mock_parsed.assert_called_once_with([str(FAKE_JOB_ID), "job-2"])
+
+def test_coalesced_scan_job_fails_attached_jobs_after_last_retry():
+    with patch('tasks.GitHubSecretScanner') as mock_scanner_cls, \
+         patch('tasks.claimScanJob', return_value=["job-2"]), \
+         patch('tasks.failAttachedScanJobs') as mock_fail:
+
+        mock_scanner_cls.return_value.run.side_effect = RuntimeError("clone failed")
+        with pytest.raises(Retry) as retry:
+            run_scan_job_pro.delay(FAKE_JOB_ID, REPO_URL, False, [], None, coalesced=True)
+        mock_fail.assert_not_called()
+
+        # the last retry gives up and fails the jobs waiting on it
+        with pytest.raises(RuntimeError):
+            retry.value.sig.apply(retries=run_scan_job_pro.max_retries)
+        mock_fail.assert_called_once_with(FAKE_JOB_ID)
+
 def test_run_scan_job_pro_uses_fast_queue():
     assert run_scan_job_pro.queue == 'fast'
 
@@ -46,7 +77,9 @@ def test_run_scan_job_free_success():
         mock_scanner_cls.return_value.run = MagicMock()
         run_scan_job_free.delay(FAKE_JOB_ID, REPO_URL, False, [], None)
 
-        mock_scanner_cls.assert_called_once_with(REPO_URL, FAKE_JOB_ID, False, [], None)
+        mock_scanner_cls.assert_called_once_with(REPO_URL, FAKE_JOB_ID, False, [], None, workers=SLOW_QUEUE_SCAN_WORKERS,
+                                                  incremental_scope=None, budget=SLOW_QUEUE_BUDGET, history=False,
+                                                  ref=None, sha=None)
         mock_scanner_cls.return_value.run.assert_called_once()
         mock_duration.assert_called_once()
         mock_parsed.assert_called_once_with([str(FAKE_JOB_ID)])
@@ -60,7 +93,8 @@ def test_pro_and_free_scan_jobs_use_different_queues():
 # ---- run_recursive_scan_job_pro ----
 
 def test_run_recursive_scan_job_pro_success():
-    with patch('tasks.insertScanJob', return_value=FAKE_JOB_ID) as mock_insert, \
+    with patch('tasks.remote_refs', return_value=None), \
+         patch('tasks.insertScanJob', return_value=FAKE_JOB_ID) as mock_insert, \
          patch('tasks.GitHubSecretScanner') as mock_scanner_cls, \
          patch('tasks.insertDurationInScanJobs') as mock_duration, \
          patch('tasks.setParsingScanJobsToParsed') as mock_parsed, \
@@ -81,7 +115,8 @@ def test_run_recursive_scan_job_pro_uses_fast_queue():
 # ---- run_recursive_scan_job_free ----
 
 def test_run_recursive_scan_job_free_success():
-    with patch('tasks.insertScanJob', return_value=FAKE_JOB_ID) as mock_insert, \
+    with patch('tasks.remote_refs', return_value=None), \
+         patch('tasks.insertScanJob', return_value=FAKE_JOB_ID) as mock_insert, \
          patch('tasks.GitHubSecretScanner') as mock_scanner_cls, \
          patch('tasks.insertDurationInScanJobs') as mock_duration, \
          patch('tasks.setParsingScanJobsToParsed') as mock_parsed, \
@@ -96,6 +131,95 @@ def test_run_recursive_scan_job_free_success():
         mock_parsed.assert_called_once_with([str(FAKE_JOB_ID)])
         mock_update.assert_called_once_with(FAKE_RECURSIVE_ID)
 
+def test_recursive_scan_is_skipped_when_nothing_was_pushed():
+    refs = {"refs": {"HEAD": "a" * 40}, "is_deep_scan": False, "extensions": []}
+    with patch('tasks.remote_refs', return_value=refs), \
+         patch('tasks.getRecursiveScanRefs', return_value=refs), \
+         patch('tasks.insertScanJob') as mock_insert, \
+         patch('tasks.GitHubSecretScanner') as mock_scanner_cls, \
+         patch('tasks.markRecursiveScanUnchanged') as mock_unchanged, \
+         patch('tasks.updateRecursiveScanAfterRun') as mock_update:
+
+        run_recursive_scan_job_free.delay(FAKE_RECURSIVE_ID, REPO_URL, None, False, [])
+
+        mock_insert.assert_not_called()
+        mock_scanner_cls.assert_not_called()
+        mock_unchanged.assert_called_once_with(FAKE_RECURSIVE_ID)
+        mock_update.assert_called_once_with(FAKE_RECURSIVE_ID)
+
+def test_retried_recursive_scan_finishes_its_job_when_refs_are_unchanged():
+    refs = {"refs": {"HEAD": "a" * 40}, "is_deep_scan": False, "extensions": []}
+    with patch('tasks.remote_refs', return_value=refs), \
+         patch('tasks.getRecursiveScanRefs', return_value=refs), \
+         patch('tasks.insertScanJob') as mock_insert, \
+         patch('tasks.GitHubSecretScanner') as mock_scanner_cls, \
+         patch('tasks.insertDurationInScanJobs'), \
+         patch('tasks.setParsingScanJobsToParsed') as mock_parsed, \
+         patch('tasks.setRecursiveScanRefs'), \
+         patch('tasks.markRecursiveScanUnchanged') as mock_unchanged, \
+         patch('tasks.updateRecursiveScanAfterRun'):
+
+        mock_scanner_cls.return_value.partial_reason = None
+        run_recursive_scan_job_free.delay(FAKE_RECURSIVE_ID, REPO_URL, None, False, [], job_id=FAKE_JOB_ID)
+
+        mock_insert.assert_not_called()
+        mock_unchanged.assert_not_called()
+        mock_scanner_cls.return_value.run.assert_called_once()
+        mock_parsed.assert_called_once_with([FAKE_JOB_ID])
+
+def test_recursive_scan_records_refs_after_complete_run():
+    refs = {"refs": {"HEAD": "b" * 40}, "is_deep_scan": False, "extensions": []}
+    with patch('tasks.remote_refs', return_value=refs), \
+         patch('tasks.getRecursiveScanRefs', return_value={"refs": {"HEAD": "a" * 40}}), \
+         patch('tasks.insertScanJob', return_value=FAKE_JOB_ID), \
+         patch('tasks.GitHubSecretScanner') as mock_scanner_cls, \
+         patch('tasks.insertDurationInScanJobs'), \
+         patch('tasks.setParsingScanJobsToParsed'), \
+         patch('tasks.setRecursiveScanRefs') as mock_set_refs, \
+         patch('tasks.updateRecursiveScanAfterRun') as mock_update:
+
+        mock_scanner_cls.return_value.partial_reason = None
+        run_recursive_scan_job_pro.delay(FAKE_RECURSIVE_ID, REPO_URL, None, False, [])
+        mock_scanner_cls.return_value.run.assert_called_once()
+        mock_set_refs.assert_called_once_with(FAKE_RECURSIVE_ID, refs)
+        mock_update.assert_called_once_with(FAKE_RECURSIVE_ID)
+
+        # a partial run is not recorded, so the next one scans again
+        mock_set_refs.reset_mock()
+        mock_scanner_cls.return_value.partial_reason = "deadline"
+        run_recursive_scan_job_pro.delay(FAKE_RECURSIVE_ID, REPO_URL, None, False, [])
+        mock_set_refs.assert_not_called()
+
+def test_retried_recursive_scan_keeps_its_scan_job():
+    with patch('tasks.remote_refs', return_value=None), \
+         patch('tasks.insertScanJob', return_value=FAKE_JOB_ID) as mock_insert, \
+         patch('tasks.GitHubSecretScanner') as mock_scanner_cls, \
+         patch('tasks.insertDurationInScanJobs'), \
+         patch('tasks.setParsingScanJobsToParsed'), \
+         patch('tasks.updateRecursiveScanAfterRun'):
+
+        mock_scanner_cls.return_value.run.side_effect = [RuntimeError("worker lost"), None]
+        with pytest.raises(Retry) as retry:
+            run_recursive_scan_job_pro.delay(FAKE_RECURSIVE_ID, REPO_URL, None, False, [])
+        assert retry.value.sig.kwargs["job_id"] == FAKE_JOB_ID
+
+        # the retry resumes the same job from its checkpoint instead of creating another one
+        retry.value.sig.apply()
+        mock_insert.assert_called_once()
+        assert [c.args[1] for c in mock_scanner_cls.call_args_list] == [FAKE_JOB_ID, FAKE_JOB_ID]
+
+def test_remote_refs_covers_branches_of_deep_scans(local_git_repo):
+    from tasks import remote_refs
+    local_git_repo.commit({"a.py": "a\n"})
+    dev = local_git_repo.commit({"b.py": "b\n"}, branch="dev")
+    head = local_git_repo.commit({"c.py": "c\n"})
+
+    assert remote_refs(local_git_repo.url, None, False, [".py"]) == \
+        {"refs": {"HEAD": head}, "is_deep_scan": False, "extensions": [".py"]}
+    assert remote_refs(local_git_repo.url, None, True, [])["refs"] == {"refs/heads/main": head, "refs/heads/dev": dev}
+    # the remote cannot be listed, the run scans as usual
+    assert remote_refs("file:///nonexistent", None, False, []) is None
+
 def test_run_recursive_scan_job_free_uses_slow_queue():
     assert run_recursive_scan_job_free.queue == 'slow'
 
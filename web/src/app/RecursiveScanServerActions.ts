@@ -18,7 +18,8 @@ export async function createRecursiveScanAction(
   interval: ScanInterval, 
   isDeepScan: boolean, 
   extensions: Set<string>,
-  repoKey: string | null = null
+  repoKey: string | null = null,
+  incremental: boolean = true
 ) {
   const user = await getUser();
   if (!user) return { success: false, error: "Not authenticated" };
@@ -41,6 +42,7 @@ export async function createRecursiveScanAction(
     repoKey: repokeyEncrypted,
     interval,
     is_deep_scan: isDeepScan,
+    incremental,
     extensions: extensionsArray,
   });
 
@@ -55,7 +57,8 @@ export async function createRecursiveScanAction(
       repoKey: repoKey, 
       isDeepScan: isDeepScan, 
       extensions: extensionsArray,
-      owner_id: user.id
+      owner_id: user.id,
+      incremental: newScan.incremental
     }),
   });
 
@@ -112,7 +115,8 @@ export async function runRecursiveScanNowAction(scanId: string) {
       repoKey: decryptedKey,
       isDeepScan: scan.is_deep_scan,
       extensions: scan.extensions,
-      owner_id: user.id
+      owner_id: user.id,
+      incremental: scan.incremental
     }),
   });
 
@@ -73,6 +73,14 @@ export default function JobsTable({ jobs }: Props) {
                 >
                   {job.status.toLowerCase()}
                 </span>
+                {job.partial_reason && (
+                  <span
+                    title={job.partial_reason}
+                    className="ml-2 px-2 py-0.5 rounded text-xs font-bold border bg-orange-500/10 text-orange-400 border-orange-500/20"
+                  >
+                    partial
+                  </span>
+                )}
               </td>
               <td className="p-4">
                 <div className="flex items-center gap-1.5 text-sm font-mono text-text-main">
@@ -226,6 +226,11 @@ function FindingItem({ finding }: { finding: MergedFinding }) {
             <h3 className="text-sm font-bold text-text-main">
               Branch: {finding.branches.join(" + ")}
             </h3>
+            {finding.commit_sha && (
+              <span className="text-[11px] font-mono text-secondary" title={finding.commit_sha}>
+                {finding.commit_sha.slice(0, 12)}
+              </span>
+            )}
           </div>
         </div>
         <ChevronDown
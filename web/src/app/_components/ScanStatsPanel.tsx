@@ -0,0 +1,107 @@
+import { Activity } from "lucide-react";
+import { ScanJobStats } from "@/lib/repository/scanJob/scanJobSchemas";
+
+const PHASE_LABELS: Record<string, string> = {
+  clone: "Clone",
+  walk: "File listing",
+  regex: "Rules",
+  entropy: "Entropy",
+  db: "Database",
+};
+
+const COUNTER_LABELS: Record<string, string> = {
+  files_seen: "Files seen",
+  files_scanned: "Files scanned",
+  files_skipped: "Files skipped",
+  cache_hits: "Cache hits",
+  entropy_candidates: "Entropy candidates",
+  findings_written: "Findings written",
+};
+
+function formatBytes(bytes: number): string {
+  if (bytes < 1024) return `${bytes} B`;
+  const units = ["KB", "MB", "GB"];
+  let value = bytes / 1024;
+  let unit = 0;
+  while (value >= 1024 && unit < units.length - 1) {
+    value /= 1024;
+    unit++;
+  }
+  return `${value.toFixed(1)} ${units[unit]}`;
+}
+
+/**
+ * Where a finished scan spent its time, and how much it scanned.
+ */
+export function ScanStatsPanel({ stats }: { stats: ScanJobStats }) {
+  const phases = Object.entries(stats.phases);
+  const slowest = Math.max(...phases.map(([, seconds]) => seconds), 0.001);
+  const ruleHits = Object.entries(stats.rule_hits).slice(0, 10);
+
+  return (
+    <div className="box border border-secondary/10 overflow-hidden shadow-xl bg-background/50 backdrop-blur-sm p-6 space-y-6">
+      <div className="flex items-center gap-2 text-secondary">
+        <Activity size={16} />
+        <span className="text-xs font-bold uppercase tracking-tighter">
+          Scan Statistics
+        </span>
+      </div>
+
+      <div className="space-y-2">
+        {phases.map(([phase, seconds]) => (
+          <div key={phase} className="flex items-center gap-3 text-sm font-mono">
+            <span className="w-28 text-secondary">{PHASE_LABELS[phase] ?? phase}</span>
+            <div className="flex-1 h-2 bg-secondary/10 rounded">
+              <div
+                className="h-2 bg-button-main rounded"
+                style={{ width: `${(seconds / slowest) * 100}%` }}
+              />
+            </div>
+            <span className="w-20 text-right text-text-main">{seconds.toFixed(2)}s</span>
+          </div>
+        ))}
+      </div>
+
+      <div className="grid grid-cols-2 md:grid-cols-4 gap-4 pt-4 border-t border-secondary/10">
+        {Object.entries(COUNTER_LABELS).map(([key, label]) => (
+          <div key={key}>
+            <h3 className="text-[10px] font-mono text-secondary uppercase tracking-widest leading-none mb-1">
+              {label}
+            </h3>
+            <span className="text-sm font-mono text-text-main">{stats.counters[key] ?? 0}</span>
+          </div>
+        ))}
+        <div>
+          <h3 className="text-[10px] font-mono text-secondary uppercase tracking-widest leading-none mb-1">
+            Cloned
+          </h3>
+          <span className="text-sm font-mono text-text-main">{formatBytes(stats.counters.clone_bytes ?? 0)}</span>
+        </div>
+        <div>
+          <h3 className="text-[10px] font-mono text-secondary uppercase tracking-widest leading-none mb-1">
+            Scanned
+          </h3>
+          <span className="text-sm font-mono text-text-main">{formatBytes(stats.counters.bytes_scanned ?? 0)}</span>
+        </div>
+      </div>
+
+      {ruleHits.length > 0 && (
+        <div className="pt-4 border-t border-secondary/10">
+          <h3 className="text-[10px] font-mono text-secondary uppercase tracking-widest leading-none mb-2">
+            Rule hits
+          </h3>
+          <div className="flex flex-wrap gap-2">
+            {ruleHits.map(([rule, hits]) => (
+              <span
+                key={rule}
+                className="px-2 py-0.5 rounded text-xs font-mono border border-secondary/20 text-text-main"
+              >
+                {rule}: {hits}
+              </span>
+            ))}
+          </div>
+        </div>
+      )}
+    </div>
+  );
+}
@@ -11,6 +11,9 @@ import { log, LogLevel } from "@/lib/log";
 
 const payloadSchema = z.object({
   ref: z.string(),
+  // head commit of the branch after the push
+  after: z.string(),
+  deleted: z.boolean().default(false),
   repository: z.object({
     html_url: z.string(),
     default_branch: z.string(),
@@ -48,7 +51,7 @@ export async function POST(request: NextRequest) {
       return NextResponse.json("OK - no scan run", { status: 200 });
     }
 
-    await createScanJob({
+    const scanJob = await createScanJob({
       owner_id: listeningRepository.owner_id,
       priority: 3,
       repo_url: listeningRepository.repo_url,
@@ -63,7 +66,14 @@ export async function POST(request: NextRequest) {
       method: "POST",
       headers: { "Content-Type": "application/json" },
       body: JSON.stringify({
+        id: scanJob.id,
+        url: listeningRepository.repo_url,
+        // scan exactly the pushed commit, findings are attributed to its branch
+        ref: payload.ref,
+        sha: payload.after,
         isDeepScan: false,
+        incremental: true,
+        userId: listeningRepository.owner_id,
         extensions: userSettings ? userSettings.extensions : [],
         repoKey: listeningRepository.repoKey
           ? decrypt(listeningRepository.repoKey)
@@ -129,6 +139,11 @@ function shouldRunScan(
     return false;
   }
 
+  if (payload.deleted) {
+    log("Skipping scan, branch was deleted", LogLevel.debug);
+    return false;
+  }
+
   if (listening_repo.branch_config === "ALL") {
     return true;
   }
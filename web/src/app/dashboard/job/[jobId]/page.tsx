@@ -1,4 +1,5 @@
 import ScanResults from "@/app/_components/ScanResults";
+import { ScanStatsPanel } from "@/app/_components/ScanStatsPanel";
 import {
   getFindingsByJobIdServerAction,
   getScanJobByIdServerAction,
@@ -56,6 +57,7 @@ export default async function Page({
               </div>
             </div>
           </div>
+          {job.stats && <ScanStatsPanel stats={job.stats} />}
           <ScanResults jobs={[job]} findings={findings} startOpen />
         </div>
       </div>
@@ -0,0 +1,59 @@
+import { beforeEach, describe, expect, test, vi } from "vitest";
+
+vi.mock("server-only", () => ({}));
+vi.mock("@lib/database/remoteDataSource", () => ({
+  query: vi.fn(),
+  queryOne: vi.fn(),
+}));
+
+import { queryOne } from "@lib/database/remoteDataSource";
+import * as recursiveScanRepo from "./recursiveScanRepository";
+import { createRecursiveScanDTOSchema } from "./recursiveScanSchema";
+
+const mockQueryOne = vi.mocked(queryOne);
+
+const input = createRecursiveScanDTOSchema.parse({
+  repo_url: "https://github.com/owner/repo",
+  owner_id: "11111111-1111-4111-8111-111111111111",
+  repoKey: null,
+  interval: "DAILY",
+  extensions: [".py"],
+});
+
+const baseScan = {
+  id: "22222222-2222-4222-8222-222222222222",
+  repo_url: "https://github.com/owner/repo",
+  owner_id: "11111111-1111-4111-8111-111111111111",
+  repoKey: null,
+  interval: "DAILY",
+  is_deep_scan: false,
+  extensions: [".py"],
+  is_active: true,
+  incremental: true,
+  last_run_at: null,
+  next_run_at: "2026-10-19T00:00:00Z",
+  created_at: "2026-10-18T00:00:00Z",
+};
+
+describe("recursiveScanRepository", () => {
+  beforeEach(() => {
+    vi.clearAllMocks();
+  });
+
+  test("new schedules are incremental unless asked otherwise", () => {
+    expect(input.incremental).toBe(true);
+    expect(createRecursiveScanDTOSchema.parse({ ...input, incremental: false }).incremental).toBe(false);
+  });
+
+  test("createRecursiveScan stores the incremental flag the dispatcher reads", async () => {
+    mockQueryOne.mockResolvedValueOnce(baseScan as any);
+
+    const result = await recursiveScanRepo.createRecursiveScan(input);
+
+    expect(mockQueryOne).toHaveBeenCalledWith(
+      expect.stringContaining("is_deep_scan, extensions, incremental, next_run_at"),
+      [input.repo_url, input.owner_id, null, "DAILY", false, [".py"], true],
+    );
+    expect(result.incremental).toBe(true);
+  });
+});
@@ -16,6 +16,7 @@ export const recursiveScanSchema = z.object({
     ".py", ".js", ".ts", ".jsx", ".tsx", ".java", ".go", ".rb", ".php", ".yml",
   ]),
   is_active: z.boolean(),
+  incremental: z.boolean(),
   last_run_at: z.coerce.date().nullable(),
   next_run_at: z.coerce.date(),
   created_at: z.coerce.date(),
@@ -29,6 +30,8 @@ export const createRecursiveScanDTOSchema = z.object({
   repoKey: z.string().nullable().optional(),
   interval: z.enum(SCAN_INTERVALS),
   is_deep_scan: z.boolean().default(false),
+  // Recurring runs only scan what changed since the previous run
+  incremental: z.boolean().default(true),
   extensions: z.array(z.string()).default([
     // Arbitrary list of extensions for the default
     ".py", ".js", ".ts", ".jsx", ".tsx", ".java", ".go", ".rb", ".php", ".yml",
@@ -12,6 +12,8 @@ export const scanFindingSchema = z.object({
   severity: z.enum(["LOW", "MEDIUM", "HIGH", "CRITICAL"]),
   rule: z.string(),
   branch: z.string(),
+  // commit that introduced the secret, only set by history scans
+  commit_sha: z.string().nullable().default(null),
 });
 
 /**
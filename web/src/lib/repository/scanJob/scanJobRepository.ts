@@ -68,7 +68,7 @@ export async function getScanJobsByRecursiveScanId(
     `
     SELECT
       sj.id, sj.repo_url, sj.status, sj.owner_id, sj.priority,
-      sj.created_at, sj.duration, sj.recursive_scan_id,
+      sj.created_at, sj.duration, sj.recursive_scan_id, sj.partial_reason,
       NULL as repoKey, -- Security: Prevent sending the ciphertext to the frontend
       COALESCE(COUNT(f.id), 0)::INTEGER as findings_count
     FROM scan_jobs sj
@@ -90,7 +90,7 @@ export async function getUserScanJobs(
     `
     SELECT 
       sj.id, sj.repo_url, sj.status, sj.owner_id, sj.priority,
-      sj.created_at, sj.duration, sj.recursive_scan_id,
+      sj.created_at, sj.duration, sj.recursive_scan_id, sj.partial_reason,
       NULL as repoKey, -- Security: Prevent sending the ciphertext to the frontend
       COALESCE(COUNT(f.id), 0)::INTEGER as findings_count
     FROM scan_jobs sj
@@ -1,5 +1,21 @@
 import { z } from "zod";
 
+/**
+ * Per-phase timings (seconds) and counters the scanner stores with a finished job.
+ * See scraper/stats.py for the keys.
+ */
+export const scanJobStatsSchema = z.object({
+  phases: z.record(z.string(), z.number()),
+  counters: z.record(z.string(), z.number()),
+  rule_hits: z.record(z.string(), z.number()),
+  skipped: z.record(z.string(), z.number()).optional(),
+});
+
+/**
+ * Represents the `stats` column of a scan job.
+ */
+export type ScanJobStats = z.infer<typeof scanJobStatsSchema>;
+
 /**
  * Base scan job schema. Represents a row in the `scan_jobs` table.
  */
@@ -13,6 +29,8 @@ export const scanJobSchema = z.object({
   created_at: z.coerce.date(),
   duration: z.number().int().nullable(), // nullable if some jobs have no duration yet
   listening_repository_id: z.string().nullable().optional(),
+  partial_reason: z.string().nullable().optional(), // set when the scan ran out of budget and stopped early
+  stats: scanJobStatsSchema.nullable().optional(), // null for jobs that have not finished yet
 });
 
 /**